@@ -1,162 +1,211 @@
 # ai_service.py (updated version)
+import asyncio
 import os
 import json
 import base64
 import requests
 from PIL import Image
 import io
-import google.generativeai as genai
-from rag_engine.rag_chain import generate_story_rag, setup_rag_chain
+from concurrent.futures import ThreadPoolExecutor
+from services.colors import extract_dominant_colors
+from image_processor import ProcessedImage, load_image
+from services.image_cache import PerceptualCache, dhash
+from services.local_vision import caption_model, classify_model
+from services.http_client import get_async_client, http_client
+from services.registry import registry
+from services import metrics
 
 # Hugging Face API settings
 HF_API_TOKEN = os.getenv('HF_API_TOKEN')  # Set this in your .env file
 IMAGE_CAPTIONING_API = "https://api-inference.huggingface.co/models/Salesforce/blip-image-captioning-large"
 IMAGE_CLASSIFICATION_API = "https://api-inference.huggingface.co/models/microsoft/resnet-50"
 
-def analyze_character_image(image_base64):
+# "api" (Hugging Face Inference API) or "local" (in-process CPU models, see services/local_vision.py)
+VISION_BACKEND = os.getenv("VISION_BACKEND", "api")
+
+# Palette extraction: "histogram" (fast) or "kmeans" (better on shaded drawings)
+COLOR_METHOD = os.getenv("COLOR_METHOD", "histogram")
+
+# Runs the caption and classification requests side by side
+_vision_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vision")
+# Caption/classification results keyed by the drawing's perceptual hash
+vision_cache = PerceptualCache()
+
+def query_vision_model(api_url, image_bytes, action, stage="vision_api"):
+    """POST the image to a Hugging Face inference API and return its JSON."""
+    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+    request_id = metrics.current_request_id()
+    if request_id:
+        headers[metrics.REQUEST_ID_HEADER] = request_id
+    try:
+        with metrics.timed(stage):
+            response = http_client.post(
+                api_url, 
+                headers=headers, 
+                data=image_bytes
+            )
+            response.raise_for_status()
+            return response.json()
+    except requests.exceptions.RequestException as e:
+        raise ValueError(f"Failed to {action}: {str(e)}")
+
+async def aquery_vision_model(api_url, image_bytes, action, stage="vision_api"):
+    """``query_vision_model`` over a shared httpx.AsyncClient."""
+    import httpx
+
+    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+    request_id = metrics.current_request_id()
+    if request_id:
+        headers[metrics.REQUEST_ID_HEADER] = request_id
+    try:
+        with metrics.timed(stage):
+            response = await get_async_client().post(api_url, headers=headers, content=image_bytes)
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        raise ValueError(f"Failed to {action}: {str(e)}")
+
+def submit_vision_requests(image):
+    """Start captioning and classifying image on the configured backend; returns two futures."""
+    if VISION_BACKEND == "local":
+        return caption_model.submit(image.image), classify_model.submit(image.image)
+    if VISION_BACKEND == "api":
+        image_bytes = image.jpeg_bytes
+        # bind() carries the request ID and labels into the worker threads
+        return (
+            _vision_executor.submit(
+                metrics.bind(query_vision_model), IMAGE_CAPTIONING_API, image_bytes, "get image caption", "caption"
+            ),
+            _vision_executor.submit(
+                metrics.bind(query_vision_model), IMAGE_CLASSIFICATION_API, image_bytes, "classify image", "classify"
+            ),
+        )
+    raise ValueError(f"Unknown VISION_BACKEND: {VISION_BACKEND}")
+
+def _extract_colors(image):
+    try:
+        with metrics.timed("colors"):
+            return extract_dominant_colors(image.image, method=COLOR_METHOD)
+    except Exception as e:
+        raise ValueError(f"Failed to process image: {str(e)}")
+
+def analyze_character_image(image):
     """
-    Analyze a character drawing using Hugging Face's vision models
+    Analyze a character drawing using Hugging Face's vision models.
+    ``image`` is a ProcessedImage from image_processor.load_image (or base64).
     """
     try:
-        if not image_base64:
+        if not image:
             raise ValueError("No image data provided")
             
-        if not HF_API_TOKEN:
+        if VISION_BACKEND == "api" and not HF_API_TOKEN:
             raise ValueError("Hugging Face API token not found. Please set HF_API_TOKEN in your .env file")
             
-        # Decode the base64 image
-        try:
-            image_bytes = base64.b64decode(image_base64)
-        except Exception as e:
-            raise ValueError(f"Invalid image data: {str(e)}")
+        # Decode once; the same image feeds the model calls and color extraction
+        if not isinstance(image, ProcessedImage):
+            image = load_image(image)
         
-        # Set up headers for Hugging Face API
-        headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+        # Near-identical drawings reuse earlier model results
+        image_hash = dhash(image.image)
+        cached = vision_cache.get(image_hash)
+        metrics.count("vision_cache_hit" if cached is not None else "vision_cache_miss")
+        if cached is None:
+            # Caption, classification and colors don't depend on each other
+            caption_future, classify_future = submit_vision_requests(image)
         
-        # Get image caption from BLIP model
-        try:
-            caption_response = requests.post(
-                IMAGE_CAPTIONING_API, 
-                headers=headers, 
-                data=image_bytes,
-                timeout=10
-            )
-            caption_response.raise_for_status()
-            caption_result = caption_response.json()
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Failed to get image caption: {str(e)}")
+        # Extract colors from image
+        colors = _extract_colors(image)
         
-        # Get image classification from ResNet model
-        try:
-            classify_response = requests.post(
-                IMAGE_CLASSIFICATION_API, 
-                headers=headers, 
-                data=image_bytes,
-                timeout=10
-            )
-            classify_response.raise_for_status()
-            classification_result = classify_response.json()
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Failed to classify image: {str(e)}")
+        if cached is None:
+            # Whatever of the model calls is still running after the colors are done
+            with metrics.timed("vision_wait"):
+                cached = (caption_future.result(), classify_future.result())
+            vision_cache.put(image_hash, cached)
+        caption_result, classification_result = cached
         
-        # Extract colors from image
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
-            colors = extract_dominant_colors(image)
-        except Exception as e:
-            raise ValueError(f"Failed to process image: {str(e)}")
+        return build_character_analysis(colors, caption_result, classification_result)
         
-        # Determine emotion based on classification and caption
-        emotion = determine_emotion(caption_result, classification_result)
+    except Exception as e:
+        print(f"[{metrics.current_request_id()}] Error in character analysis: {str(e)}")
+        metrics.count("vision_fallback")
+        # Return fallback analysis if API fails
+        return fallback_character_analysis()
+
+async def aanalyze_character_image(image):
+    """``analyze_character_image`` for the async app: the model calls are awaited
+    (httpx on the "api" backend) and color extraction runs in a thread meanwhile."""
+    try:
+        if not image:
+            raise ValueError("No image data provided")
+            
+        if VISION_BACKEND == "api" and not HF_API_TOKEN:
+            raise ValueError("Hugging Face API token not found. Please set HF_API_TOKEN in your .env file")
+            
+        if not isinstance(image, ProcessedImage):
+            image = await asyncio.to_thread(load_image, image)
         
-        # Process caption to extract features
-        features = extract_features_from_caption(caption_result[0]['generated_text'])
+        image_hash = dhash(image.image)
+        cached = vision_cache.get(image_hash)
+        metrics.count("vision_cache_hit" if cached is not None else "vision_cache_miss")
+        colors_task = asyncio.to_thread(_extract_colors, image)
         
-        # Construct character analysis
-        analysis = {
-            "colors": colors,
-            "features": features,
-            "emotion": emotion,
-            "characteristics": derive_characteristics(features, emotion),
-            "ageRange": "3-8",  # Default age range
-            "description": caption_result[0]['generated_text'],
-            "name": generate_character_name(features, emotion),
-            "raw_caption": caption_result[0]['generated_text'],
-            "raw_classification": classification_result[:3]  # Top 3 classifications
-        }
+        if cached is None:
+            if VISION_BACKEND == "local":
+                caption_call, classify_call = (asyncio.wrap_future(f) for f in submit_vision_requests(image))
+            elif VISION_BACKEND == "api":
+                image_bytes = image.jpeg_bytes
+                caption_call = aquery_vision_model(IMAGE_CAPTIONING_API, image_bytes, "get image caption", "caption")
+                classify_call = aquery_vision_model(IMAGE_CLASSIFICATION_API, image_bytes, "classify image", "classify")
+            else:
+                raise ValueError(f"Unknown VISION_BACKEND: {VISION_BACKEND}")
+            colors, caption_result, classification_result = await asyncio.gather(
+                colors_task, caption_call, classify_call
+            )
+            vision_cache.put(image_hash, (caption_result, classification_result))
+        else:
+            colors = await colors_task
+            caption_result, classification_result = cached
         
-        return analysis
+        return build_character_analysis(colors, caption_result, classification_result)
         
     except Exception as e:
-        print(f"Error in character analysis: {str(e)}")
-        # Return fallback analysis if API fails
-        return {
-            "colors": ["blue", "red", "yellow"],
-            "features": ["round shape", "simple lines"],
-            "emotion": "happy",
-            "characteristics": ["friendly", "simple"],
-            "ageRange": "3-5",
-            "description": "A simple, colorful character drawn by hand.",
-            "name": "Doodle",
-            "raw_caption": "Error analyzing image",
-            "raw_classification": []
-        }
+        print(f"[{metrics.current_request_id()}] Error in character analysis: {str(e)}")
+        metrics.count("vision_fallback")
+        return fallback_character_analysis()
 
-def extract_dominant_colors(image, num_colors=3):
-    """Extract dominant colors from image"""
-    # Resize image for faster processing
-    img = image.copy()
-    img.thumbnail((100, 100))
-    
-    # Convert to RGB if not already
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    
-    # Get pixel data
-    pixels = list(img.getdata())
-    
-    # Simple color clustering
-    color_counts = {}
-    for pixel in pixels:
-        # Simplify the color (reduce precision)
-        simple_color = (pixel[0]//25*25, pixel[1]//25*25, pixel[2]//25*25)
-        if simple_color in color_counts:
-            color_counts[simple_color] += 1
-        else:
-            color_counts[simple_color] = 1
-    
-    # Get top colors
-    sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
+def build_character_analysis(colors, caption_result, classification_result):
+    """Turn the model outputs into the character analysis the frontend expects."""
+    # Determine emotion based on classification and caption
+    emotion = determine_emotion(caption_result, classification_result)
     
-    # Convert RGB to color names (simplified)
-    color_names = []
-    for color, _ in sorted_colors[:num_colors]:
-        r, g, b = color
-        # Very simple color naming logic
-        if r > 200 and g > 200 and b > 200:
-            color_names.append("white")
-        elif r < 50 and g < 50 and b < 50:
-            color_names.append("black")
-        elif r > 200 and g < 100 and b < 100:
-            color_names.append("red")
-        elif r < 100 and g > 200 and b < 100:
-            color_names.append("green")
-        elif r < 100 and g < 100 and b > 200:
-            color_names.append("blue")
-        elif r > 200 and g > 200 and b < 100:
-            color_names.append("yellow")
-        elif r > 200 and g < 100 and b > 200:
-            color_names.append("pink")
-        elif r < 100 and g > 200 and b > 200:
-            color_names.append("cyan")
-        elif r > 200 and g > 130 and b < 100:
-            color_names.append("orange")
-        elif r > 130 and g < 100 and b > 130:
-            color_names.append("purple")
-        else:
-            color_names.append("mixed")
+    # Process caption to extract features
+    features = extract_features_from_caption(caption_result[0]['generated_text'])
     
-    return color_names
+    return {
+        "colors": colors,
+        "features": features,
+        "emotion": emotion,
+        "characteristics": derive_characteristics(features, emotion),
+        "ageRange": "3-8",  # Default age range
+        "description": caption_result[0]['generated_text'],
+        "name": generate_character_name(features, emotion),
+        "raw_caption": caption_result[0]['generated_text'],
+        "raw_classification": classification_result[:3]  # Top 3 classifications
+    }
+
+def fallback_character_analysis():
+    """Served when the vision models fail."""
+    return {
+        "colors": ["blue", "red", "yellow"],
+        "features": ["round shape", "simple lines"],
+        "emotion": "happy",
+        "characteristics": ["friendly", "simple"],
+        "ageRange": "3-5",
+        "description": "A simple, colorful character drawn by hand.",
+        "name": "Doodle",
+        "raw_caption": "Error analyzing image",
+        "raw_classification": []
+    }
 
 def determine_emotion(caption_result, classification_result):
     """Determine the emotion based on image analysis"""
@@ -318,18 +367,45 @@ def generate_character_name(features, emotion):
 #                       f"The end."
 #         }
 
+def _load_character_chain():
+    # Imported here because langchain and Chroma take seconds to import
+    from rag_engine.rag_chain import get_rag_chain
+    return get_rag_chain()
+
+registry.register("character_chain", _load_character_chain)
+if VISION_BACKEND == "local":
+    registry.register("local_vision", lambda: (caption_model.warmup(), classify_model.warmup()))
+
 def generate_story_with_character(character_analysis):
     try:
-        return generate_story_rag(character_analysis)
+        from rag_engine.rag_chain import generate_story_rag
+        with metrics.timed("generation"):
+            return generate_story_rag(character_analysis, registry.get("character_chain"))
+    except Exception as e:
+        print(f"[{metrics.current_request_id()}] Error in RAG story generation: {str(e)}")
+        metrics.count("fallback_story")
+        return {
+            "title": f"The Adventures of {character_analysis.get('name', 'Buddy')}",
+            "content": f"{character_analysis.get('name', 'Buddy')} was very {character_analysis.get('emotion', 'happy')}..."
+        }
+
+async def agenerate_story_with_character(character_analysis):
+    """``generate_story_with_character`` with the chain called through ``ainvoke``."""
+    try:
+        from rag_engine.rag_chain import agenerate_story_rag
+        chain = await registry.aget("character_chain")
+        with metrics.timed("generation"):
+            return await agenerate_story_rag(character_analysis, chain)
     except Exception as e:
-        print(f"Error in RAG story generation: {str(e)}")
+        print(f"[{metrics.current_request_id()}] Error in RAG story generation: {str(e)}")
+        metrics.count("fallback_story")
         return {
             "title": f"The Adventures of {character_analysis.get('name', 'Buddy')}",
             "content": f"{character_analysis.get('name', 'Buddy')} was very {character_analysis.get('emotion', 'happy')}..."
         }
 
 # def generate_story_with_character(character, rag_chain=None):
-#     chain = rag_chain or setup_rag_chain()
+#     chain = rag_chain or get_rag_chain()
 #     result = chain.invoke({
 #         "name": character.get("name") or "Buddy",
 #         "description": character.get("description") or "a fun-loving character",
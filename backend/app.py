@@ -1,28 +1,29 @@
 # app.py
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import base64
 import os
 import time
 import json
-import spacy
-import requests
 # import openai
-from deep_translator import GoogleTranslator
-from transformers import pipeline
 from bs4 import BeautifulSoup
 import random
 from services.recognizer import recognize_speech
-from gtts import gTTS
-import tempfile
-import uuid
 from flask import send_file
 from gtts.lang import tts_langs
 
 from dotenv import load_dotenv
 from ai_service import analyze_character_image, generate_story_with_character
-from image_processor import preprocess_image
+from image_processor import MAX_UPLOAD_BYTES, ImageTooLarge, load_image
 from routes.story_routes import story_bp
+from services.http_client import http_client
+from services.story_fetcher import story_fetcher
+from services.emotion_service import detect_emotion
+from services.gazetteer import detect_entity
+from services.translation import translator
+from services.tts_cache import tts_service
+from services.registry import registry
+from services import metrics
 
 
 load_dotenv()
@@ -30,9 +31,21 @@ load_dotenv()
 app = Flask(__name__)
 app.register_blueprint(story_bp, url_prefix='/api')
 CORS(app)  # Enable CORS for all routes
-# Load spaCy model for entity detection
-nlp = spacy.load("en_core_web_sm")
-emotion_detector = pipeline("text-classification", model="joeddav/distilbert-base-uncased-go-emotions-student")
+# Request IDs (X-Request-ID in and out) and per-request latency, see /api/metrics
+metrics.init_app(app)
+
+# Heavy models load on first use; long-running servers warm them up in the
+# background, starting with the first request a worker gets (not at import,
+# which gunicorn --preload does before forking the workers). Serverless
+# (Vercel) instances skip it, since a cold start should only pay for what the
+# request needs.
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "0" if os.getenv("VERCEL") else "1") == "1"
+
+@app.before_request
+def start_warmup():
+    if WARMUP_ON_START:
+        registry.start_warmup()
+
 # Language codes mapping
 LANGUAGES = {
     "English": "en",
@@ -53,22 +66,6 @@ LANGUAGES = {
     "Korean": "ko"
 }
 
-# Global mythology database
-GLOBAL_MYTHOLOGY = {
-    "sita": "Hindu Goddess, wife of Lord Rama",
-    "ram": "Lord Rama, prince of Ayodhya from the Ramayana",
-    "hanuman": "Mighty Vanara, devotee of Lord Rama",
-    "krishna": "Hindu God, central figure of Mahabharata",
-    "arjuna": "Great warrior, disciple of Krishna",
-    "shiva": "Supreme God of destruction in Hinduism",
-    "zeus": "Greek God of Thunder and King of Olympus",
-    "odin": "Norse God of wisdom, war, and death",
-    "isis": "Egyptian Goddess of motherhood and magic",
-    "hansel": "German folklore character from 'Hansel and Gretel'",
-    "coyote": "Trickster figure from Native American mythology",
-    "sun wukong": "Chinese Monkey King, central figure in Journey to the West",
-    "quetzalcoatl": "Aztec feathered serpent god of wisdom",
-}
 #openai.api_key = os.getenv("OPENAI_API_KEY")
 
 @app.route("/api/voice", methods=["GET"])
@@ -76,23 +73,10 @@ def voice_input():
     result = recognize_speech()
     return jsonify(result)
 
-def detect_emotion(text):
-    """Enhanced sentiment analysis using a deep learning model."""
-    emotions = emotion_detector(text)
-    top_emotion = max(emotions, key=lambda x: x['score'])['label']
-    return top_emotion.lower()
-
-def detect_entity(text):
-    """Check if text contains known mythological/historical figures."""
-    words = text.lower().split()
-    entities = [GLOBAL_MYTHOLOGY[word] for word in words if word in GLOBAL_MYTHOLOGY]
-    return ", ".join(entities) if entities else "No special figures detected."
-
-
 def translate_text(text, dest_language='en'):
     """Translate text to the specified language."""
-    translator = GoogleTranslator(source="auto", target=dest_language)
-    return translator.translate(text)
+    with metrics.timed("translation"):
+        return translator.translate(text, dest_language)
 
 def fetch_stories():
     """Fetch stories from various story websites."""
@@ -107,16 +91,11 @@ def fetch_stories():
         "https://www.kidsgen.com/fables_and_fairytales/african_folk_tales/",  
     ]
     
-    stories = []
-    for url in urls:
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                extracted_stories = [story.text for story in soup.find_all("p")[:5]]  
-                stories.extend(extracted_stories)
-        except requests.exceptions.RequestException:
-            continue  
+    # Fetched concurrently, cached on disk and bounded by STORY_FETCH_DEADLINE
+    with metrics.timed("scrape") as timer:
+        stories = story_fetcher.fetch_paragraphs(urls, limit=5)
+        if not stories:
+            timer["outcome"] = "empty"
 
     return "\n".join(stories) if stories else "No online stories found."
 
@@ -169,10 +148,13 @@ def generate_story():
     cultural_context = data.get('cultural_context', False)
     language = data.get('language', 'English')
     user_preferences = data.get('user_preferences', {})
+    metrics.set_labels(theme=user_preferences.get('genre', ''), language=LANGUAGES.get(language, language))
     
     # Process the request
-    emotion = detect_emotion(query)
-    entity_info = detect_entity(query)
+    with metrics.timed("emotion"):
+        emotion = detect_emotion(query)
+    with metrics.timed("entity"):
+        entity_info = detect_entity(query)
     online_stories = fetch_stories() if cultural_context else "No additional cultural stories fetched."
     
     # Generate story
@@ -206,22 +188,23 @@ def analyze_character():
     try:
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
+        if (request.content_length or 0) > MAX_UPLOAD_BYTES:
+            return jsonify({"error": "Image is too large"}), 413
             
         data = request.json
         if not data or 'image' not in data:
             return jsonify({"error": "No image data provided"}), 400
             
-        image_data = data.get('image')
-        
-        # Extract image data from base64 string (remove data:image/png;base64, prefix)
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Preprocess the image
-        processed_image = preprocess_image(image_data)
+        # Decode and preprocess once; oversize uploads are refused before decoding
+        try:
+            image = load_image(data.get('image'))
+        except ImageTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Analyze character using Hugging Face models
-        character_analysis = analyze_character_image(processed_image)
+        character_analysis = analyze_character_image(image)
         
         if not character_analysis:
             return jsonify({"error": "Failed to analyze character"}), 500
@@ -246,6 +229,28 @@ def generate_story_rag():
 def health_check():
     return jsonify({"status": "healthy", "message": "Server is running"})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms and event counters in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/http-stats', methods=['GET'])
+def http_stats():
+    """Outbound requests, new connections and retries per host; reuse_ratio near 1 means handshakes are rare."""
+    return jsonify(http_client.stats.snapshot())
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """200 once every warm resource has loaded, 503 before that."""
+    ready = registry.ready()
+    return jsonify({"ready": ready, "resources": registry.status()}), (200 if ready else 503)
+
+@app.route('/api/warmup', methods=['POST'])
+def warmup():
+    """Load every warm resource now (blocking) and report how it went."""
+    status = registry.warmup()
+    return jsonify({"ready": registry.ready(), "resources": status}), (200 if registry.ready() else 503)
+
 @app.route('/api/text-to-speech', methods=['POST'])
 def text_to_speech():
     try:
@@ -256,41 +261,51 @@ def text_to_speech():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
             
-        # Create a temporary file
-        temp_dir = tempfile.gettempdir()
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join(temp_dir, filename)
-        
-        try:
-            # Generate speech with error handling for unsupported languages
-            tts = gTTS(text=text, lang=language)
-            tts.save(filepath)
-        except Exception as e:
-            # If language is not supported, fall back to English
-            if "language not supported" in str(e).lower():
-                print(f"Language {language} not supported, falling back to English")
-                tts = gTTS(text=text, lang='en')
-                tts.save(filepath)
-            else:
-                raise e
+        # Cached by (text, language); the same story is only synthesized once
+        metrics.set_labels(language=language)
+        with metrics.timed("tts"):
+            audio_id, filepath = tts_service.synthesize(text, language)
         
         # Send the file
-        return send_file(
+        response = send_file(
             filepath,
             mimetype='audio/mpeg',
             as_attachment=True,
-            download_name=filename
+            download_name=f"{audio_id}.mp3"
         )
+        # GET this URL for seeking (Range requests) and browser caching
+        response.headers['X-Audio-URL'] = f"/api/text-to-speech/{audio_id}.mp3"
+        return response
     except Exception as e:
         print(f"Error in text-to-speech: {str(e)}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        # Clean up the temporary file
-        if 'filepath' in locals():
-            try:
-                os.remove(filepath)
-            except:
-                pass
+
+@app.route('/api/text-to-speech/<audio_id>.mp3', methods=['GET'])
+def text_to_speech_audio(audio_id):
+    """Serve previously synthesized audio with Range and conditional request support."""
+    try:
+        filepath = tts_service.cache.get(audio_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid audio id'}), 400
+    if not filepath:
+        return jsonify({'error': 'Audio not found'}), 404
+    return send_file(filepath, mimetype='audio/mpeg', conditional=True, etag=audio_id, max_age=86400)
+
+@app.route('/api/text-to-speech/stream', methods=['POST'])
+def text_to_speech_stream():
+    """Stream MP3 audio sentence by sentence, starting as soon as the first is ready."""
+    data = request.json
+    text = data.get('text')
+    language = data.get('language', 'en')
+    
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    
+    return Response(
+        stream_with_context(tts_service.stream(text, language)),
+        mimetype='audio/mpeg',
+        headers={'X-Audio-URL': f"/api/text-to-speech/{tts_service.audio_id(text, language)}.mp3"}
+    )
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+# asgi_app.py
+#
+# Async serving mode. The I/O-bound endpoints (story generation and
+# streaming, drawing analysis, character stories, text-to-speech) are served
+# by a Quart app whose outbound calls are awaited, so one worker holds
+# hundreds of story sessions at once while they wait on the LLM. Every other
+# route falls through to the Flask app in app.py, run in a thread pool.
+#
+#     hypercorn asgi_app:app --bind 0.0.0.0:5000 --workers 1
+
+import asyncio
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, request
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from app import WARMUP_ON_START, app as flask_app
+from image_processor import MAX_UPLOAD_BYTES
+from routes.async_story_routes import async_story_bp
+from services import metrics
+from services.http_client import aclose_async_client
+from services.registry import registry
+
+quart_app = Quart(__name__)
+quart_app.config["MAX_CONTENT_LENGTH"] = None  # routes check MAX_UPLOAD_BYTES themselves
+quart_app.register_blueprint(async_story_bp, url_prefix='/api')
+
+wsgi_app = AsyncioWSGIMiddleware(flask_app, max_body_size=MAX_UPLOAD_BYTES)
+
+
+@quart_app.before_request
+async def _start_request():
+    metrics.start_request(request.headers.get(metrics.REQUEST_ID_HEADER))
+
+
+@quart_app.after_request
+async def _finish_request(response):
+    request_id = metrics.current_request_id()
+    if request_id:
+        response.headers[metrics.REQUEST_ID_HEADER] = request_id
+    # Same as flask_cors' defaults in app.py
+    response.headers.setdefault("Access-Control-Allow-Origin", "*")
+    if request.method == "OPTIONS":
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = request.headers.get(
+            "Access-Control-Request-Headers", "Content-Type"
+        )
+    metrics.finish_request(request.endpoint, request.method, response.status_code)
+    return response
+
+
+@quart_app.before_serving
+async def _start_warmup():
+    # In the worker process, like app.py's first-request hook
+    if WARMUP_ON_START:
+        registry.start_warmup()
+
+
+@quart_app.after_serving
+async def _close_clients():
+    await aclose_async_client()
+
+
+def _is_async_route(scope):
+    adapter = quart_app.url_map.bind("localhost")
+    try:
+        adapter.match(scope["path"], method=scope.get("method", "GET"))
+    except (NotFound, MethodNotAllowed):
+        return False
+    return True
+
+
+async def app(scope, receive, send):
+    """ASGI entry point: async routes go to Quart, the rest to Flask."""
+    if scope["type"] == "http" and not _is_async_route(scope):
+        await wsgi_app(scope, receive, send)
+    else:
+        # Lifespan events go to Quart too, which starts and stops the async clients
+        await quart_app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = ["0.0.0.0:5000"]
+    asyncio.run(serve(app, config))
@@ -0,0 +1,226 @@
+# benchmarks/bench_async.py
+#
+# Concurrent story sessions on one worker: the sync Flask app (one request at
+# a time, like a gunicorn sync worker, or a fixed thread pool like gthread)
+# against the async app in asgi_app.py on a single event loop. Each session
+# starts a story and continues it once, against the fake LLM from
+# benchmarks/loadtest. Every worker runs in its own process; the load
+# generator is a bare asyncio HTTP client so it can open hundreds of
+# connections without becoming the bottleneck. Exits non-zero if the async
+# worker doesn't keep its sessions concurrent. Run from the backend directory:
+#
+#     python -m benchmarks.bench_async
+#     python -m benchmarks.bench_async --sessions 500 --llm-ms 2000 --sync-threads 32
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.loadtest.fakes import DEFAULT_FAKES
+from benchmarks.loadtest.run import percentile
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(mode, port, llm_ms, threads):
+    """Worker process: the app with fakes installed, until killed."""
+    cache_dir = tempfile.mkdtemp(prefix="bench-async-")
+    os.environ.update({
+        "WARMUP_ON_START": "0",
+        "TRANSLATION_BACKEND": "local",
+        "TTS_ENGINE": "local",
+        "SLOW_REQUEST_SECONDS": "1e9",
+        "TRANSLATION_CACHE_PATH": os.path.join(cache_dir, "translation_cache.sqlite3"),
+        "TTS_CACHE_DIR": os.path.join(cache_dir, "tts_cache"),
+        "STORY_FETCH_CACHE_DIR": os.path.join(cache_dir, "fetch_cache"),
+        "SESSION_STORE": "memory",
+    })
+    from benchmarks.loadtest.fakes import install
+
+    if mode == "async":
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+
+        from asgi_app import app
+        install(dict(DEFAULT_FAKES, llm=str(llm_ms), retrieval="0"), cache_dir)
+        config = Config()
+        config.bind = [f"127.0.0.1:{port}"]
+        config.backlog = 4096
+        config.accesslog = None
+        asyncio.run(hypercorn_serve(app, config))
+        return
+
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+    from socketserver import ThreadingMixIn
+
+    from werkzeug.serving import BaseWSGIServer
+
+    from app import app
+    install(dict(DEFAULT_FAKES, llm=str(llm_ms), retrieval="0"), cache_dir)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    class PooledServer(ThreadingMixIn, BaseWSGIServer):
+        request_queue_size = 4096
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    class SyncServer(BaseWSGIServer):
+        request_queue_size = 4096
+
+    server = (SyncServer if threads == 1 else PooledServer)("127.0.0.1", port, app)
+    server.serve_forever()
+
+
+def start_worker(mode, llm_ms, threads=1):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_async", "--serve", mode, "--port", str(port),
+         "--llm-ms", str(llm_ms), "--sync-threads", str(threads)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return port, process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit(f"{mode} worker exited with code {process.returncode}")
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{mode} worker did not start")
+
+
+async def post_json(port, path, body, timeout):
+    """One HTTP/1.1 POST on a fresh connection; returns (status, parsed JSON)."""
+    payload = json.dumps(body).encode("utf-8")
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("ascii") + payload
+        )
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, content = raw.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    if b"transfer-encoding: chunked" in head.lower():
+        content = _dechunk(content)
+    return status, json.loads(content) if status == 200 else None
+
+
+def _dechunk(data):
+    body = b""
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        body, data = body + data[:size], data[size + 2:]
+    return body
+
+
+async def run_sessions(port, sessions, timeout):
+    """Start and continue ``sessions`` stories at once; returns (wall seconds, latencies, errors)."""
+    latencies = []
+    errors = 0
+
+    async def session(i):
+        nonlocal errors
+        try:
+            start = time.perf_counter()
+            status, started = await post_json(port, "/api/start-story", {
+                "theme": "adventure", "storyLength": 1, "initialPrompt": f"A brave fox, take {i}", "language": "en"
+            }, timeout)
+            if status != 200:
+                raise RuntimeError(f"start-story answered {status}")
+            latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            status, _ = await post_json(port, "/api/continue-story", {
+                "sessionId": started["sessionId"], "userInput": "Then the fox found a map"
+            }, timeout)
+            if status != 200:
+                raise RuntimeError(f"continue-story answered {status}")
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors += 1
+            if errors <= 3:
+                print(f"  session {i} failed: {type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return wall, latencies, errors
+
+
+def report(label, sessions, wall, latencies, errors):
+    print(
+        f"{label:<22} {sessions:8d} {errors:6d} {wall:8.2f} {len(latencies) / wall:8.1f} "
+        f"{percentile(latencies, 50) * 1e3:9.0f} {percentile(latencies, 99) * 1e3:9.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent story sessions: sync vs async worker.")
+    parser.add_argument("--sessions", type=int, default=300, help="concurrent sessions on the async worker")
+    parser.add_argument("--sync-sessions", type=int, default=32, help="concurrent sessions on the sync workers")
+    parser.add_argument("--sync-threads", type=int, default=16, help="threads of the gthread-style worker")
+    parser.add_argument("--llm-ms", type=float, default=1000, help="fake LLM latency")
+    parser.add_argument("--max-slowdown", type=float, default=3.0,
+                        help="fail if the async p99 exceeds this many LLM round trips")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--serve", choices=["sync", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.llm_ms, args.sync_threads)
+        return 0
+
+    print(f"fake LLM {args.llm_ms:.0f}ms; each session is start-story + continue-story\n")
+    print(f"{'worker':<22} {'sessions':>8} {'errors':>6} {'wall s':>8} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+
+    runs = [
+        ("sync, 1 thread", "sync", 1, args.sync_sessions),
+        (f"sync, {args.sync_threads} threads", "sync", args.sync_threads, args.sync_sessions),
+        ("async, 1 event loop", "async", 1, args.sessions),
+    ]
+    for label, mode, threads, sessions in runs:
+        port, process = start_worker(mode, args.llm_ms, threads)
+        try:
+            wall, latencies, errors = asyncio.run(run_sessions(port, sessions, args.timeout))
+        finally:
+            process.terminate()
+            process.wait()
+        report(label, sessions, wall, latencies, errors)
+
+    # The last run is the async worker
+    p99 = percentile(latencies, 99)
+    limit = args.max_slowdown * args.llm_ms / 1000
+    if errors or p99 > limit:
+        print(f"\nFAIL: async p99 {p99:.2f}s (limit {limit:.2f}s), {errors} failed sessions")
+        return 1
+    print(f"\nOK: {args.sessions} concurrent sessions on one event loop, p99 {p99:.2f}s (limit {limit:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
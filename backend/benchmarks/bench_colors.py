@@ -0,0 +1,81 @@
+# benchmarks/bench_colors.py
+#
+# Per-image time of dominant-color extraction: the NumPy histogram and k-means
+# modes against the previous per-pixel Python loop. Run from the backend directory:
+#
+#     python -m benchmarks.bench_colors
+
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from services.colors import color_name, extract_dominant_colors
+
+
+def legacy_extract_dominant_colors(image, num_colors=3):
+    """The per-pixel loop this module replaced."""
+    img = image.copy()
+    img.thumbnail((100, 100))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    pixels = list(img.getdata())
+    color_counts = {}
+    for pixel in pixels:
+        simple_color = (pixel[0]//25*25, pixel[1]//25*25, pixel[2]//25*25)
+        if simple_color in color_counts:
+            color_counts[simple_color] += 1
+        else:
+            color_counts[simple_color] = 1
+
+    sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
+    return [color_name(*color) for color, _ in sorted_colors[:num_colors]]
+
+
+def make_drawing(seed, size=(800, 600)):
+    """A child's-drawing-like image: flat background, filled shapes, soft edges."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+    palette = [(230, 40, 40), (40, 90, 230), (250, 220, 40), (40, 200, 70), (240, 140, 30), (150, 60, 170)]
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(30, 160)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=rng.choice(palette), outline=(20, 20, 20), width=4)
+    return img.filter(ImageFilter.GaussianBlur(1.5))
+
+
+def bench(label, fn, images, repeat):
+    for image in images:
+        fn(image)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            fn(image)
+    per_image = (time.perf_counter() - start) / (repeat * len(images))
+    print(f"{label:<28} {per_image * 1e3:8.2f} ms/image")
+    return per_image
+
+
+def main():
+    images = [make_drawing(seed) for seed in range(20)]
+    thumbnails = [image.copy() for image in images]
+    for thumb in thumbnails:
+        thumb.thumbnail((100, 100))
+
+    mismatches = sum(
+        legacy_extract_dominant_colors(image) != extract_dominant_colors(image) for image in images
+    )
+    print(f"histogram mode matches the legacy palette on {len(images) - mismatches}/{len(images)} images")
+
+    for label, inputs in (("800x600 drawings", images), ("100x100 thumbnails", thumbnails)):
+        print(f"\n{label}:")
+        legacy = bench("legacy Python loop", legacy_extract_dominant_colors, inputs, repeat=5)
+        hist = bench("numpy histogram", extract_dominant_colors, inputs, repeat=5)
+        bench("numpy k-means", lambda image: extract_dominant_colors(image, method="kmeans"), inputs, repeat=5)
+        print(f"histogram speedup: {legacy / hist:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_content_filter.py
+#
+# Throughput of the kid-safety filter: the compiled Aho-Corasick automaton
+# against the previous per-word substring scan. Run from the backend directory:
+#
+#     python -m benchmarks.bench_content_filter
+
+import time
+
+from services.content_filter import (
+    compile_artifact,
+    load_content_filter,
+    load_ibw_words,
+    normalize_text,
+)
+
+SAMPLE_STORY = (
+    "Once upon a time, in a quiet village by the river, a small dragon named Ember "
+    "loved to paint the clouds at sunset. Every evening the children gathered on the "
+    "hill to watch the sky turn orange, pink and purple. One day a storm rolled in and "
+    "the clouds turned grey. Ember flew up high, took a deep breath and painted a "
+    "rainbow across the whole valley. The villagers cheered and the children danced. "
+    "What do you think Ember should paint tomorrow? "
+)
+
+
+def legacy_is_clean(text, bad_words):
+    """The substring scan this module replaced."""
+    text_lower = text.lower()
+    for word in bad_words:
+        if word in text_lower:
+            return False
+    return True
+
+
+def bench(label, fn, text, repeat):
+    fn(text)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    elapsed = time.perf_counter() - start
+    mb_per_s = len(text.encode("utf-8")) * repeat / elapsed / 1e6
+    print(f"{label:<28} {elapsed / repeat * 1e6:10.1f} us/call {mb_per_s:8.2f} MB/s")
+
+
+def main():
+    start = time.perf_counter()
+    compile_artifact()
+    print(f"compile from text           {(time.perf_counter() - start) * 1e3:10.1f} ms")
+
+    start = time.perf_counter()
+    content_filter = load_content_filter()
+    print(f"open artifact (mmap)        {(time.perf_counter() - start) * 1e3:10.1f} ms")
+
+    bad_words = [normalize_text(w) for words in load_ibw_words().values() for w in words]
+    print(f"patterns                    {len(bad_words):10d}")
+    print()
+
+    for multiplier in (1, 10, 50):
+        text = SAMPLE_STORY * multiplier
+        repeat = max(20, 2000 // multiplier)
+        print(f"text of {len(text)} chars")
+        bench("  substring scan", lambda t: legacy_is_clean(t, bad_words), text, repeat)
+        bench("  aho-corasick", content_filter.is_clean, text, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_emotion.py
+#
+# Emotion detection throughput: one pipeline call per text (the previous
+# app.detect_emotion) against concurrent callers sharing the micro-batched
+# EmotionService, plus the cached path. Run from the backend directory:
+#
+#     python -m benchmarks.bench_emotion
+#     python -m benchmarks.bench_emotion --model path/to/checkpoint --clients 32 --quantize
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.emotion_service import EMOTION_MODEL, EmotionService
+from services.inference import load_pipeline
+
+SAMPLE_QUERIES = [
+    "Tell me a story about a brave little elephant",
+    "I am scared of the dark, can you tell me a bedtime story?",
+    "My puppy ran away today and I miss him",
+    "Hanuman jumped across the ocean!",
+    "Why did the dragon get so angry at the village?",
+    "I love my grandmother's stories about the moon",
+    "Can the rabbit win the race this time?",
+    "The princess was surprised to find a talking tiger",
+]
+
+
+def make_texts(count):
+    # Distinct texts so the cache doesn't hide the model cost
+    return [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} ({i})" for i in range(count)]
+
+
+def report(label, seconds, count):
+    print(f"{label:<36} {count / seconds:8.1f} texts/s   {seconds / count * 1e3:7.2f} ms/text")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=EMOTION_MODEL)
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent callers")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--runtime", default="torch", choices=["torch", "onnx"])
+    parser.add_argument("--quantize", action="store_true")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+
+    pipe = load_pipeline("text-classification", args.model, args.runtime, args.quantize, args.threads)
+    pipe(texts[0])
+    start = time.perf_counter()
+    for text in texts:
+        pipe(text)
+    report("single calls, one at a time", time.perf_counter() - start, len(texts))
+
+    with ThreadPoolExecutor(max_workers=args.clients) as clients:
+        start = time.perf_counter()
+        list(clients.map(pipe, texts))
+        report(f"single calls, {args.clients} clients", time.perf_counter() - start, len(texts))
+
+        service = EmotionService(
+            model=args.model, runtime=args.runtime, quantize=args.quantize, threads=args.threads,
+            batch_size=args.batch_size, max_wait_ms=args.max_wait_ms
+        )
+        service.pipeline._pipe = pipe
+        start = time.perf_counter()
+        list(clients.map(service.detect, texts))
+        report(f"micro-batched, {args.clients} clients", time.perf_counter() - start, len(texts))
+
+        start = time.perf_counter()
+        list(clients.map(service.detect, texts))
+        report(f"cached, {args.clients} clients", time.perf_counter() - start, len(texts))
+
+    print(f"\nservice stats: {service.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_llm_router.py
+#
+# Tail latency of LLM calls through services/llm_router.py, against fake
+# providers: one whose latency has a heavy tail (most answers are quick, a
+# few stall), with and without hedging, and one that hangs until its timeout,
+# with the circuit breaker sending traffic to the fallback. Exits non-zero if
+# hedging doesn't cut the p99. Run from the backend directory:
+#
+#     python -m benchmarks.bench_llm_router
+#     python -m benchmarks.bench_llm_router --calls 1000 --slow-rate 0.03
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.loadtest.run import percentile
+from services.llm_router import LLMRouter, Provider
+
+
+class FakeLLM:
+    """Answers after ``latency`` seconds, or ``slow`` seconds for a ``slow_rate`` share of calls."""
+
+    def __init__(self, latency, slow=0.0, slow_rate=0.0, down=False, seed=0):
+        self.latency = latency
+        self.slow = slow
+        self.slow_rate = slow_rate
+        self.down = down
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, prompt, system=None, max_tokens=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            stalled = self._random.random() < self.slow_rate
+            seconds = (self.slow if stalled else self.latency) * self._random.uniform(0.8, 1.2)
+        if self.down:
+            seconds = timeout
+        # A real client gives up at its timeout too
+        time.sleep(min(seconds, timeout))
+        if self.down or seconds > timeout:
+            raise TimeoutError("fake LLM timed out")
+        return "Once upon a time..."
+
+
+def run(router, calls, concurrency):
+    """``calls`` routed generations, ``concurrency`` at a time; returns (latencies, failures)."""
+    latencies = []
+    failures = 0
+
+    def one(_):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            router.generate("Tell me a story")
+        except Exception:
+            failures += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    latencies.sort()
+    return latencies, failures
+
+
+def report(label, latencies, failures, upstream_calls, calls):
+    print(
+        f"{label:<30} {percentile(latencies, 50) * 1e3:8.0f} {percentile(latencies, 95) * 1e3:8.0f} "
+        f"{percentile(latencies, 99) * 1e3:8.0f} {latencies[-1] * 1e3:8.0f} {failures:6d} "
+        f"{upstream_calls / calls:9.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM router tail latency against fake providers.")
+    parser.add_argument("--calls", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200, help="typical answer time")
+    parser.add_argument("--slow-ms", type=float, default=2500, help="answer time of a stalled call")
+    parser.add_argument("--slow-rate", type=float, default=0.04, help="share of calls that stall")
+    parser.add_argument("--timeout", type=float, default=5.0, help="per-provider attempt timeout")
+    args = parser.parse_args()
+
+    latency, slow = args.latency_ms / 1000, args.slow_ms / 1000
+    print(f"{args.calls} calls, {args.concurrency} at a time; {args.slow_rate:.0%} of calls stall for "
+          f"{args.slow_ms:.0f}ms\n")
+    print(f"{'router':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>6} "
+          f"{'upstream/call':>9}")
+
+    results = {}
+    for label, hedge in (("no hedging", False), ("hedged at p95", True)):
+        fake = FakeLLM(latency, slow, args.slow_rate)
+        router = LLMRouter(order=["primary"], deadline=args.timeout * 2, hedge=hedge)
+        router.register(Provider("primary", fake, timeout=args.timeout))
+        latencies, failures = run(router, args.calls, args.concurrency)
+        report(label, latencies, failures, fake.calls, args.calls)
+        results[hedge] = percentile(latencies, 99)
+
+    down = FakeLLM(latency, down=True)
+    fallback = FakeLLM(latency * 1.5, seed=1)
+    router = LLMRouter(order=["primary", "fallback"], deadline=args.timeout * 2, hedge=True)
+    router.register(Provider("primary", down, timeout=args.timeout / 5))
+    router.register(Provider("fallback", fallback, timeout=args.timeout))
+    latencies, failures = run(router, args.calls, args.concurrency)
+    report("primary down, breaker", latencies, failures, down.calls + fallback.calls, args.calls)
+    print(f"\nprimary down: {down.calls} of {args.calls} calls waited on it before its breaker opened")
+
+    if results[True] >= results[False]:
+        print(f"\nFAIL: hedged p99 {results[True] * 1e3:.0f}ms is not below {results[False] * 1e3:.0f}ms")
+        return 1
+    print(f"\nOK: hedging cut p99 from {results[False] * 1e3:.0f}ms to {results[True] * 1e3:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
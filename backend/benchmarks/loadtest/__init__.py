@@ -0,0 +1,8 @@
+# benchmarks/loadtest/__init__.py
+#
+# Offline load tests: every external service (Gemini and the vectorstore, the
+# Hugging Face inference API, Google Translate, gTTS and the story websites)
+# is replaced by a local fake with configurable latency and error rate.
+#
+#     python -m benchmarks.loadtest.run      # drive the Flask endpoints
+#     python -m benchmarks.loadtest.micro    # CPU micro-benchmarks
@@ -0,0 +1,351 @@
+# benchmarks/loadtest/fakes.py
+#
+# Local stand-ins for the services the app calls out to. HTTP services (the
+# Hugging Face inference API and the story websites) are served by a real
+# local server, so connection pooling and timeouts are exercised; the rest
+# replace the client objects the app already swaps by configuration.
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services import metrics
+
+
+class FakeServiceError(RuntimeError):
+    pass
+
+
+class FaultInjector:
+    """Latency (mean seconds, +/- jitter as a fraction) and a random error rate."""
+
+    def __init__(self, latency=0.0, jitter=0.2, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        """"LATENCY_MS[:ERROR_RATE]", e.g. "800" or "300:0.05"."""
+        latency, _, error_rate = spec.partition(":")
+        return cls(float(latency) / 1000, error_rate=float(error_rate or 0), seed=seed)
+
+    def delay(self, fraction=1.0):
+        seconds = self.sample(fraction)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def should_fail(self):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return failed
+
+    def __call__(self, name):
+        """Wait out the latency, then raise FakeServiceError if this call is picked to fail."""
+        self.delay()
+        if self.should_fail():
+            raise FakeServiceError(f"injected {name} failure")
+
+    def sample(self, fraction=1.0):
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency * fraction * (1 + spread))
+
+    async def acall(self, name, fraction=1.0):
+        """``__call__`` for async fakes: waits without holding a thread."""
+        await asyncio.sleep(self.sample(fraction))
+        if self.should_fail():
+            raise FakeServiceError(f"injected {name} failure")
+
+    def __repr__(self):
+        return f"{self.latency * 1e3:.0f}ms, {self.error_rate:.0%} errors"
+
+
+STORY_TEXT = (
+    "Once upon a time, a small dragon named Ember lived by the river. "
+    "Every evening she painted the clouds orange and pink. "
+    "One day a storm turned the sky grey, so Ember flew up high and painted a rainbow. "
+    "The whole village cheered and the children danced on the hill. "
+    "What do you think Ember should paint tomorrow?"
+)
+
+
+class FakeStoryGenerator:
+    """Stands in for RAGStoryGenerator: Chroma retrieval with Google embeddings, then Gemini."""
+
+    def __init__(self, retrieval, llm, chunk_size=12):
+        self.retrieval = retrieval
+        self.llm = llm
+        self.chunk_size = chunk_size
+
+    def _retrieve(self):
+        with metrics.timed("retrieval"):
+            self.retrieval("retrieval")
+
+    def retrieve_many(self, user_inputs, theme):
+        # One query-embedding batch and local searches: about one retrieval for the group
+        with metrics.timed("retrieval_batch"):
+            self.retrieval("retrieval")
+        return [["context"] for _ in user_inputs]
+
+    def generate_story(self, user_input, story_history=None, word_count=50, theme="general", formatted_history=None,
+                       context=None):
+        if context is None:
+            self._retrieve()
+        with metrics.timed("llm"):
+            self.llm("llm")
+        return STORY_TEXT
+
+    def stream_story(self, user_input, story_history=None, word_count=50, theme="general", formatted_history=None):
+        self._retrieve()
+        chunks = [STORY_TEXT[i:i + self.chunk_size] for i in range(0, len(STORY_TEXT), self.chunk_size)]
+        with metrics.timed("llm"):
+            # Time to first token is about half the total, the rest trickles in
+            self.llm.delay(0.5)
+            if self.llm.should_fail():
+                raise FakeServiceError("injected llm failure")
+            for chunk in chunks:
+                self.llm.delay(0.5 / len(chunks))
+                yield chunk
+
+    async def agenerate_story(self, user_input, story_history=None, word_count=50, theme="general",
+                              formatted_history=None):
+        with metrics.timed("retrieval"):
+            await self.retrieval.acall("retrieval")
+        with metrics.timed("llm"):
+            await self.llm.acall("llm")
+        return STORY_TEXT
+
+    async def astream_story(self, user_input, story_history=None, word_count=50, theme="general",
+                            formatted_history=None):
+        with metrics.timed("retrieval"):
+            await self.retrieval.acall("retrieval")
+        chunks = [STORY_TEXT[i:i + self.chunk_size] for i in range(0, len(STORY_TEXT), self.chunk_size)]
+        with metrics.timed("llm"):
+            await self.llm.acall("llm", 0.5)
+            for chunk in chunks:
+                await asyncio.sleep(self.llm.sample(0.5 / len(chunks)))
+                yield chunk
+
+
+class FakeCharacterChain:
+    """Stands in for the character story chain of rag_engine/rag_chain.py."""
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def invoke(self, inputs):
+        self.llm("character llm")
+        return STORY_TEXT.replace("Ember", inputs.get("name") or "Buddy")
+
+    async def ainvoke(self, inputs):
+        await self.llm.acall("character llm")
+        return STORY_TEXT.replace("Ember", inputs.get("name") or "Buddy")
+
+
+class FakeEmotionModel:
+    """A text-classification pipeline; one latency per batch, like a forward pass."""
+
+    LABELS = ["joy", "curiosity", "fear", "sadness", "surprise", "neutral"]
+
+    def __init__(self, injector):
+        self.injector = injector
+        self.batches = 0
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        self.batches += 1
+        self.injector("emotion model")
+        return [
+            {"label": self.LABELS[int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % len(self.LABELS)],
+             "score": 0.9}
+            for text in inputs
+        ]
+
+
+class FakeTranslateBackend:
+    """Google Translate: one request per batch of sentences."""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def translate_batch(self, texts, target):
+        self.injector("translate")
+        return [f"[{target}] {text}" for text in texts]
+
+
+class FakeTTSEngine:
+    """gTTS: latency grows with the text, like the real service."""
+
+    name = "fake"
+    FRAME = b"\xff\xfb\x90\xc4" + bytes(413)
+
+    def __init__(self, injector, chars_per_second=2000):
+        self.injector = injector
+        self.chars_per_second = chars_per_second
+
+    def synthesize(self, text, language):
+        self.injector("tts")
+        time.sleep(len(text) / self.chars_per_second)
+        return self.FRAME * max(1, len(text) // 4)
+
+
+def _story_page(key):
+    paragraphs = "".join(f"<p>{sentence}.</p>" for sentence in STORY_TEXT.split(". "))
+    return f"<html><body><h1>Story {key}</h1>{paragraphs}</body></html>".encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject(self, injector):
+        injector.delay()
+        if injector.should_fail():
+            self._send(503, b'{"error": "injected failure"}')
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self._inject(self.server.injectors["hf"]):
+            return
+        if self.path == "/hf/caption":
+            result = [{"generated_text": "a drawing of a happy dragon with big eyes and a hat"}]
+        elif self.path == "/hf/classify":
+            result = [{"label": "dragon", "score": 0.71}, {"label": "cartoon", "score": 0.2},
+                      {"label": "balloon", "score": 0.05}]
+        else:
+            self._send(404)
+            return
+        self._send(200, json.dumps(result).encode("utf-8"))
+
+    def do_GET(self):
+        if not self.path.startswith("/stories/"):
+            self._send(404)
+            return
+        if self._inject(self.server.injectors["web"]):
+            return
+        key = self.path.rsplit("/", 1)[1]
+        etag = f'"{key}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+        self._send(200, _story_page(key), "text/html; charset=utf-8", {"ETag": etag})
+
+
+class FakeHTTPServer:
+    """The Hugging Face inference API and the story websites on one local port."""
+
+    def __init__(self, hf, web, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.injectors = {"hf": hf, "web": web}
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-http", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RewriteAdapter(HTTPAdapter):
+    """Sends every request of a session to the fake server's /stories/<key> instead."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        key = hashlib.sha256(request.url.encode("utf-8")).hexdigest()[:16]
+        request.url = f"{self.base_url}/stories/{key}"
+        return super().send(request, **kwargs)
+
+
+DEFAULT_FAKES = {
+    "llm": "800",
+    "retrieval": "40",
+    "hf": "300",
+    "emotion": "20",
+    "translate": "150",
+    "tts": "250",
+    "web": "200",
+}
+
+
+def install(specs, cache_dir, seed=0):
+    """Point the (already imported) app at fakes; returns (server, injectors).
+
+    ``specs`` maps service name to "LATENCY_MS[:ERROR_RATE]" (see DEFAULT_FAKES).
+    Caches are moved into ``cache_dir`` so a run starts cold and leaves the
+    working tree alone.
+    """
+    import os
+
+    import ai_service
+    from services.emotion_service import emotion_service
+    from services.registry import registry
+    from services.story_fetcher import PageCache, story_fetcher
+    from services.translation import TranslationCache, translator
+    from services.tts_cache import AudioCache, tts_service
+
+    injectors = {
+        name: FaultInjector.parse(specs.get(name, default), seed=seed + i)
+        for i, (name, default) in enumerate(DEFAULT_FAKES.items())
+    }
+
+    server = FakeHTTPServer(injectors["hf"], injectors["web"]).start()
+
+    registry.register("rag_generator", lambda: FakeStoryGenerator(injectors["retrieval"], injectors["llm"]))
+    registry.register("character_chain", lambda: FakeCharacterChain(injectors["llm"]))
+    emotion_service.pipeline._pipe = FakeEmotionModel(injectors["emotion"])
+
+    ai_service.VISION_BACKEND = "api"
+    ai_service.HF_API_TOKEN = "fake"
+    ai_service.IMAGE_CAPTIONING_API = f"{server.base_url}/hf/caption"
+    ai_service.IMAGE_CLASSIFICATION_API = f"{server.base_url}/hf/classify"
+
+    translator.backend = FakeTranslateBackend(injectors["translate"])
+    translator.cache = TranslationCache(os.path.join(cache_dir, "translation_cache.sqlite3"))
+
+    tts_service.engine = FakeTTSEngine(injectors["tts"])
+    tts_service.cache = AudioCache(os.path.join(cache_dir, "tts_cache"))
+
+    story_fetcher.cache = PageCache(os.path.join(cache_dir, "fetch_cache"))
+    story_fetcher.ttl = 0  # revalidate every time, so each request reaches the fake site
+    # A session of its own, since the shared client also carries the Hugging Face calls
+    story_fetcher.session = requests.Session()
+    adapter = RewriteAdapter(server.base_url, pool_maxsize=16)
+    story_fetcher.session.mount("http://", adapter)
+    story_fetcher.session.mount("https://", adapter)
+
+    return server, injectors
@@ -0,0 +1,112 @@
+# benchmarks/loadtest/micro.py
+#
+# CPU micro-benchmarks of the request-path code that never leaves the
+# process: the kid-safety filter (whole-text and streaming), color extraction,
+# story-history formatting and prompt assembly. Run from the backend directory:
+#
+#     python -m benchmarks.loadtest.micro
+#     python -m benchmarks.loadtest.micro --seconds 2 --json
+
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.bench_colors import make_drawing
+from benchmarks.bench_content_filter import SAMPLE_STORY
+from services.colors import extract_dominant_colors
+from services.content_filter import load_content_filter
+from services.prompt_assembler import PromptAssembler
+from services.session_store import format_turn
+from services.story_generation import format_story_history
+from services.text_utils import split_sentences
+
+
+def measure(fn, seconds):
+    """Call fn repeatedly for about ``seconds``; returns seconds per call (best of 3 rounds)."""
+    fn()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / 10:
+            break
+        calls *= 2
+    rounds = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        rounds.append((time.perf_counter() - start) / calls)
+    return min(rounds)
+
+
+def make_history(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"What happens when the dragon meets friend number {turn}?"})
+        history.append({"role": "assistant", "content": SAMPLE_STORY})
+    return history
+
+
+def benchmarks():
+    content_filter = load_content_filter()
+    story = SAMPLE_STORY * 3
+    sentences = split_sentences(story)
+
+    def stream_scan():
+        scanner = content_filter.scanner("en")
+        for sentence in sentences:
+            scanner.feed(sentence + " ")
+
+    drawing = make_drawing(0)
+    thumbnail = drawing.copy()
+    thumbnail.thumbnail((256, 256))
+
+    history_10 = make_history(10)
+    history_50 = make_history(50)
+    transcript = "".join(format_turn(m["role"], m["content"]) for m in history_50)
+    chunks = [SAMPLE_STORY * 2] * 2 + sentences[:5]
+    template = "Context:\n{context}\n\nChild's input: {input}\nStory history: {story_history}\nWords: {word_count}"
+    warm_assembler = PromptAssembler()
+    warm_assembler.assemble(template, "And then?", transcript, chunks, 100)
+
+    def cold_assembly():
+        # A new assembler has no cached summary, like the first request of a restored session
+        PromptAssembler(tokenizer=warm_assembler.tokenizer).assemble(template, "And then?", transcript, chunks, 100)
+
+    return {
+        "safety filter, whole story": lambda: content_filter.is_clean(story, "en"),
+        "safety filter, streamed sentences": stream_scan,
+        "colors, histogram 800x600": lambda: extract_dominant_colors(drawing, method="histogram"),
+        "colors, histogram thumbnail": lambda: extract_dominant_colors(thumbnail, method="histogram"),
+        "colors, kmeans thumbnail": lambda: extract_dominant_colors(thumbnail, method="kmeans"),
+        "history format, 10 turns": lambda: format_story_history(history_10),
+        "history format, 50 turns": lambda: format_story_history(history_50),
+        "session transcript append": lambda: transcript + format_turn("user", "And then?"),
+        "prompt assembly, 50 turns": lambda: warm_assembler.assemble(template, "And then?", transcript, chunks, 100),
+        "prompt assembly, 50 turns, cold": cold_assembly,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU micro-benchmarks of in-process request work.")
+    parser.add_argument("--seconds", type=float, default=1.0, help="rough time per benchmark")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for label, fn in benchmarks().items():
+        per_call = measure(fn, args.seconds)
+        results[label] = per_call
+        if not args.json:
+            print(f"{label:<36} {per_call * 1e6:10.1f} us/call {1 / per_call:12.0f} calls/s")
+    if args.json:
+        print(json.dumps({label: {"seconds_per_call": value} for label, value in results.items()}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
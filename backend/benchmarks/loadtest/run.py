@@ -0,0 +1,196 @@
+# benchmarks/loadtest/run.py
+#
+# Load test of the Flask endpoints with every external service faked (see
+# fakes.py). The app is served by a threaded local server and driven over
+# HTTP at a fixed concurrency, one endpoint at a time. Reports throughput and
+# p50/p95/p99 latency per endpoint, plus where the time went by stage (from
+# services/metrics.py). Run from the backend directory:
+#
+#     python -m benchmarks.loadtest.run
+#     python -m benchmarks.loadtest.run --concurrency 32 --requests 400 start-story continue-story
+#     python -m benchmarks.loadtest.run --fake llm=2000:0.05 --fake hf=500 --repeat-payloads
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .fakes import DEFAULT_FAKES
+from .scenarios import SCENARIOS
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100) - 1))
+    return sorted_values[rank]
+
+
+def drive(base_url, scenario, total, concurrency, unique, timeout):
+    """Send ``total`` requests with ``concurrency`` in flight; returns the result row."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    local = threading.local()
+
+    def worker():
+        local.session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter)
+            if i >= total:
+                return
+            method, path, body = scenario(i, unique)
+            start = time.perf_counter()
+            try:
+                response = local.session.request(method, base_url + path, json=body, timeout=timeout)
+                response.content  # read the whole body
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ok = sum(n for status, n in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "requests": total,
+        "ok": ok,
+        "errors": total - ok,
+        "statuses": {str(status): n for status, n in sorted(statuses.items(), key=str)},
+        "throughput": total / wall,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def stage_breakdown(before, after):
+    """Mean seconds and call count per stage between two STAGE_SECONDS snapshots."""
+    totals = {}
+    for key, (count, seconds) in after.items():
+        old_count, old_seconds = before.get(key, (0, 0.0))
+        if count == old_count:
+            continue
+        stage = key[0]
+        calls, total = totals.get(stage, (0, 0.0))
+        totals[stage] = (calls + count - old_count, total + seconds - old_seconds)
+    return {stage: {"calls": calls, "mean": total / calls} for stage, (calls, total) in totals.items()}
+
+
+def print_row(name, row):
+    print(
+        f"{name:<16} {row['requests']:6d} {row['errors']:6d} {row['throughput']:8.1f} "
+        f"{row['p50'] * 1e3:9.1f} {row['p95'] * 1e3:9.1f} {row['p99'] * 1e3:9.1f} {row['max'] * 1e3:9.1f}"
+    )
+    if row["errors"]:
+        print(f"{'':<16} statuses: {row['statuses']}")
+    stages = ", ".join(
+        f"{stage} {info['mean'] * 1e3:.0f}ms x{info['calls']}"
+        for stage, info in sorted(row["stages"].items(), key=lambda item: -item[1]["mean"] * item[1]["calls"])
+    )
+    if stages:
+        print(f"{'':<16} stages: {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Flask endpoints against local fakes.")
+    parser.add_argument("endpoints", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--repeat-payloads", action="store_true",
+                        help="cycle through a few payloads so caches get hits (default: all unique)")
+    parser.add_argument("--fake", action="append", default=[], metavar="SERVICE=MS[:ERROR_RATE]",
+                        help=f"latency and error rate of a fake; services: {', '.join(DEFAULT_FAKES)}")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.endpoints if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    specs = dict(DEFAULT_FAKES)
+    for spec in args.fake:
+        name, _, value = spec.partition("=")
+        if name not in DEFAULT_FAKES or not value:
+            parser.error(f"--fake expects SERVICE=MS[:ERROR_RATE] with SERVICE in {', '.join(DEFAULT_FAKES)}")
+        specs[name] = value
+
+    cache_dir = tempfile.mkdtemp(prefix="loadtest-")
+    # Before the app is imported: no warmup, offline clients, caches outside the tree
+    os.environ.update({
+        "WARMUP_ON_START": "0",
+        "TRANSLATION_BACKEND": "local",
+        "TTS_ENGINE": "local",
+        "VISION_BACKEND": "api",
+        "SLOW_REQUEST_SECONDS": "1e9",
+        "TRANSLATION_CACHE_PATH": os.path.join(cache_dir, "translation_cache.sqlite3"),
+        "TTS_CACHE_DIR": os.path.join(cache_dir, "tts_cache"),
+        "STORY_FETCH_CACHE_DIR": os.path.join(cache_dir, "fetch_cache"),
+        "SESSION_STORE": "memory",
+    })
+
+    from werkzeug.serving import make_server
+
+    from app import app
+    from services import metrics
+    from .fakes import install
+
+    fake_server, injectors = install(specs, cache_dir, seed=args.seed)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    endpoints = args.endpoints or list(SCENARIOS)
+    if not args.json:
+        print(f"fakes: {', '.join(f'{name} {injector!r}' for name, injector in injectors.items())}")
+        print(f"concurrency {args.concurrency}, {args.requests} requests per endpoint, "
+              f"{'repeating' if args.repeat_payloads else 'unique'} payloads\n")
+        print(f"{'endpoint':<16} {'reqs':>6} {'errors':>6} {'req/s':>8} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+    results = {}
+    try:
+        for name in endpoints:
+            before = metrics.STAGE_SECONDS.snapshot()
+            row = drive(base_url, SCENARIOS[name], args.requests, args.concurrency,
+                        not args.repeat_payloads, args.timeout)
+            row["stages"] = stage_breakdown(before, metrics.STAGE_SECONDS.snapshot())
+            results[name] = row
+            if not args.json:
+                print_row(name, row)
+    finally:
+        server.shutdown()
+        fake_server.stop()
+
+    if args.json:
+        print(json.dumps({"fakes": specs, "concurrency": args.concurrency, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# benchmarks/loadtest/scenarios.py
+#
+# Request bodies for each endpoint. With ``unique`` every request differs
+# (cold caches, the worst case); without it a small set repeats, as real
+# traffic with popular prompts would.
+
+import base64
+import io
+
+from benchmarks.bench_colors import make_drawing
+
+PROMPTS = [
+    "Tell me a story about a brave little elephant",
+    "A dragon who is scared of the dark",
+    "Hanuman jumps across the ocean to find Sita",
+    "A rabbit and a tortoise race again",
+    "Thor loses his hammer in a forest",
+    "A princess befriends a talking tiger",
+]
+
+LANGUAGES = ["en", "fr", "hi", "es"]
+THEMES = ["adventure", "mythology", "animals", "space"]
+
+_REPEATING = 8
+
+
+def _variant(i, unique):
+    return i if unique else i % _REPEATING
+
+
+def _prompt(i, unique):
+    n = _variant(i, unique)
+    prompt = PROMPTS[n % len(PROMPTS)]
+    return f"{prompt} (#{n})" if unique else prompt
+
+
+_drawings = {}
+
+
+def _drawing(n):
+    # Small drawings keep encoding cost out of the client; distinct seeds defeat the perceptual cache
+    if n not in _drawings:
+        buffer = io.BytesIO()
+        make_drawing(n, size=(320, 240)).save(buffer, format="PNG")
+        _drawings[n] = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return _drawings[n]
+
+
+def story(i, unique):
+    n = _variant(i, unique)
+    return "POST", "/api/story", {
+        "query": _prompt(i, unique),
+        "story_context": "",
+        "cultural_context": n % 2 == 0,
+        "language": ["English", "French", "Hindi", "Spanish"][n % 4],
+        "user_preferences": {"age": "young", "genre": THEMES[n % len(THEMES)]},
+    }
+
+
+def start_story(i, unique):
+    n = _variant(i, unique)
+    return "POST", "/api/start-story", {
+        "theme": THEMES[n % len(THEMES)],
+        "storyLength": 1 + n % 3,
+        "initialPrompt": _prompt(i, unique),
+        "language": LANGUAGES[n % len(LANGUAGES)],
+    }
+
+
+def start_story_batch(i, unique):
+    # A class of 30, a few themes per class
+    stories = [start_story(i * 30 + k, unique)[2] for k in range(30)]
+    return "POST", "/api/start-story/batch", {"stories": stories}
+
+
+def continue_story(i, unique):
+    n = _variant(i, unique)
+    history = []
+    for turn in range(6):
+        history.append({"role": "user", "content": PROMPTS[(n + turn) % len(PROMPTS)]})
+        history.append({"role": "assistant", "content": "The story went on happily. What happens next?"})
+    return "POST", "/api/continue-story", {
+        "userInput": _prompt(i, unique),
+        "storyHistory": history,
+        "storyLength": 2,
+        "theme": THEMES[n % len(THEMES)],
+        "language": LANGUAGES[n % len(LANGUAGES)],
+    }
+
+
+def analyze_drawing(i, unique):
+    return "POST", "/api/analyze-drawing", {"image": _drawing(_variant(i, unique))}
+
+
+def generate_story(i, unique):
+    n = _variant(i, unique)
+    return "POST", "/api/generate-story", {
+        "character_analysis": {
+            "name": f"Ziggy {n}",
+            "description": "a drawing of a happy dragon with big eyes",
+            "emotion": "happy",
+            "characteristics": ["friendly", "cheerful"],
+            "ageRange": "3-8",
+        }
+    }
+
+
+def text_to_speech(i, unique):
+    n = _variant(i, unique)
+    return "POST", "/api/text-to-speech", {
+        "text": f"{_prompt(i, unique)}. Once upon a time there was a friendly dragon.",
+        "language": LANGUAGES[n % len(LANGUAGES)],
+    }
+
+
+SCENARIOS = {
+    "story": story,
+    "start-story": start_story,
+    "start-story-batch": start_story_batch,
+    "continue-story": continue_story,
+    "analyze-drawing": analyze_drawing,
+    "generate-story": generate_story,
+    "text-to-speech": text_to_speech,
+}
@@ -1,38 +1,117 @@
 # image_processor.py
 import base64
+import binascii
+import os
 from PIL import Image, ImageOps, ImageEnhance
 import io
 
-def preprocess_image(image_base64):
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Largest accepted upload, in decoded bytes, and in pixels
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+# Request bodies carry the image base64-encoded (4/3 larger) plus a little JSON
+MAX_UPLOAD_BYTES = MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024
+
+MAX_SIZE = (800, 800)
+
+
+class ImageTooLarge(ValueError):
+    """The upload is over MAX_IMAGE_BYTES or MAX_IMAGE_PIXELS."""
+
+
+class ProcessedImage:
+    """A drawing decoded once and preprocessed, shared by every analysis step.
+
+    ``image`` is the enhanced RGB PIL image used for color extraction;
+    ``jpeg_bytes`` is the same image encoded once for the model APIs.
     """
-    Process the image to enhance feature detection
+
+    def __init__(self, image):
+        self.image = image
+        self._jpeg_bytes = None
+
+    @property
+    def jpeg_bytes(self):
+        if self._jpeg_bytes is None:
+            buffered = io.BytesIO()
+            self.image.save(buffered, format="JPEG", quality=85)
+            self._jpeg_bytes = buffered.getvalue()
+        return self._jpeg_bytes
+
+    def to_base64(self):
+        return base64.b64encode(self.jpeg_bytes).decode('utf-8')
+
+
+def strip_data_url(image_data):
+    """Remove a data:image/...;base64, prefix if present."""
+    if ',' in image_data:
+        image_data = image_data.split(',', 1)[1]
+    return image_data
+
+
+def decode_image(image_base64):
+    """Base64-decode an upload, refusing oversize payloads before decoding."""
+    if not image_base64:
+        raise ValueError("No image data provided")
+    if len(image_base64) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise ImageTooLarge(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+    try:
+        return base64.b64decode(image_base64)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+
+def load_image(image_data):
+    """Decode a (data URL or plain) base64 upload into a ProcessedImage.
+
+    The pixel count is checked from the header before any pixel data is
+    decoded, and JPEGs are decoded straight at reduced scale.
     """
+    image_bytes = decode_image(strip_data_url(image_data))
     try:
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_base64)
         image = Image.open(io.BytesIO(image_bytes))
-        
-        # Resize if too large
-        max_size = (800, 800)
-        if image.width > max_size[0] or image.height > max_size[1]:
-            image.thumbnail(max_size, Image.LANCZOS)
-        
-        # Convert to RGB if not already
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Enhance contrast slightly to make features more prominent
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(1.2)
-        
-        # Convert back to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG", quality=85)
-        processed_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        
-        return processed_base64
-        
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is larger than {MAX_IMAGE_PIXELS} pixels")
+
+    return ProcessedImage(enhance_image(image))
+
+
+def enhance_image(image):
+    """
+    Process the image to enhance feature detection
+    """
+    # Let the JPEG decoder downscale by a power of two while decoding
+    image.draft('RGB', MAX_SIZE)
+
+    # Resize if too large
+    if image.width > MAX_SIZE[0] or image.height > MAX_SIZE[1]:
+        image.thumbnail(MAX_SIZE, Image.LANCZOS)
+
+    # Convert to RGB if not already
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # Enhance contrast slightly to make features more prominent
+    enhancer = ImageEnhance.Contrast(image)
+    return enhancer.enhance(1.2)
+
+
+def preprocess_image(image_base64):
+    """
+    Process the image to enhance feature detection; returns JPEG base64.
+    Kept for callers that pass base64 around; prefer load_image.
+    """
+    try:
+        return load_image(image_base64).to_base64()
+    except ImageTooLarge:
+        raise
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         # Return original image if processing fails
-        return image_base64
\ No newline at end of file
+        return image_base64
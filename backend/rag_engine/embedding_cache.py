@@ -0,0 +1,273 @@
+# rag_engine/embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(tempfile.gettempdir(), "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX = int(os.getenv("EMBEDDING_CACHE_MAX", "200000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingCache:
+    """Persistent vector cache in sqlite, keyed by content hash.
+
+    Vectors are stored as raw float32 blobs. Once the cache holds more than
+    ``max_entries`` vectors the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS vectors (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used);
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        keys = list(keys)
+        now = time.time()
+        with self._connect() as conn:
+            # Stay well under sqlite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                hits = []
+                for key, blob in conn.execute(f"SELECT key, vector FROM vectors WHERE key IN ({marks})", batch):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    hits.append(key)
+                if hits:
+                    marks = ",".join("?" * len(hits))
+                    conn.execute(f"UPDATE vectors SET last_used = ? WHERE key IN ({marks})", [now, *hits])
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs, evicting the oldest entries over the cap."""
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO vectors (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            (count,) = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def __len__(self):
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM vectors").fetchone()
+        return count
+
+
+class MemoryEmbeddingCache:
+    """In-process EmbeddingCache for when its sqlite file can't be opened."""
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_MAX):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = list(self._entries[key])
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, vector in items:
+                self._entries[key] = list(vector)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def open_embedding_cache(path=EMBEDDING_CACHE_PATH):
+    """The sqlite cache at path, or an in-memory one if it can't be opened (e.g. a read-only deployment)."""
+    try:
+        return EmbeddingCache(path)
+    except sqlite3.OperationalError as e:
+        print(f"Could not open embedding cache at {path}, caching in memory: {e}")
+        return MemoryEmbeddingCache()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts it has never seen to the model.
+
+    Keys are sha256(model, kind, text), where kind separates document and
+    query embeddings since some models embed them differently. Misses are
+    de-duplicated and embedded in batches of ``batch_size``.
+    """
+
+    def __init__(self, embedder, model_name, cache=None, batch_size=EMBEDDING_BATCH_SIZE):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache = cache if cache is not None else open_embedding_cache()
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        # The generator's threads and the batch workers share one instance
+        self._lock = threading.Lock()
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts):
+        keys = [self._key("document", text) for text in texts]
+        vectors = self.cache.get_many(set(keys))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self._count(len(keys) - len(missing), len(missing))
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            embedded = self.embedder.embed_documents([text for _, text in batch])
+            new = [(key, vector) for (key, _), vector in zip(batch, embedded)]
+            self.cache.put_many(new)
+            vectors.update(new)
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text):
+        key = self._key("query", text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key]
+
+        self._count(0, 1)
+        vector = self.embedder.embed_query(text)
+        self.cache.put_many([(key, vector)])
+        return list(vector)
+
+    def embed_queries(self, texts):
+        """``embed_query`` for many texts: one cache lookup, then each distinct miss once.
+
+        Misses go through the model's embed_query rather than embed_documents,
+        since some models embed queries and documents differently.
+        """
+        keys = [self._key("query", text) for text in texts]
+        vectors = self.cache.get_many(set(keys))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self._count(len(keys) - len(missing), len(missing))
+
+        if missing:
+            new = [(key, self.embedder.embed_query(text)) for key, text in missing.items()]
+            self.cache.put_many(new)
+            vectors.update(new)
+
+        return [list(vectors[key]) for key in keys]
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {"model": self.model_name, "entries": len(self.cache), "hits": hits, "misses": misses}
+
+
+class LocalHashEmbeddings(Embeddings):
+    """Deterministic offline embeddings built by hashing words and word pairs.
+
+    No model or network is needed, and the same text always gives the same
+    vector, so ingestion and retrieval can be exercised without an API key.
+    Texts that share words land close together under cosine similarity.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _embed(self, text):
+        tokens = [t.lower() for t in _TOKEN.findall(text)]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def create_embedder(backend=EMBEDDING_BACKEND, model=EMBEDDING_MODEL):
+    """Build the uncached embedding backend ("google" or "local")."""
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(model=model), model
+    if backend == "local":
+        embedder = LocalHashEmbeddings()
+        return embedder, f"local-hash-{embedder.dim}"
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+
+def get_embeddings():
+    """Return the process-wide cached embeddings for the configured backend."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            embedder, model_name = create_embedder()
+            _embeddings = CachedEmbeddings(embedder, model_name)
+        return _embeddings
@@ -1,23 +1,28 @@
 # rag_engine/rag_chain.py
+import asyncio
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
-from .rag_utils import fetch_stories, prepare_documents
-
-def setup_rag_chain():
-    raw_text = fetch_stories()
-    docs = prepare_documents(raw_text)
-    
-    vectorstore = Chroma.from_documents(
-        documents=docs,
-        embedding=GoogleGenerativeAIEmbeddings(model="models/embedding-001"),
-        persist_directory="rag_db"
-    )
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 6})
-    
-    prompt = ChatPromptTemplate.from_template("""
+from .embedding_cache import get_embeddings
+from .rag_utils import fetch_story_pages, fetched_sources, prepare_documents, sync_documents
+
+load_dotenv()
+
+RAG_DB_PATH = os.getenv("RAG_DB_PATH", "rag_db")
+# Age in seconds after which the index is refreshed in the background; 0 never refreshes
+RAG_DB_MAX_AGE = int(os.getenv("RAG_DB_MAX_AGE", str(7 * 24 * 3600)))
+
+# Touched after every successful index build; its mtime is the index age
+INDEX_MARKER = ".last_indexed"
+
+CHARACTER_PROMPT = """
     You are a children's storyteller.
 
     Use the following context to craft a culturally rich story for kids aged {age_range}.
@@ -28,21 +33,128 @@ def setup_rag_chain():
     {context}
 
     Write a 100 word story with a positive message.
-    """)
+    """
 # 250–400
+
+_chain = None
+_vectorstore = None
+_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def index_age(persist_dir=RAG_DB_PATH):
+    """Seconds since the index was last built, or None if it never was."""
+    try:
+        return time.time() - os.path.getmtime(os.path.join(persist_dir, INDEX_MARKER))
+    except OSError:
+        return None
+
+
+def is_stale(persist_dir=RAG_DB_PATH, max_age=RAG_DB_MAX_AGE):
+    age = index_age(persist_dir)
+    if age is None:
+        return True
+    return max_age > 0 and age > max_age
+
+
+def open_vectorstore(persist_dir=RAG_DB_PATH):
+    return Chroma(
+        embedding_function=get_embeddings(),
+        persist_directory=persist_dir
+    )
+
+
+def build_index(vectorstore, persist_dir=RAG_DB_PATH):
+    """Scrape the story sources and sync them into vectorstore.
+
+    Only new chunks are embedded. Sources that could not be fetched keep
+    their chunks; if nothing could be fetched the index is left as it is.
+    """
+    pages = fetch_story_pages()
+    fetched, missing = fetched_sources(pages)
+    if not fetched:
+        print("No stories fetched, keeping the existing RAG index")
+        return None
+
+    docs = [doc for url in fetched for doc in prepare_documents("\n".join(pages[url]), source=url)]
+    # With every source in, whatever else is stored is stale
+    report = sync_documents(vectorstore, docs, sources=fetched if missing else None)
+    if missing:
+        report["missing_sources"] = missing
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, INDEX_MARKER), "w") as f:
+        f.write(str(time.time()))
+    print(f"RAG index synced: {report}")
+    return report
+
+
+def setup_rag_chain(vectorstore):
+    """Build the character-story retrieval chain on top of vectorstore."""
+    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 6})
+    prompt = ChatPromptTemplate.from_template(CHARACTER_PROMPT)
     llm = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0.7)
     return create_retrieval_chain(
         retriever=retriever,
         combine_documents_chain=create_stuff_documents_chain(llm=llm, prompt=prompt)
     )
 
+
+def _refresh_in_background():
+    if _refreshing.is_set():
+        return
+    _refreshing.set()
+
+    def run():
+        try:
+            build_index(_vectorstore)
+        except Exception as e:
+            print(f"Background RAG index refresh failed: {e}")
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=run, name="rag-index-refresh", daemon=True).start()
+
+
+def get_rag_chain(rebuild=False):
+    """Return the shared character-story chain, creating it on first use.
+
+    The persisted index in RAG_DB_PATH is opened once and reused by every
+    request. It is only (re)built when ``rebuild`` is set or when no index
+    exists yet; an index older than RAG_DB_MAX_AGE keeps serving while it is
+    refreshed in the background.
+    """
+    global _chain, _vectorstore
+    with _lock:
+        if _chain is None:
+            rebuild = rebuild or not os.path.exists(RAG_DB_PATH)
+            _vectorstore = open_vectorstore()
+            _chain = setup_rag_chain(_vectorstore)
+            print(f"Loaded RAG index from {RAG_DB_PATH}")
+
+        if rebuild:
+            build_index(_vectorstore)
+        elif is_stale():
+            _refresh_in_background()
+        return _chain
+
+
 # Reusable story generator
 def generate_story_rag(character, rag_chain=None):
-    chain = rag_chain or setup_rag_chain()
-    return chain.invoke({
+    chain = rag_chain or get_rag_chain()
+    return chain.invoke(_character_inputs(character))
+
+
+def _character_inputs(character):
+    return {
         "name": character.get("name"),
         "description": character.get("description"),
         "emotion": character.get("emotion"),
         "traits": ", ".join(character.get("characteristics", [])),
         "age_range": character.get("ageRange", "3-8")
-    })
+    }
+
+
+async def agenerate_story_rag(character, rag_chain=None):
+    """``generate_story_rag`` through the chain's ``ainvoke``."""
+    chain = rag_chain or await asyncio.to_thread(get_rag_chain)
+    return await chain.ainvoke(_character_inputs(character))
@@ -1,33 +1,80 @@
 # rag_engine/rag_utils.py
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import json
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from services.story_fetcher import story_fetcher
+
+STORY_URLS = [
+    "https://www.talesofpanchatantra.com/",
+    "https://www.indiaparenting.com/stories/",
+    "https://www.templepurohit.com/vedic-vaani/hindu-mythology-stories/",
+    "https://www.kidsgen.com/fables_and_fairytales/indian_mythology_stories/",
+    "https://www.ancient-origins.net/myths-legends",
+    "https://www.worldoftales.com/",
+    "https://mythopedia.com/",
+    "https://www.kidsgen.com/fables_and_fairytales/african_folk_tales/"
+]
+
+def fetch_story_pages():
+    """{url: paragraphs, or None if the page could not be fetched} for the character-story sources."""
+    return story_fetcher.fetch_pages(STORY_URLS, limit=7)
 
 def fetch_stories():
-    urls = [
-        "https://www.talesofpanchatantra.com/",
-        "https://www.indiaparenting.com/stories/",
-        "https://www.templepurohit.com/vedic-vaani/hindu-mythology-stories/",
-        "https://www.kidsgen.com/fables_and_fairytales/indian_mythology_stories/",
-        "https://www.ancient-origins.net/myths-legends",  
-        "https://www.worldoftales.com/", 
-        "https://mythopedia.com/",  
-        "https://www.kidsgen.com/fables_and_fairytales/african_folk_tales/"
-    ]
-    
-    stories = []
-    for url in urls:
-        try:
-            res = requests.get(url, timeout=5)
-            if res.status_code == 200:
-                soup = BeautifulSoup(res.text, "html.parser")
-                extracted = [p.text.strip() for p in soup.find_all("p")[:7]]
-                stories.extend(extracted)
-        except requests.exceptions.RequestException:
-            continue
+    stories = story_fetcher.fetch_paragraphs(STORY_URLS, limit=7)
     return "\n".join(stories)
 
-def prepare_documents(raw_text):
+def prepare_documents(raw_text, source=None):
     splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-    return splitter.split_documents([Document(page_content=raw_text)])
+    docs = splitter.split_documents([Document(page_content=raw_text)])
+    if source:
+        for doc in docs:
+            doc.metadata["source"] = source
+    return docs
+
+def fetched_sources(pages):
+    """(fetched, missing) URLs of a fetch_pages result; pages without paragraphs count as missing."""
+    fetched = [url for url, page in pages.items() if page]
+    missing = [url for url, page in pages.items() if not page]
+    return fetched, missing
+
+def chunk_id(doc):
+    """Content-hash ID for a chunk: the same text and metadata always get the same ID."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(doc.metadata, sort_keys=True).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+def sync_documents(vectorstore, docs, where=None, dry_run=False, sources=None):
+    """Make the chunks matching ``where`` in vectorstore equal to docs.
+
+    Only chunks whose content hash is not stored yet are embedded and added;
+    stored chunks that are no longer produced are deleted. With ``sources``
+    only chunks whose "source" metadata is one of them can be deleted, so a
+    page that failed to fetch keeps its chunks. Returns a report of what
+    changed.
+    """
+    by_id = {}
+    for doc in docs:
+        by_id.setdefault(chunk_id(doc), doc)
+
+    if sources is not None:
+        source_filter = {"source": {"$in": list(sources)}}
+        where = {"$and": [where, source_filter]} if where else source_filter
+    existing = set(vectorstore.get(where=where, include=[])["ids"])
+    added = [i for i in by_id if i not in existing]
+    stale = sorted(existing - set(by_id))
+
+    if not dry_run:
+        if added:
+            vectorstore.add_documents([by_id[i] for i in added], ids=added)
+        if stale:
+            vectorstore.delete(ids=stale)
+
+    return {
+        "chunks": len(by_id),
+        "added": len(added),
+        "unchanged": len(by_id) - len(added),
+        "deleted": len(stale),
+    }
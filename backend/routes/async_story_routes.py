@@ -0,0 +1,306 @@
+# routes/async_story_routes.py
+#
+# Async (Quart) versions of the I/O-bound endpoints, served by asgi_app.py.
+# Request and response shapes match app.py and routes/story_routes.py, and the
+# story sessions are shared with them.
+
+import asyncio
+import json
+
+from quart import Blueprint, Response, jsonify, request, send_file
+
+from ai_service import aanalyze_character_image, agenerate_story_with_character
+from image_processor import MAX_UPLOAD_BYTES, ImageTooLarge, load_image
+from routes.story_routes import generate_explanation, session_store, _session_state, _sse_event
+from services import metrics
+from services.story_generation import agenerate_story_segment, astream_story_segment
+from services.tts_cache import tts_service
+
+async_story_bp = Blueprint("async_story", __name__)
+
+
+@async_story_bp.route('/start-story', methods=['POST'])
+async def start_story():
+    data = await request.get_json()
+    theme = data.get('theme', 'adventure')
+    story_length = data.get('storyLength', 2)
+    initial_prompt = data.get('initialPrompt', 'Tell me a story')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history = [
+        {"role": "user", "content": initial_prompt}
+    ]
+    session = session_store.create(theme, story_length, language)
+    session_store.append(session.id, "user", initial_prompt)
+
+    story_segment = await agenerate_story_segment(
+        prompt=initial_prompt,
+        story_length=story_length,
+        theme=theme,
+        language=language
+    )
+
+    story_history.append({"role": "assistant", "content": story_segment})
+    session_store.append(session.id, "assistant", story_segment)
+
+    return jsonify({
+        "sessionId": session.id,
+        "storySegment": story_segment,
+        "storyHistory": story_history
+    })
+
+
+@async_story_bp.route('/continue-story', methods=['POST'])
+async def continue_story():
+    data = await request.get_json()
+    user_input = data.get('userInput', '')
+
+    if data.get('sessionId'):
+        session = session_store.append(data['sessionId'], "user", user_input)
+        if session is None:
+            return jsonify({"error": "Unknown or expired sessionId"}), 404
+
+        theme = data.get('theme', session.theme)
+        language = data.get('language', session.language)
+        metrics.set_labels(theme=theme, language=language)
+        story_segment = await agenerate_story_segment(
+            prompt=user_input,
+            story_length=data.get('storyLength', session.story_length),
+            theme=theme,
+            language=language,
+            transcript=session.transcript
+        )
+        session_id = session.id
+        session = session_store.append(session_id, "assistant", story_segment)
+
+        return jsonify({
+            "storySegment": story_segment,
+            **_session_state(session_id, session)
+        })
+
+    story_history = data.get('storyHistory', [])
+    story_length = data.get('storyLength', 2)
+    theme = data.get('theme', 'adventure')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history.append({"role": "user", "content": user_input})
+
+    story_segment = await agenerate_story_segment(
+        prompt=user_input,
+        story_length=story_length,
+        theme=theme,
+        history=story_history,
+        language=language
+    )
+
+    story_history.append({"role": "assistant", "content": story_segment})
+
+    return jsonify({
+        "storySegment": story_segment,
+        "storyHistory": story_history
+    })
+
+
+def _stream_story_response(prompt, story_length, theme, language, story_history=None, history=None,
+                           session_id=None, transcript=None):
+    """SSE stream with the same events as routes/story_routes.py."""
+    async def events():
+        sentences = []
+        with metrics.timed("stream"):
+            async for kind, text in astream_story_segment(
+                prompt=prompt,
+                story_length=story_length,
+                theme=theme,
+                history=history,
+                language=language,
+                transcript=transcript
+            ):
+                if kind == "replace":
+                    sentences = [text]
+                else:
+                    sentences.append(text)
+                yield _sse_event(kind, {"text": text})
+
+        story_segment = " ".join(sentences)
+        done = {"storySegment": story_segment}
+        if session_id:
+            session = session_store.append(session_id, "assistant", story_segment)
+            done.update(_session_state(session_id, session))
+        if story_history is not None:
+            story_history.append({"role": "assistant", "content": story_segment})
+            done["storyHistory"] = story_history
+        yield _sse_event("done", done)
+
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.timeout = None  # a story may take longer than Quart's default response timeout
+    return response
+
+
+@async_story_bp.route('/start-story/stream', methods=['POST'])
+async def start_story_stream():
+    data = await request.get_json()
+    theme = data.get('theme', 'adventure')
+    story_length = data.get('storyLength', 2)
+    initial_prompt = data.get('initialPrompt', 'Tell me a story')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history = [
+        {"role": "user", "content": initial_prompt}
+    ]
+    session = session_store.create(theme, story_length, language)
+    session_store.append(session.id, "user", initial_prompt)
+
+    return _stream_story_response(
+        initial_prompt, story_length, theme, language,
+        story_history=story_history, session_id=session.id
+    )
+
+
+@async_story_bp.route('/continue-story/stream', methods=['POST'])
+async def continue_story_stream():
+    data = await request.get_json()
+    user_input = data.get('userInput', '')
+
+    if data.get('sessionId'):
+        session = session_store.append(data['sessionId'], "user", user_input)
+        if session is None:
+            return jsonify({"error": "Unknown or expired sessionId"}), 404
+
+        theme = data.get('theme', session.theme)
+        language = data.get('language', session.language)
+        metrics.set_labels(theme=theme, language=language)
+        return _stream_story_response(
+            user_input,
+            data.get('storyLength', session.story_length),
+            theme,
+            language,
+            session_id=session.id,
+            transcript=session.transcript
+        )
+
+    story_history = data.get('storyHistory', [])
+    story_length = data.get('storyLength', 2)
+    theme = data.get('theme', 'adventure')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history.append({"role": "user", "content": user_input})
+
+    return _stream_story_response(
+        user_input, story_length, theme, language,
+        story_history=story_history, history=story_history
+    )
+
+
+async def _load_uploaded_image():
+    """Return (image, None) or (None, error response) for a JSON image upload."""
+    if not request.is_json:
+        return None, (jsonify({"error": "Request must be JSON"}), 400)
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES:
+        return None, (jsonify({"error": "Image is too large"}), 413)
+
+    data = await request.get_json()
+    if not data or 'image' not in data:
+        return None, (jsonify({"error": "No image data provided"}), 400)
+
+    # Decoding is CPU work; keep it off the event loop
+    try:
+        return await asyncio.to_thread(load_image, data.get('image')), None
+    except ImageTooLarge as e:
+        return None, (jsonify({"error": str(e)}), 413)
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+
+
+@async_story_bp.route('/analyze-drawing', methods=['POST'])
+async def analyze_drawing():
+    try:
+        image, error = await _load_uploaded_image()
+        if error:
+            return error
+
+        analysis = await aanalyze_character_image(image)
+
+        if not analysis:
+            return jsonify({"error": "Failed to analyze drawing"}), 500
+
+        return jsonify({
+            "description": analysis.get("description", "A drawing"),
+            "features": analysis.get("features", []),
+            "colors": analysis.get("colors", []),
+            "emotion": analysis.get("emotion", "neutral"),
+            "explanation": generate_explanation(analysis),
+            "raw_analysis": {
+                "caption": analysis.get("raw_caption", ""),
+                "classification": analysis.get("raw_classification", []),
+                "confidence_scores": analysis.get("confidence_scores", {})
+            }
+        })
+    except Exception as e:
+        print(f"Error analyzing drawing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@async_story_bp.route('/analyze-character', methods=['POST'])
+async def analyze_character():
+    try:
+        image, error = await _load_uploaded_image()
+        if error:
+            return error
+
+        character_analysis = await aanalyze_character_image(image)
+
+        if not character_analysis:
+            return jsonify({"error": "Failed to analyze character"}), 500
+
+        return jsonify(character_analysis)
+    except Exception as e:
+        print(f"Error analyzing character: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@async_story_bp.route('/generate-story', methods=['POST'])
+async def generate_story_rag():
+    data = await request.get_json()
+    character_analysis = data.get('character_analysis', {})
+
+    try:
+        story = await agenerate_story_with_character(character_analysis)
+        return jsonify(story)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@async_story_bp.route('/text-to-speech', methods=['POST'])
+async def text_to_speech():
+    try:
+        data = await request.get_json()
+        text = data.get('text')
+        language = data.get('language', 'en')
+
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+
+        # gTTS is sync-only, so synthesis runs in a worker thread
+        metrics.set_labels(language=language)
+        with metrics.timed("tts"):
+            audio_id, filepath = await asyncio.to_thread(tts_service.synthesize, text, language)
+
+        response = await send_file(
+            filepath,
+            mimetype='audio/mpeg',
+            as_attachment=True,
+            attachment_filename=f"{audio_id}.mp3"
+        )
+        response.headers['X-Audio-URL'] = f"/api/text-to-speech/{audio_id}.mp3"
+        return response
+    except Exception as e:
+        print(f"Error in text-to-speech: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -1,16 +1,21 @@
 # routes/story_routes.py
 
-from flask import Blueprint, request, jsonify
-from services.story_generation import generate_story_segment
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.story_generation import generate_story_batch, generate_story_segment, stream_story_segment
+from services.session_store import create_session_store
 from dotenv import load_dotenv
-import os
+import json
 from ai_service import analyze_character_image
-from image_processor import preprocess_image
+from image_processor import MAX_UPLOAD_BYTES, ImageTooLarge, load_image
+from services import metrics
 
 load_dotenv()
 
 story_bp = Blueprint("story", __name__)
 
+# Server-side story sessions (SESSION_STORE=memory|sqlite)
+session_store = create_session_store()
+
 @story_bp.route('/start-story', methods=['POST'])
 def start_story():
     data = request.json
@@ -18,11 +23,14 @@ def start_story():
     story_length = data.get('storyLength', 2)
     initial_prompt = data.get('initialPrompt', 'Tell me a story')
     language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
     
-    # Create initial story history
+    # Create initial story history and the server-side session
     story_history = [
         {"role": "user", "content": initial_prompt}
     ]
+    session = session_store.create(theme, story_length, language)
+    session_store.append(session.id, "user", initial_prompt)
     
     # Generate story segment
     story_segment = generate_story_segment(
@@ -34,21 +42,111 @@ def start_story():
 
     # Add the generated story to history
     story_history.append({"role": "assistant", "content": story_segment})
+    session_store.append(session.id, "assistant", story_segment)
     
     return jsonify({
+        "sessionId": session.id,
         "storySegment": story_segment,
         "storyHistory": story_history
     })
 
 
+@story_bp.route('/start-story/batch', methods=['POST'])
+def start_story_batch():
+    """Start a story for each entry of "stories" (classroom mode).
+
+    Entries take the same fields as /start-story; "theme", "storyLength" and
+    "language" given next to "stories" are the defaults. Responds with
+    NDJSON, one line per story in the order they finish: its index in the
+    request, sessionId, storySegment, whether it came from the cache and how
+    many seconds it took. A story not ready by the batch deadline gets a line
+    with its index and an "error" instead.
+    """
+    data = request.json or {}
+    stories = data.get('stories')
+    if not isinstance(stories, list) or not stories:
+        return jsonify({"error": "stories must be a non-empty list"}), 400
+
+    specs = []
+    for entry in stories:
+        if not isinstance(entry, dict):
+            return jsonify({"error": "Each story must be an object"}), 400
+        specs.append((
+            entry.get('initialPrompt', 'Tell me a story'),
+            entry.get('storyLength', data.get('storyLength', 2)),
+            entry.get('theme', data.get('theme', 'adventure')),
+            entry.get('language', data.get('language', 'en'))
+        ))
+    try:
+        batch = generate_story_batch(specs)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    metrics.count("batch_stories", len(specs))
+
+    def lines():
+        with metrics.timed("stream"):
+            for result in batch:
+                if result.get("error"):
+                    yield json.dumps({
+                        "index": result["index"],
+                        "error": result["error"],
+                        "elapsed": result["elapsed"]
+                    }) + "\n"
+                    continue
+                prompt, story_length, theme, language = specs[result["index"]]
+                session = session_store.create(theme, story_length, language)
+                session_store.append(session.id, "user", prompt)
+                session_store.append(session.id, "assistant", result["story"])
+                yield json.dumps({
+                    "index": result["index"],
+                    "sessionId": session.id,
+                    "storySegment": result["story"],
+                    "cached": result["cached"],
+                    "seconds": result["seconds"],
+                    "elapsed": result["elapsed"]
+                }) + "\n"
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @story_bp.route('/continue-story', methods=['POST'])
 def continue_story():
     data = request.json
-    story_history = data.get('storyHistory', [])
     user_input = data.get('userInput', '')
+
+    # Session clients only send sessionId and userInput
+    if data.get('sessionId'):
+        session = session_store.append(data['sessionId'], "user", user_input)
+        if session is None:
+            return jsonify({"error": "Unknown or expired sessionId"}), 404
+
+        theme = data.get('theme', session.theme)
+        language = data.get('language', session.language)
+        metrics.set_labels(theme=theme, language=language)
+        story_segment = generate_story_segment(
+            prompt=user_input,
+            story_length=data.get('storyLength', session.story_length),
+            theme=theme,
+            language=language,
+            transcript=session.transcript
+        )
+        session_id = session.id
+        session = session_store.append(session_id, "assistant", story_segment)
+
+        return jsonify({
+            "storySegment": story_segment,
+            **_session_state(session_id, session)
+        })
+
+    story_history = data.get('storyHistory', [])
     story_length = data.get('storyLength', 2)
     theme = data.get('theme', 'adventure')
     language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
     
     # Add user input to history
     story_history.append({"role": "user", "content": user_input})
@@ -70,6 +168,117 @@ def continue_story():
         "storyHistory": story_history
     })
 
+def _session_state(session_id, session):
+    """The session fields of a response; session is None if it was evicted while the story was told."""
+    if session is None:
+        return {"sessionId": session_id, "sessionExpired": True}
+    return {"sessionId": session_id, "turnCount": session.turn_count}
+
+
+def _sse_event(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_story_response(prompt, story_length, theme, language, story_history=None, history=None,
+                           session_id=None, transcript=None):
+    """Stream a story segment as SSE, ending with the updated story state.
+
+    Events: "sentence" with the next sentence, "replace" when everything sent
+    so far must be swapped for a safe message, and "done" with the full
+    storySegment plus the sessionId and/or the updated storyHistory.
+    """
+    def events():
+        sentences = []
+        # The request's own latency only covers the headers; this covers the body
+        with metrics.timed("stream"):
+            for kind, text in stream_story_segment(
+                prompt=prompt,
+                story_length=story_length,
+                theme=theme,
+                history=history,
+                language=language,
+                transcript=transcript
+            ):
+                if kind == "replace":
+                    sentences = [text]
+                else:
+                    sentences.append(text)
+                yield _sse_event(kind, {"text": text})
+
+        story_segment = " ".join(sentences)
+        done = {"storySegment": story_segment}
+        if session_id:
+            session = session_store.append(session_id, "assistant", story_segment)
+            done.update(_session_state(session_id, session))
+        if story_history is not None:
+            story_history.append({"role": "assistant", "content": story_segment})
+            done["storyHistory"] = story_history
+        yield _sse_event("done", done)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@story_bp.route('/start-story/stream', methods=['POST'])
+def start_story_stream():
+    data = request.json
+    theme = data.get('theme', 'adventure')
+    story_length = data.get('storyLength', 2)
+    initial_prompt = data.get('initialPrompt', 'Tell me a story')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history = [
+        {"role": "user", "content": initial_prompt}
+    ]
+    session = session_store.create(theme, story_length, language)
+    session_store.append(session.id, "user", initial_prompt)
+
+    return _stream_story_response(
+        initial_prompt, story_length, theme, language,
+        story_history=story_history, session_id=session.id
+    )
+
+
+@story_bp.route('/continue-story/stream', methods=['POST'])
+def continue_story_stream():
+    data = request.json
+    user_input = data.get('userInput', '')
+
+    if data.get('sessionId'):
+        session = session_store.append(data['sessionId'], "user", user_input)
+        if session is None:
+            return jsonify({"error": "Unknown or expired sessionId"}), 404
+
+        theme = data.get('theme', session.theme)
+        language = data.get('language', session.language)
+        metrics.set_labels(theme=theme, language=language)
+        return _stream_story_response(
+            user_input,
+            data.get('storyLength', session.story_length),
+            theme,
+            language,
+            session_id=session.id,
+            transcript=session.transcript
+        )
+
+    story_history = data.get('storyHistory', [])
+    story_length = data.get('storyLength', 2)
+    theme = data.get('theme', 'adventure')
+    language = data.get('language', 'en')
+    metrics.set_labels(theme=theme, language=language)
+
+    story_history.append({"role": "user", "content": user_input})
+
+    return _stream_story_response(
+        user_input, story_length, theme, language,
+        story_history=story_history, history=story_history
+    )
+
 @story_bp.route('/analyze-drawing', methods=['POST', 'OPTIONS'])
 def analyze_drawing():
     if request.method == 'OPTIONS':
@@ -78,22 +287,23 @@ def analyze_drawing():
     try:
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
+        if (request.content_length or 0) > MAX_UPLOAD_BYTES:
+            return jsonify({"error": "Image is too large"}), 413
             
         data = request.json
         if not data or 'image' not in data:
             return jsonify({"error": "No image data provided"}), 400
             
-        image_data = data.get('image')
-        
-        # Extract image data from base64 string (remove data:image/png;base64, prefix)
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Preprocess the image
-        processed_image = preprocess_image(image_data)
+        # Decode and preprocess once; oversize uploads are refused before decoding
+        try:
+            image = load_image(data.get('image'))
+        except ImageTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Analyze drawing using Hugging Face models
-        analysis = analyze_character_image(processed_image)
+        analysis = analyze_character_image(image)
         
         if not analysis:
             return jsonify({"error": "Failed to analyze drawing"}), 500
@@ -0,0 +1,81 @@
+# services/chain_pool.py
+
+import threading
+from collections import OrderedDict
+
+
+class ChainPool:
+    """Thread-safe LRU pool of ready-to-use RAG chains keyed by theme.
+
+    Entries are built by ``factory(theme)`` the first time a theme is asked
+    for. Builds for different themes run in parallel; concurrent requests for
+    the same theme wait for a single build instead of racing to create it.
+    """
+
+    def __init__(self, factory, max_size=8):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._factory = factory
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, theme):
+        """Return the entry for theme, building it if it is not pooled yet."""
+        with self._lock:
+            entry = self._entries.get(theme)
+            if entry is not None:
+                self._entries.move_to_end(theme)
+                self.hits += 1
+                return entry
+            build_lock = self._build_locks.setdefault(theme, threading.Lock())
+
+        with build_lock:
+            # Another thread may have finished building while we waited
+            with self._lock:
+                entry = self._entries.get(theme)
+                if entry is not None:
+                    self._entries.move_to_end(theme)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            entry = self._factory(theme)
+
+            with self._lock:
+                self._entries[theme] = entry
+                self._entries.move_to_end(theme)
+                while len(self._entries) > self.max_size:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self.evictions += 1
+                    print(f"Evicted RAG chain for theme: {evicted}")
+                self._build_locks.pop(theme, None)
+        return entry
+
+    def preload(self, themes):
+        """Build entries for themes ahead of traffic (e.g. at startup)."""
+        for theme in themes:
+            self.get(theme)
+
+    def __contains__(self, theme):
+        with self._lock:
+            return theme in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "themes": list(self._entries),
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
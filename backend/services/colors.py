@@ -0,0 +1,122 @@
+# services/colors.py
+
+import numpy as np
+
+# Channels are quantized to multiples of 25, i.e. 11 levels per channel
+QUANT_STEP = 25
+LEVELS = 255 // QUANT_STEP + 1
+NUM_BINS = LEVELS ** 3
+
+
+def color_name(r, g, b):
+    """Name an RGB color (very simple color naming logic)."""
+    if r > 200 and g > 200 and b > 200:
+        return "white"
+    elif r < 50 and g < 50 and b < 50:
+        return "black"
+    elif r > 200 and g < 100 and b < 100:
+        return "red"
+    elif r < 100 and g > 200 and b < 100:
+        return "green"
+    elif r < 100 and g < 100 and b > 200:
+        return "blue"
+    elif r > 200 and g > 200 and b < 100:
+        return "yellow"
+    elif r > 200 and g < 100 and b > 200:
+        return "pink"
+    elif r < 100 and g > 200 and b > 200:
+        return "cyan"
+    elif r > 200 and g > 130 and b < 100:
+        return "orange"
+    elif r > 130 and g < 100 and b > 130:
+        return "purple"
+    return "mixed"
+
+
+def _build_name_table():
+    levels = [level * QUANT_STEP for level in range(LEVELS)]
+    return [color_name(r, g, b) for r in levels for g in levels for b in levels]
+
+
+# Name of every quantized color, indexed by its bin
+COLOR_NAME_TABLE = _build_name_table()
+
+
+def _pixels(image):
+    """Downscale image to a thumbnail and return its pixels as an (n, 3) uint8 array."""
+    img = image.copy()
+    img.thumbnail((100, 100))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+
+def quantize(pixels):
+    """Map (n, 3) uint8 pixels to their quantized color bin."""
+    q = pixels // QUANT_STEP
+    return (q[:, 0].astype(np.intp) * LEVELS + q[:, 1]) * LEVELS + q[:, 2]
+
+
+def histogram_palette(pixels, num_colors):
+    """Most frequent quantized colors; ties go to the color seen first."""
+    bins = quantize(pixels)
+    counts = np.bincount(bins, minlength=NUM_BINS)
+    present, first_seen = np.unique(bins, return_index=True)
+    order = np.lexsort((first_seen, -counts[present]))
+    return [COLOR_NAME_TABLE[b] for b in present[order[:num_colors]]]
+
+
+def kmeans_palette(pixels, num_colors, iterations=8):
+    """Cluster pixels with a small k-means seeded from the histogram peaks.
+
+    Clusters average the actual pixel colors, so shading and anti-aliased
+    edges merge into the color they belong to instead of taking separate slots.
+    """
+    bins = quantize(pixels)
+    counts = np.bincount(bins, minlength=NUM_BINS)
+    seeds = np.argsort(-counts, kind="stable")[:num_colors]
+    seeds = seeds[counts[seeds] > 0]
+
+    # Seed centroids at the most populated quantized colors
+    levels = np.stack([seeds // (LEVELS * LEVELS), seeds // LEVELS % LEVELS, seeds % LEVELS], axis=1)
+    centroids = (levels * QUANT_STEP).astype(np.float32)
+
+    # Cluster the distinct colors weighted by how often they occur; drawings
+    # have far fewer distinct colors than pixels
+    packed = (pixels[:, 0].astype(np.int32) << 16) | (pixels[:, 1].astype(np.int32) << 8) | pixels[:, 2]
+    distinct, weights = np.unique(packed, return_counts=True)
+    data = np.stack([distinct >> 16, (distinct >> 8) & 0xFF, distinct & 0xFF], axis=1).astype(np.float32)
+
+    for _ in range(iterations):
+        distances = ((data[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        sizes = np.bincount(labels, weights=weights, minlength=len(centroids))
+        updated = centroids.copy()
+        nonempty = sizes > 0
+        for channel in range(3):
+            sums = np.bincount(labels, weights=data[:, channel] * weights, minlength=len(centroids))
+            updated[nonempty, channel] = sums[nonempty] / sizes[nonempty]
+        converged = np.allclose(updated, centroids, atol=0.5)
+        centroids = updated
+        if converged:
+            break
+
+    order = np.argsort(-sizes, kind="stable")
+    named = np.clip(np.rint(centroids[order]), 0, 255).astype(np.uint8)
+    return [COLOR_NAME_TABLE[b] for b in quantize(named)]
+
+
+def extract_dominant_colors(image, num_colors=3, method="histogram"):
+    """Extract dominant colors from image.
+
+    ``method`` is "histogram" (most frequent quantized colors) or "kmeans"
+    (small k-means over the thumbnail, better at shaded drawings).
+    """
+    pixels = _pixels(image)
+    if len(pixels) == 0:
+        return []
+    if method == "kmeans":
+        return kmeans_palette(pixels, num_colors)
+    if method == "histogram":
+        return histogram_palette(pixels, num_colors)
+    raise ValueError(f"Unknown color extraction method: {method}")
@@ -0,0 +1,396 @@
+# services/content_filter.py
+
+import array
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import deque
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+BAD_WORDS_PATH = os.path.join(DATA_DIR, "ibw_bad_words.txt")
+# Ordinary words and names that the IBW list also contains
+ALLOWED_WORDS_PATH = os.path.join(DATA_DIR, "ibw_allowed_words.txt")
+AUTOMATON_PATH = os.path.join(DATA_DIR, "ibw_bad_words.acm")
+
+# Entries without a language column apply to every language...
+DEFAULT_LANGUAGE = "*"
+# ...except these. The IBW list is romanized Hindi, Bengali, Tamil and other
+# Indian languages, which language detection reports as English or as unrelated
+# languages ("so", "id", "sw"), so it cannot be scoped to the languages it was
+# written in. It is kept off the app's other Latin-script languages instead,
+# whose ordinary words it is full of ("sous", "pelo", "Mai").
+UNTAGGED_EXCLUDED_LANGUAGES = ("de", "es", "fr", "pt")
+
+# On-disk layout (little-endian):
+#   header      magic, format version, language count, sha256 of the source lists
+#   languages   (language code, section offset) per compiled language
+#   section     state count, byte-class count, longest pattern in bytes, cell
+#               width, then class_map[256] and the 4-byte aligned arrays
+#               delta[states * classes], output[states], report[states],
+#               output_link[states]
+#
+# delta is the fully resolved automaton: failure links are folded into the
+# table at build time, so matching is one lookup per input byte. Bytes that
+# appear in no pattern share byte class 0.
+ARTIFACT_MAGIC = b"IBWACM\x00\x00"
+ARTIFACT_VERSION = 1
+_HEADER = struct.Struct("<8sII32s")
+_LANGUAGE_ENTRY = struct.Struct("<8sQ")
+_SECTION = struct.Struct("<IIII")
+
+_VARIANT_SEPARATOR = re.compile(r"\s*[,/]\s*")
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,!?;:'\"()[]{}"
+
+# ASCII letters/digits and every byte of a multi-byte UTF-8 character count as word bytes
+_WORD_BYTE = bytes(
+    1 if (chr(b).isalnum() and b < 0x80) or b >= 0x80 else 0 for b in range(256)
+)
+
+
+def normalize_text(text):
+    """Lowercase text and collapse whitespace so multi-word entries line up."""
+    return _WHITESPACE.sub(" ", text.lower())
+
+
+def _parse_word_list(filepath):
+    words_by_lang = {}
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            entry, _, lang = line.rstrip("\r\n").partition("\t")
+            lang = lang.strip().lower() or DEFAULT_LANGUAGE
+            for variant in _VARIANT_SEPARATOR.split(entry):
+                word = normalize_text(variant).strip(_EDGE_PUNCTUATION)
+                if word:
+                    words_by_lang.setdefault(lang, set()).add(word)
+
+    return words_by_lang
+
+
+def load_ibw_words(filepath=BAD_WORDS_PATH, allowed_path=ALLOWED_WORDS_PATH):
+    """Parses the IBW word list into a dictionary of inappropriate words by language.
+
+    The file holds one entry per line. An entry may list spelling variants
+    separated by commas or slashes ("gud/guud"), and may carry a language code
+    in an optional tab-separated second column. Untagged entries are stored
+    under DEFAULT_LANGUAGE. Words in the allowlist (same format) are dropped.
+    """
+    ibw_by_lang = _parse_word_list(filepath)
+    if allowed_path and os.path.exists(allowed_path):
+        allowed_by_lang = _parse_word_list(allowed_path)
+        allowed_everywhere = allowed_by_lang.get(DEFAULT_LANGUAGE, set())
+        for lang, words in ibw_by_lang.items():
+            words -= allowed_everywhere | allowed_by_lang.get(lang, set())
+
+    return ibw_by_lang
+
+
+def _source_digest(source_path, allowed_path, excluded):
+    digest = hashlib.sha256()
+    for path in (source_path, allowed_path):
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\x00")
+    digest.update(",".join(sorted(excluded)).encode("ascii"))
+    return digest.digest()
+
+
+def _pack(typecode, values):
+    arr = array.array(typecode, values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _pad(blob):
+    return blob + b"\x00" * (-len(blob) % 4)
+
+
+def compile_section(words):
+    """Compile a set of words into one serialized Aho-Corasick section."""
+    encoded = sorted(w.encode("utf-8") for w in words)
+    class_map = bytearray(256)
+    for i, b in enumerate(sorted(set(b"".join(encoded))), start=1):
+        class_map[b] = i
+    n_classes = max(class_map) + 1
+
+    # Trie over byte classes
+    goto = [{}]
+    output = [0]
+    for data in encoded:
+        state = 0
+        for c in data.translate(class_map):
+            nxt = goto[state].get(c)
+            if nxt is None:
+                nxt = len(goto)
+                goto[state][c] = nxt
+                goto.append({})
+                output.append(0)
+            state = nxt
+        output[state] = len(data)
+
+    # Breadth-first failure links, resolved into full transition rows
+    n_states = len(goto)
+    fail = [0] * n_states
+    output_link = [0] * n_states
+    delta = [None] * n_states
+    delta[0] = [0] * n_classes
+    for c, target in goto[0].items():
+        delta[0][c] = target
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        row = list(delta[fail[state]])
+        for c, target in goto[state].items():
+            row[c] = target
+            fail[target] = delta[fail[state]][c] if state else 0
+            output_link[target] = fail[target] if output[fail[target]] else output_link[fail[target]]
+            queue.append(target)
+        delta[state] = row
+
+    width = 2 if n_states <= 0xFFFF else 4
+    longest = max((len(data) for data in encoded), default=0)
+    return b"".join([
+        _SECTION.pack(n_states, n_classes, longest, width),
+        bytes(class_map),
+        _pad(_pack("H" if width == 2 else "I", [t for row in delta for t in row])),
+        _pack("I", output),
+        _pack("I", [s if output[s] else output_link[s] for s in range(n_states)]),
+        _pack("I", output_link),
+    ])
+
+
+def compile_artifact(source_path=BAD_WORDS_PATH, allowed_path=ALLOWED_WORDS_PATH,
+                     excluded=UNTAGGED_EXCLUDED_LANGUAGES):
+    """Compile the word list into the bytes of a versioned automaton artifact.
+
+    Every tagged language gets its own section holding its words plus the
+    untagged ones; the untagged words alone form the DEFAULT_LANGUAGE section.
+    Languages in ``excluded`` get a section with only their tagged words
+    (possibly none).
+    """
+    words_by_lang = load_ibw_words(source_path, allowed_path)
+    shared = words_by_lang.pop(DEFAULT_LANGUAGE, set())
+    sections = {DEFAULT_LANGUAGE: compile_section(shared)}
+    for lang in sorted(set(words_by_lang) | set(excluded)):
+        words = words_by_lang.get(lang, set())
+        sections[lang] = compile_section(words if lang in excluded else words | shared)
+
+    table_size = _HEADER.size + _LANGUAGE_ENTRY.size * len(sections)
+    offset = table_size + (-table_size % 4)
+    entries, body = [], []
+    for lang, section in sections.items():
+        entries.append(_LANGUAGE_ENTRY.pack(lang.encode("ascii")[:8], offset))
+        body.append(section)
+        offset += len(section)
+
+    digest = _source_digest(source_path, allowed_path, excluded)
+    header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, len(sections), digest)
+    return _pad(header + b"".join(entries)) + b"".join(body)
+
+
+def build_artifact(source_path=BAD_WORDS_PATH, artifact_path=AUTOMATON_PATH, allowed_path=ALLOWED_WORDS_PATH,
+                   excluded=UNTAGGED_EXCLUDED_LANGUAGES):
+    """Compile the word list and atomically write the artifact to disk."""
+    blob = compile_artifact(source_path, allowed_path, excluded)
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(blob)
+    os.replace(tmp_path, artifact_path)
+    return artifact_path
+
+
+class PatternMatcher:
+    """Word-boundary aware Aho-Corasick matcher over one compiled section.
+
+    The transition table is read straight out of the (usually memory-mapped)
+    artifact buffer, so opening a matcher does no parsing work.
+    """
+
+    def __init__(self, buffer, offset):
+        n_states, self.n_classes, self.max_length, width = _SECTION.unpack_from(buffer, offset)
+        view = memoryview(buffer)
+        pos = offset + _SECTION.size
+
+        def take(typecode, itemsize, count):
+            nonlocal pos
+            chunk = view[pos:pos + itemsize * count]
+            if len(chunk) != itemsize * count:
+                raise ValueError("Truncated automaton artifact")
+            pos += itemsize * count
+            pos += -pos % 4
+            if sys.byteorder == "big":
+                arr = array.array(typecode, chunk.tobytes())
+                arr.byteswap()
+                return arr
+            return chunk.cast(typecode)
+
+        self.class_map = bytes(view[pos:pos + 256])
+        pos += 256
+        self.delta = take("H" if width == 2 else "I", width, n_states * self.n_classes)
+        self.output = take("I", 4, n_states)
+        # First state on the output chain of each state (0 if nothing ends here)
+        self.report = take("I", 4, n_states)
+        self.output_link = take("I", 4, n_states)
+
+    @property
+    def state_count(self):
+        return len(self.output)
+
+    def search(self, text):
+        """Return the (start, end) byte span of the first whole-word match, or None."""
+        return self.search_bytes(normalize_text(text).encode("utf-8"))
+
+    def search_bytes(self, data):
+        """Scan normalized UTF-8 bytes; spans are checked against word boundaries."""
+        state = 0
+        delta, n_classes = self.delta, self.n_classes
+        output, report, output_link = self.output, self.report, self.output_link
+        for i, c in enumerate(data.translate(self.class_map)):
+            state = delta[state * n_classes + c]
+            match = report[state]
+            while match:
+                match_start = i + 1 - output[match]
+                if _at_boundary(data, match_start) and _at_boundary(data, i + 1):
+                    return match_start, i + 1
+                match = output_link[match]
+        return None
+
+
+def _at_boundary(data, pos):
+    """True if a match may begin or end at pos without splitting a word."""
+    if pos <= 0 or pos >= len(data):
+        return True
+    return not (_WORD_BYTE[data[pos - 1]] and _WORD_BYTE[data[pos]])
+
+
+class StreamScanner:
+    """Feed text to a matcher piece by piece, keeping the automaton state in between.
+
+    Used for streamed stories: each piece is scanned once, and matches that span
+    pieces are still found. A match ending exactly at the end of a piece is held
+    until the next piece (or close()) shows whether it ends on a word boundary.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self._state = 0
+        self._tail = b""
+        self._pending = []
+        self._after_space = True
+
+    def feed(self, text):
+        """Scan the next piece; return the first confirmed bad word or None."""
+        normalized = normalize_text(text)
+        if self._after_space and normalized.startswith(" "):
+            normalized = normalized[1:]
+        if not normalized:
+            return None
+        self._after_space = normalized.endswith(" ")
+
+        new = normalized.encode("utf-8")
+        offset = len(self._tail)
+        data = self._tail + new
+        for word in self._pending:
+            if _at_boundary(data, offset):
+                return word
+        self._pending = []
+
+        matcher = self.matcher
+        delta, n_classes = matcher.delta, matcher.n_classes
+        output, report, output_link = matcher.output, matcher.report, matcher.output_link
+        state = self._state
+        for i, c in enumerate(new.translate(matcher.class_map), start=offset):
+            state = delta[state * n_classes + c]
+            match = report[state]
+            while match:
+                match_start = i + 1 - output[match]
+                if _at_boundary(data, match_start):
+                    word = data[match_start:i + 1].decode("utf-8", "replace")
+                    if i + 1 == len(data):
+                        self._pending.append(word)
+                    elif _at_boundary(data, i + 1):
+                        return word
+                match = output_link[match]
+
+        self._state = state
+        # One byte more than the longest pattern, so start boundaries can always be checked
+        self._tail = data[-(matcher.max_length + 1):]
+        return None
+
+    def close(self):
+        """Finish the stream; a held match at the very end counts."""
+        return self._pending[0] if self._pending else None
+
+
+class ContentFilter:
+    """Per-language bad-word matchers backed by one compiled artifact."""
+
+    def __init__(self, buffer):
+        magic, version, count, self.source_digest = _HEADER.unpack_from(buffer, 0)
+        if magic != ARTIFACT_MAGIC or version != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported automaton artifact (version {version})")
+        self._buffer = buffer
+        self.matchers = {}
+        for i in range(count):
+            lang, offset = _LANGUAGE_ENTRY.unpack_from(buffer, _HEADER.size + i * _LANGUAGE_ENTRY.size)
+            self.matchers[lang.rstrip(b"\x00").decode("ascii")] = PatternMatcher(buffer, offset)
+
+    @property
+    def has_language_lists(self):
+        """Whether any language has words of its own (otherwise the language never matters)."""
+        return any(lang != DEFAULT_LANGUAGE for lang in self.matchers)
+
+    def matcher_for(self, lang):
+        """Return the matcher for lang, falling back to the language-neutral one."""
+        return self.matchers.get(lang) or self.matchers[DEFAULT_LANGUAGE]
+
+    def find(self, text, lang=DEFAULT_LANGUAGE):
+        """Return the first inappropriate word in text, or None."""
+        data = normalize_text(text).encode("utf-8")
+        span = self.matcher_for(lang).search_bytes(data)
+        return data[span[0]:span[1]].decode("utf-8", "replace") if span else None
+
+    def is_clean(self, text, lang=DEFAULT_LANGUAGE):
+        return self.find(text, lang) is None
+
+    def scanner(self, lang=DEFAULT_LANGUAGE):
+        """Return an incremental StreamScanner for lang."""
+        return StreamScanner(self.matcher_for(lang))
+
+
+def _read_artifact(artifact_path):
+    with open(artifact_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_content_filter(source_path=BAD_WORDS_PATH, artifact_path=AUTOMATON_PATH, allowed_path=ALLOWED_WORDS_PATH,
+                        excluded=UNTAGGED_EXCLUDED_LANGUAGES):
+    """Memory-map the compiled artifact, recompiling it if missing or stale.
+
+    The artifact records a digest of the word lists (and excluded languages) it
+    was built from, so edits to either are picked up on the next start. If the
+    data directory is read only the freshly compiled automaton is used from
+    memory instead.
+    """
+    digest = _source_digest(source_path, allowed_path, excluded)
+    if os.path.exists(artifact_path):
+        try:
+            content_filter = ContentFilter(_read_artifact(artifact_path))
+            if content_filter.source_digest == digest:
+                return content_filter
+            print("Bad-word automaton is stale, rebuilding")
+        except (ValueError, struct.error) as e:
+            print(f"Could not open bad-word automaton: {e}")
+
+    try:
+        build_artifact(source_path, artifact_path, allowed_path, excluded)
+        return ContentFilter(_read_artifact(artifact_path))
+    except OSError as e:
+        print(f"Could not write bad-word automaton, using it from memory: {e}")
+        return ContentFilter(compile_artifact(source_path, allowed_path, excluded))
@@ -0,0 +1,133 @@
+# services/emotion_service.py
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from .inference import BatchedPipeline
+from .registry import registry
+
+load_dotenv()
+
+EMOTION_MODEL = os.getenv("EMOTION_MODEL", "joeddav/distilbert-base-uncased-go-emotions-student")
+# "torch" or "onnx" (needs optimum[onnxruntime])
+EMOTION_RUNTIME = os.getenv("EMOTION_RUNTIME", "torch")
+EMOTION_QUANTIZE = os.getenv("EMOTION_QUANTIZE", "0") == "1"
+EMOTION_THREADS = int(os.getenv("EMOTION_THREADS", "0"))
+EMOTION_OFFLINE = os.getenv("EMOTION_OFFLINE", "0") == "1"
+EMOTION_BATCH = int(os.getenv("EMOTION_BATCH", "16"))
+EMOTION_MAX_WAIT_MS = float(os.getenv("EMOTION_MAX_WAIT_MS", "5"))
+EMOTION_CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "4096"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Cache key and model input: lowercased (the model is uncased), whitespace collapsed."""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class EmotionService:
+    """Emotion detection with micro-batched inference and an LRU result cache.
+
+    Concurrent requests are queued and run through the model together once
+    ``max_wait_ms`` has passed or ``batch_size`` texts are waiting.
+    """
+
+    def __init__(self, model=EMOTION_MODEL, runtime=EMOTION_RUNTIME, quantize=EMOTION_QUANTIZE,
+                 threads=EMOTION_THREADS, offline=EMOTION_OFFLINE, batch_size=EMOTION_BATCH,
+                 max_wait_ms=EMOTION_MAX_WAIT_MS, cache_size=EMOTION_CACHE_SIZE):
+        self.pipeline = BatchedPipeline(
+            "text-classification", model,
+            runtime=runtime, quantize=quantize, threads=threads, offline=offline,
+            max_batch_size=batch_size, max_wait=max_wait_ms / 1000,
+            truncation=True
+        )
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        """Return (label, None) on a cache hit, else (None, future) for the queued inference.
+
+        A text that is already being classified for another request shares its future.
+        """
+        with self._lock:
+            label = self._cache.get(key)
+            if label is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return label, None
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self.pipeline.submit(key)
+            return None, future
+
+    def _store(self, key, label):
+        with self._lock:
+            self._pending.pop(key, None)
+            if self.cache_size <= 0:
+                return
+            self._cache[key] = label
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _top_label(output):
+        # A single-text call returns the top prediction as a dict or a one-item list
+        if isinstance(output, dict):
+            return output["label"].lower()
+        return max(output, key=lambda x: x['score'])['label'].lower()
+
+    def detect_many(self, texts):
+        """Top emotion label for each text; all cache misses share the batch queue."""
+        keys = [normalize_text(text) for text in texts]
+        labels = {}
+        futures = {}
+        for key in keys:
+            if key in labels or key in futures:
+                continue
+            label, future = self._lookup(key)
+            if label is not None:
+                labels[key] = label
+            else:
+                futures[key] = future
+
+        for key, future in futures.items():
+            try:
+                labels[key] = self._top_label(future.result())
+            except Exception:
+                with self._lock:
+                    self._pending.pop(key, None)
+                raise
+            self._store(key, labels[key])
+        return [labels[key] for key in keys]
+
+    def detect(self, text):
+        return self.detect_many([text])[0]
+
+    def warmup(self):
+        self.pipeline.warmup()
+
+    def stats(self):
+        with self._lock:
+            stats = {"cache_size": len(self._cache), "hits": self.hits, "misses": self.misses}
+        stats.update(self.pipeline.batcher.stats())
+        return stats
+
+
+emotion_service = EmotionService()
+registry.register("emotion_model", emotion_service.pipeline.pipe)
+
+
+def detect_emotion(text):
+    """Enhanced sentiment analysis using a deep learning model."""
+    return emotion_service.detect(text)
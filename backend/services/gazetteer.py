@@ -0,0 +1,173 @@
+# services/gazetteer.py
+
+import os
+import re
+import unicodedata
+
+from dotenv import load_dotenv
+
+from .registry import registry
+
+load_dotenv()
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(DATA_DIR, "mythology_figures.tsv"))
+# Optional spaCy model (e.g. en_core_web_sm) whose PERSON entities supplement the gazetteer
+GAZETTEER_SPACY_MODEL = os.getenv("GAZETTEER_SPACY_MODEL", "")
+
+# Words split at apostrophes, so "Zeus's" is "zeus" "s"; combining accents stay in their word
+_TOKEN = re.compile(r"[\w\u0300-\u036f]+")
+_END = None  # trie key holding the entry index of a complete name
+
+
+def normalize(text):
+    """Casefold and strip accents, so "Quetzalcóatl" and "quetzalcoatl" match."""
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Return (token, start, end) for every word of text, offsets into text."""
+    # NFKD can change the length, so offsets come from the original text
+    return [(normalize(m.group()), m.start(), m.end()) for m in _TOKEN.finditer(text)]
+
+
+class GazetteerEntry:
+    def __init__(self, name, description, aliases=()):
+        self.name = name
+        self.description = description
+        self.aliases = list(aliases)
+
+
+class GazetteerMatch:
+    def __init__(self, start, end, text, entry):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.entry = entry
+
+
+class Gazetteer:
+    """Token trie over names and aliases with leftmost-longest matching.
+
+    Each name is a path of normalized tokens, so multi-word names ("sun
+    wukong") match as a unit and never match inside a longer word. A scan
+    tries at most ``max_tokens`` trie steps per word, which keeps it linear
+    in the text however many names are loaded.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._trie = {}
+        self.max_tokens = 0
+
+    def add(self, name, description, aliases=()):
+        entry = GazetteerEntry(name, description, aliases)
+        index = len(self.entries)
+        self.entries.append(entry)
+        for surface in [name, *aliases]:
+            tokens = [token for token, _, _ in tokenize(surface)]
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # The first entry to claim a name keeps it
+            node.setdefault(_END, index)
+            self.max_tokens = max(self.max_tokens, len(tokens))
+        return entry
+
+    @classmethod
+    def from_file(cls, path=GAZETTEER_PATH):
+        """Load a name<TAB>description<TAB>aliases file; # starts a comment."""
+        gazetteer = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.split("\t")
+                name = fields[0].strip()
+                description = fields[1].strip() if len(fields) > 1 else ""
+                aliases = [a.strip() for a in fields[2].split(",") if a.strip()] if len(fields) > 2 else []
+                gazetteer.add(name, description, aliases)
+        return gazetteer
+
+    def find(self, text):
+        """Non-overlapping matches in text, leftmost first, longest name at each position."""
+        tokens = tokenize(text)
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            best = None
+            for j in range(i, min(len(tokens), i + self.max_tokens)):
+                node = node.get(tokens[j][0])
+                if node is None:
+                    break
+                if _END in node:
+                    best = (j, node[_END])
+            if best is None:
+                i += 1
+                continue
+            j, index = best
+            start, end = tokens[i][1], tokens[j][2]
+            matches.append(GazetteerMatch(start, end, text[start:end], self.entries[index]))
+            i = j + 1
+        return matches
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _load_ner():
+    import spacy
+    nlp = spacy.load(GAZETTEER_SPACY_MODEL)
+    # Only the entity recognizer (and what it depends on) runs
+    keep = {"ner", "tok2vec", "transformer"}
+    nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in keep])
+    return nlp
+
+
+registry.register("gazetteer", Gazetteer.from_file)
+if GAZETTEER_SPACY_MODEL:
+    registry.register("ner_model", _load_ner)
+
+
+def detect_entities(texts, use_ner=bool(GAZETTEER_SPACY_MODEL), batch_size=32):
+    """For each text, the descriptions of the figures it mentions, in order of appearance.
+
+    With a spaCy model configured, PERSON entities the gazetteer doesn't
+    know are added as "<name> (character)"; all texts go through one
+    batched ``nlp.pipe`` call.
+    """
+    gazetteer = registry.get("gazetteer")
+    results = []
+    for text in texts:
+        seen = set()
+        found = []
+        for match in gazetteer.find(text):
+            if match.entry.name not in seen:
+                seen.add(match.entry.name)
+                found.append(match.entry.description)
+        results.append(found)
+
+    if use_ner:
+        nlp = registry.get("ner_model")
+        for found, text, doc in zip(results, texts, nlp.pipe(texts, batch_size=batch_size)):
+            known = [(m.start, m.end) for m in gazetteer.find(text)]
+            for ent in doc.ents:
+                if ent.label_ != "PERSON":
+                    continue
+                if any(start < ent.end_char and ent.start_char < end for start, end in known):
+                    continue
+                label = f"{ent.text} (character)"
+                if label not in found:
+                    found.append(label)
+    return results
+
+
+def detect_entity(text):
+    """Check if text contains known mythological/historical figures."""
+    entities = detect_entities([text])[0]
+    return ", ".join(entities) if entities else "No special figures detected."
@@ -0,0 +1,167 @@
+# services/http_client.py
+
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.3"))  # 0.3s, 0.6s, ... between retries
+HTTP_BACKOFF_JITTER = float(os.getenv("HTTP_BACKOFF_JITTER", "0.3"))  # plus up to this much at random
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "32"))  # hosts whose pools are kept
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # keep-alive connections per host
+
+# Transient answers worth another try; only idempotent methods are retried on them
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ConnectionStats:
+    """Per-host counts of requests, new connections and retries."""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _add(self, host, field):
+        with self._lock:
+            counts = self._hosts.setdefault(host, {"requests": 0, "connections": 0, "retries": 0})
+            counts[field] += 1
+
+    def request(self, host):
+        self._add(host, "requests")
+        metrics.HTTP_REQUESTS.inc(host=host)
+
+    def connection(self, host):
+        self._add(host, "connections")
+        metrics.HTTP_CONNECTIONS.inc(host=host)
+
+    def retry(self, host):
+        self._add(host, "retries")
+        metrics.count("http_retry")
+
+    def snapshot(self):
+        """Counts per host, with the share of requests that reused a kept-alive connection."""
+        with self._lock:
+            hosts = {host: dict(counts) for host, counts in self._hosts.items()}
+        for counts in hosts.values():
+            if counts["requests"]:
+                counts["reuse_ratio"] = round(max(0.0, 1 - counts["connections"] / counts["requests"]), 3)
+        return hosts
+
+
+class _CountingRetry(Retry):
+    stats = None
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _pool is not None:
+            self.stats.retry(_pool.host)
+        return retry
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout that counts requests and new connections per host."""
+
+    def __init__(self, stats, timeout, **kwargs):
+        self.stats = stats
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        def counting(pool_class):
+            def _new_conn(pool):
+                stats.connection(pool.host)
+                return pool_class._new_conn(pool)
+            return type(f"Counting{pool_class.__name__}", (pool_class,), {"_new_conn": _new_conn})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting(HTTPConnectionPool),
+            "https": counting(HTTPSConnectionPool),
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        self.stats.request(urlsplit(request.url).hostname or "")
+        return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+
+
+class HTTPClient:
+    """One requests.Session for every outbound call of the backend.
+
+    Connections are kept alive in a pool per host, so repeated calls to the
+    same API skip the TCP and TLS handshakes. Calls without a timeout get
+    (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT). Connection failures are
+    retried for any method, since the request never left; idempotent calls
+    (GET, HEAD, PUT, DELETE, ...) are also retried on read errors and on
+    RETRY_STATUSES. Retries back off exponentially with random jitter, so
+    callers that failed together don't retry together.
+    """
+
+    def __init__(self, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, jitter=HTTP_BACKOFF_JITTER,
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), pool_hosts=HTTP_POOL_HOSTS,
+                 pool_maxsize=HTTP_POOL_MAXSIZE):
+        self.stats = ConnectionStats()
+        retry_class = type("Retry", (_CountingRetry,), {"stats": self.stats})
+        retry = retry_class(
+            total=retries,
+            backoff_factor=backoff,
+            backoff_jitter=jitter,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        )
+        self.adapter = PooledAdapter(
+            self.stats, timeout, max_retries=retry, pool_connections=pool_hosts, pool_maxsize=pool_maxsize
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+
+# Shared by every module that calls out over HTTP
+http_client = HTTPClient()
+
+# httpx client of the async app, created on first use inside its event loop
+_async_client = None
+
+
+def get_async_client():
+    """The shared httpx.AsyncClient, with the same default timeouts and connection retries."""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(
+                retries=HTTP_RETRIES, limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        )
+    return _async_client
+
+
+async def aclose_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
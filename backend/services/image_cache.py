@@ -0,0 +1,118 @@
+# services/image_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+# Exact matches only until a distance is tuned on real drawings; near-duplicates
+# of sparse drawings are too easily confused with different ones
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "0"))
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(24 * 3600)))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "512"))
+IMAGE_HASH_SIZE = int(os.getenv("IMAGE_HASH_SIZE", "16"))  # hash_size**2 bits
+
+# Grey levels a pixel must differ from the background by to count as drawn
+CONTENT_THRESHOLD = 24
+
+
+def content_box(gray):
+    """Bounding box of what differs from the background (the border's median), or None if blank."""
+    pixels = np.asarray(gray, dtype=np.int16)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    drawn = np.abs(pixels - np.median(border)) > CONTENT_THRESHOLD
+    rows = np.flatnonzero(drawn.any(axis=1))
+    cols = np.flatnonzero(drawn.any(axis=0))
+    if not rows.size:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def dhash(image, hash_size=IMAGE_HASH_SIZE):
+    """Difference hash of the drawn part of image: one bit per horizontally adjacent pixel pair.
+
+    A child's drawing is mostly blank page, so the image is cropped to its
+    content first and downscaled by area averaging, which keeps thin strokes
+    visible; otherwise different sparse drawings hash almost alike.
+    Re-encoding barely changes the hash, and the same drawing placed
+    elsewhere on the page hashes the same.
+    """
+    gray = image.convert("L")
+    box = content_box(gray)
+    if box is not None:
+        gray = gray.crop(box)
+    small = gray.resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class PerceptualCache:
+    """Cache keyed by image hash that also matches near-duplicate images.
+
+    A lookup hits when a stored hash is within ``max_distance`` bits of the
+    query (0 means exact matches only). Entries expire after ``ttl`` seconds
+    and the least recently used are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, max_distance=IMAGE_CACHE_MAX_DISTANCE, ttl=IMAGE_CACHE_TTL, max_entries=IMAGE_CACHE_SIZE):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            match = key if key in self._entries else None
+            if match is None and self.max_distance > 0:
+                best = self.max_distance + 1
+                for stored in self._entries:
+                    distance = hamming(stored, key)
+                    if distance < best:
+                        match, best = stored, distance
+
+            if match is not None:
+                value, expires_at = self._entries[match]
+                if expires_at > now:
+                    self._entries.move_to_end(match)
+                    self.hits += 1
+                    return value
+                del self._entries[match]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,87 @@
+# services/inference.py
+
+import os
+import threading
+
+from .batching import MicroBatcher
+
+RUNTIMES = ("torch", "onnx")
+
+
+def load_pipeline(task, model, runtime="torch", quantize=False, threads=0, offline=False):
+    """Build a CPU transformers pipeline.
+
+    ``model`` is a hub id or a local directory. ``runtime="onnx"`` exports
+    the model to ONNX Runtime through optimum; ``quantize`` applies dynamic
+    int8 quantization to the Linear layers of a torch model. ``offline``
+    never touches the network, so weights must already be on disk.
+    """
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown inference runtime: {runtime}")
+    if offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    if runtime == "onnx":
+        from optimum.pipelines import pipeline as ort_pipeline
+        return ort_pipeline(task, model=model, accelerator="ort")
+
+    from transformers import pipeline
+
+    pipe = pipeline(task, model=model, device=-1)
+    if quantize:
+        pipe.model = torch.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipe
+
+
+class BatchedPipeline:
+    """A lazily loaded pipeline whose concurrent single calls run as batches.
+
+    Nothing is imported or loaded until the first call (or ``warmup()``).
+    Every call goes through a MicroBatcher, so requests arriving within
+    ``max_wait`` seconds of each other share one forward pass.
+    """
+
+    def __init__(self, task, model, runtime="torch", quantize=False, threads=0, offline=False,
+                 max_batch_size=8, max_wait=0.005, **call_kwargs):
+        self.task = task
+        self.model = model
+        self.runtime = runtime
+        self.quantize = quantize
+        self.threads = threads
+        self.offline = offline
+        self.call_kwargs = call_kwargs
+        self._pipe = None
+        self._lock = threading.Lock()
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait, name=f"{task}-batcher")
+
+    @property
+    def loaded(self):
+        return self._pipe is not None
+
+    def pipe(self):
+        if self._pipe is None:
+            with self._lock:
+                if self._pipe is None:
+                    print(f"Loading {self.task} model {self.model} ({self.runtime}{', int8' if self.quantize else ''})")
+                    self._pipe = load_pipeline(
+                        self.task, self.model, self.runtime, self.quantize, self.threads, self.offline
+                    )
+        return self._pipe
+
+    def warmup(self):
+        self.pipe()
+
+    def _run_batch(self, inputs):
+        return list(self.pipe()(inputs, batch_size=len(inputs), **self.call_kwargs))
+
+    def submit(self, item):
+        """Queue one input; returns a Future of its pipeline output."""
+        return self.batcher.submit(item)
+
+    def __call__(self, item, timeout=None):
+        return self.batcher(item, timeout)
@@ -0,0 +1,526 @@
+# services/llm_router.py
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+from . import metrics
+from .http_client import http_client
+
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+HUGGINGFACE_API_KEY = os.getenv("HF_API_TOKEN")
+GEMINI_REST_MODEL = os.getenv("GEMINI_REST_MODEL", "gemini-pro")
+HF_FALLBACK_MODEL = os.getenv("HF_FALLBACK_MODEL", "gpt2")
+
+# Providers in the order they are tried; unregistered or unconfigured ones are skipped
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "gemini_chat,gemini,huggingface").split(",") if p.strip()]
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "25"))  # one routed call, across every provider
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "15"))  # one provider attempt
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+# Hedge delay until a provider has enough answers for a p95 of its own
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "4"))
+# Largest share of a provider's calls that may be hedged, so a slow upstream isn't sent double the load
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_ROUTER_THREADS = int(os.getenv("LLM_ROUTER_THREADS", "32"))
+
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_LOW_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+]
+
+
+class LLMUnavailable(RuntimeError):
+    """No provider answered before the deadline."""
+
+
+class ProviderError(RuntimeError):
+    """A provider answered, but not with a story."""
+
+
+class CircuitBreaker:
+    """Stops calling a provider after ``failures`` failures in a row.
+
+    Once open, calls are refused for ``reset_seconds``; then a single trial
+    call is let through (half-open), which closes the breaker if it succeeds
+    and reopens it if it fails.
+    """
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        """Record a failure; returns True if it opened the breaker."""
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or (self._opened_at is None and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                self._trial = False
+                return True
+            return False
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one provider."""
+
+    def __init__(self, window=200, min_samples=20, default=LLM_HEDGE_AFTER):
+        self.min_samples = min_samples
+        self.default = default
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        """The 95th percentile, or ``default`` until there are ``min_samples`` samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class Provider:
+    """One LLM backend.
+
+    ``call(prompt, system, max_tokens, timeout)`` returns the text and must
+    give up by itself after ``timeout`` seconds. The optional ``acall``,
+    ``stream`` (yields chunks) and ``astream`` take the same arguments;
+    without them the router runs ``call`` in a thread or as a single chunk.
+    """
+
+    def __init__(self, name, call, acall=None, stream=None, astream=None, timeout=LLM_CALL_TIMEOUT, enabled=True):
+        self.name = name
+        self.call = call
+        self.acall = acall
+        self.stream = stream
+        self.astream = astream
+        self.timeout = timeout
+        self.enabled = enabled
+        self.breaker = CircuitBreaker()
+        # Whole answers set the hedge delay; streams' time to first chunk is tracked apart,
+        # since it is much shorter and would make full calls hedge far too early
+        self.latency = LatencyTracker()
+        self.first_chunk = LatencyTracker()
+        self.calls = 0
+        self.hedges = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "breaker": self.breaker.state,
+            "p95_seconds": round(self.latency.p95(), 3),
+            "p95_first_chunk_seconds": round(self.first_chunk.p95(), 3),
+            "calls": self.calls,
+            "hedges": self.hedges,
+        }
+
+
+class LLMRouter:
+    """Sends each LLM call to the first healthy provider, within a deadline.
+
+    Providers are tried in ``order``. An attempt gets the provider's own
+    timeout, cut short by what is left of the call's ``deadline``; when it
+    fails or times out, the next provider gets the rest. While an attempt
+    is slower than the provider's observed p95, an identical hedged request
+    is sent to the same provider and whichever answers first wins, which
+    trims the tail without doubling the load. Each provider has a circuit
+    breaker, so a dead one is skipped instead of costing every call its
+    timeout.
+    """
+
+    def __init__(self, order=LLM_PROVIDERS, deadline=LLM_DEADLINE, hedge=LLM_HEDGE,
+                 hedge_budget=LLM_HEDGE_BUDGET, threads=LLM_ROUTER_THREADS):
+        self.order = list(order)
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_budget = hedge_budget
+        self._providers = {}
+        self._threads = threads
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def register(self, provider):
+        """Add (or replace) a provider; it is used if its name is in ``order``."""
+        self._providers[provider.name] = provider
+
+    def providers(self, names=None):
+        return [
+            self._providers[name] for name in (names or self.order)
+            if name in self._providers and self._providers[name].enabled
+        ]
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="llm")
+            return self._executor
+
+    def _route(self, providers, deadline):
+        """Yield (provider, attempt timeout) for each provider worth trying before the deadline."""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        tried = False
+        for provider in self.providers(providers):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if not provider.breaker.allow():
+                metrics.count("llm_breaker_skip")
+                continue
+            if tried:
+                metrics.count("llm_fallback")
+            tried = True
+            with self._lock:
+                provider.calls += 1
+            yield provider, min(provider.timeout, remaining)
+
+    def _hedge_at(self, provider, started):
+        """When to send a hedged request for an attempt started at ``started`` (None: don't)."""
+        if not self.hedge or provider.breaker.state != "closed":
+            return None
+        with self._lock:
+            if provider.hedges + 1 > self.hedge_budget * provider.calls:
+                return None
+        return started + provider.latency.p95()
+
+    def _hedged(self, provider):
+        with self._lock:
+            provider.hedges += 1
+        metrics.count("llm_hedge")
+
+    def _succeeded(self, provider, seconds, hedge=False):
+        """Record a whole answer that took ``seconds``."""
+        provider.latency.record(seconds)
+        provider.breaker.success()
+        metrics.observe(f"llm_{provider.name}", seconds)
+        if hedge:
+            metrics.count("llm_hedge_won")
+
+    def _started_stream(self, provider, seconds):
+        """Record a stream whose first chunk (or end) came after ``seconds``."""
+        provider.first_chunk.record(seconds)
+        provider.breaker.success()
+        metrics.observe(f"llm_{provider.name}_first_chunk", seconds)
+
+    def _failed(self, provider, seconds, error):
+        timed_out = isinstance(error, (TimeoutError, asyncio.TimeoutError))
+        metrics.observe(f"llm_{provider.name}", seconds, "timeout" if timed_out else "error")
+        metrics.count("llm_timeout" if timed_out else "llm_error")
+        print(f"[{metrics.current_request_id()}] LLM provider {provider.name} failed: {type(error).__name__}: {error}")
+        if provider.breaker.failure():
+            metrics.count("llm_breaker_open")
+            print(f"LLM provider {provider.name} circuit open for {provider.breaker.reset_seconds:.0f}s")
+
+    def generate(self, prompt, system=None, max_tokens=None, providers=None, deadline=None):
+        """Return the text of the first provider (of ``providers``, default ``order``) that answers in time.
+
+        Raises LLMUnavailable when none does.
+        """
+        errors = []
+        for provider, timeout in self._route(providers, deadline):
+            started = time.monotonic()
+            try:
+                return self._attempt(provider, prompt, system, max_tokens, timeout, started)
+            except Exception as e:
+                self._failed(provider, time.monotonic() - started, e)
+                errors.append(f"{provider.name}: {type(e).__name__}")
+        raise LLMUnavailable("; ".join(errors) or "no LLM provider available")
+
+    def _attempt(self, provider, prompt, system, max_tokens, timeout, started):
+        end = started + timeout
+        hedge_at = self._hedge_at(provider, started)
+        pool = self._pool()
+        # Each submit gets its own copy of the request context; one copy can't be entered twice at once
+        pending = {pool.submit(metrics.bind(provider.call), prompt, system, max_tokens, timeout): False}
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                raise TimeoutError(f"no answer in {timeout:.1f}s")
+            until = end if hedge_at is None else min(end, hedge_at)
+            done, _ = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                hedge = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._succeeded(provider, time.monotonic() - started, hedge)
+                return text
+            if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                self._hedged(provider)
+                remaining = max(0.0, end - time.monotonic())
+                pending[pool.submit(metrics.bind(provider.call), prompt, system, max_tokens, remaining)] = True
+        raise error
+
+    async def agenerate(self, prompt, system=None, max_tokens=None, providers=None, deadline=None):
+        """``generate`` for the async app; losing and timed-out attempts are cancelled."""
+        errors = []
+        for provider, timeout in self._route(providers, deadline):
+            started = time.monotonic()
+            try:
+                return await self._aattempt(provider, prompt, system, max_tokens, timeout, started)
+            except Exception as e:
+                self._failed(provider, time.monotonic() - started, e)
+                errors.append(f"{provider.name}: {type(e).__name__}")
+        raise LLMUnavailable("; ".join(errors) or "no LLM provider available")
+
+    def _acall(self, provider, *args):
+        if provider.acall is not None:
+            return asyncio.ensure_future(provider.acall(*args))
+        return asyncio.ensure_future(asyncio.to_thread(provider.call, *args))
+
+    async def _aattempt(self, provider, prompt, system, max_tokens, timeout, started):
+        end = started + timeout
+        hedge_at = self._hedge_at(provider, started)
+        pending = {self._acall(provider, prompt, system, max_tokens, timeout): False}
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= end:
+                    raise TimeoutError(f"no answer in {timeout:.1f}s")
+                until = end if hedge_at is None else min(end, hedge_at)
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, until - now), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    hedge = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self._succeeded(provider, time.monotonic() - started, hedge)
+                    return text
+                if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    self._hedged(provider)
+                    remaining = max(0.0, end - time.monotonic())
+                    pending[self._acall(provider, prompt, system, max_tokens, remaining)] = True
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, prompt, system=None, max_tokens=None, providers=None, deadline=None):
+        """Yield chunks from the first provider that starts answering in time.
+
+        Streams aren't hedged. A provider that fails or stalls before its
+        first chunk falls back to the next; after that, a chunk taking longer
+        than the provider's timeout or any other error is raised.
+        """
+        errors = []
+        for provider, timeout in self._route(providers, deadline):
+            started = time.monotonic()
+            chunks = _ChunkPump(provider, prompt, system, max_tokens, timeout)
+            try:
+                first = chunks.next(timeout)
+            except StopIteration:
+                self._started_stream(provider, time.monotonic() - started)
+                return
+            except Exception as e:
+                chunks.close()
+                self._failed(provider, time.monotonic() - started, e)
+                errors.append(f"{provider.name}: {type(e).__name__}")
+                continue
+            # Time to first chunk is what the listener waits for
+            self._started_stream(provider, time.monotonic() - started)
+            try:
+                yield first
+                while True:
+                    try:
+                        chunk = chunks.next(provider.timeout)
+                    except StopIteration:
+                        return
+                    yield chunk
+            finally:
+                chunks.close()
+        raise LLMUnavailable("; ".join(errors) or "no LLM provider available")
+
+    async def astream(self, prompt, system=None, max_tokens=None, providers=None, deadline=None):
+        """``stream`` as an async generator."""
+        errors = []
+        for provider, timeout in self._route(providers, deadline):
+            started = time.monotonic()
+            if provider.astream is not None:
+                chunks = provider.astream(prompt, system, max_tokens, timeout)
+            else:
+                chunks = _aone_chunk(self._acall(provider, prompt, system, max_tokens, timeout))
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), timeout)
+            except StopAsyncIteration:
+                self._started_stream(provider, time.monotonic() - started)
+                return
+            except Exception as e:
+                await chunks.aclose()
+                self._failed(provider, time.monotonic() - started, e)
+                errors.append(f"{provider.name}: {type(e).__name__}")
+                continue
+            self._started_stream(provider, time.monotonic() - started)
+            try:
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), provider.timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            finally:
+                await chunks.aclose()
+        raise LLMUnavailable("; ".join(errors) or "no LLM provider available")
+
+    def stats(self):
+        return {provider.name: provider.stats() for provider in self._providers.values()}
+
+
+class _ChunkPump:
+    """A provider's stream read by a background thread, so the reader can time out."""
+
+    _DONE = object()
+
+    def __init__(self, provider, prompt, system, max_tokens, timeout):
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        if provider.stream is not None:
+            source = lambda: provider.stream(prompt, system, max_tokens, timeout)
+        else:
+            source = lambda: iter([provider.call(prompt, system, max_tokens, timeout)])
+        threading.Thread(target=metrics.bind(self._run), args=(source,), name=f"llm-{provider.name}",
+                         daemon=True).start()
+
+    def _run(self, source):
+        try:
+            iterator = source()
+            for chunk in iterator:
+                if self._stopped.is_set():
+                    getattr(iterator, "close", lambda: None)()
+                    return
+                self._queue.put((chunk, None))
+            self._queue.put((self._DONE, None))
+        except Exception as e:
+            self._queue.put((None, e))
+
+    def next(self, timeout):
+        try:
+            chunk, error = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no chunk in {timeout:.1f}s") from None
+        if error is not None:
+            raise error
+        if chunk is self._DONE:
+            raise StopIteration
+        return chunk
+
+    def close(self):
+        self._stopped.set()
+
+
+async def _aone_chunk(task):
+    try:
+        yield await task
+    finally:
+        task.cancel()
+
+
+def gemini_rest(prompt, system=None, max_tokens=None, timeout=LLM_CALL_TIMEOUT):
+    """One generateContent call to the Gemini REST API."""
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_REST_MODEL}:generateContent"
+    generation_config = {"temperature": 0.8, "topK": 40, "topP": 0.95}
+    if max_tokens:
+        generation_config["maxOutputTokens"] = max_tokens
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": generation_config,
+        "safetySettings": SAFETY_SETTINGS
+    }
+    if system:
+        payload["systemInstruction"] = {"parts": [{"text": system}]}
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": GEMINI_API_KEY
+    }
+    response = http_client.post(url, json=payload, headers=headers, timeout=timeout)
+    if response.status_code != 200:
+        raise ProviderError(f"Gemini API error: {response.status_code}, {response.text[:200]}")
+    return response.json()['candidates'][0]['content']['parts'][0]['text']
+
+
+def huggingface_rest(prompt, system=None, max_tokens=None, timeout=LLM_CALL_TIMEOUT):
+    """Text generation on the Hugging Face inference API (the system prompt isn't used)."""
+    url = f"https://api-inference.huggingface.co/models/{HF_FALLBACK_MODEL}"
+    headers = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": max_tokens or 250,
+            "temperature": 0.8,
+            "top_p": 0.95,
+            "repetition_penalty": 1.2,
+            "do_sample": True
+        }
+    }
+    response = http_client.post(url, headers=headers, json=payload, timeout=timeout)
+    if response.status_code != 200:
+        raise ProviderError(f"Hugging Face API error: {response.status_code}, {response.text[:200]}")
+
+    result = response.json()
+    if not isinstance(result, list) or not result:
+        raise ProviderError("Hugging Face API returned no generations")
+    # Remove the prompt from the response
+    text = result[0].get("generated_text", "").replace(prompt, "").strip()
+    if not text:
+        raise ProviderError("Hugging Face API returned an empty generation")
+
+    # Add a question at the end if it doesn't have one
+    if not any(text.endswith(q) for q in ["?", "!"]):
+        text += " What do you think happens next?"
+    return text
+
+
+llm_router = LLMRouter()
+llm_router.register(Provider("gemini", gemini_rest, enabled=bool(GEMINI_API_KEY)))
+llm_router.register(Provider("huggingface", huggingface_rest, enabled=bool(HUGGINGFACE_API_KEY)))
@@ -0,0 +1,49 @@
+# services/local_vision.py
+#
+# Runs drawing captioning and classification in-process on CPU instead of
+# through the Hugging Face Inference API (VISION_BACKEND=local). The models
+# are hub ids or local directories; with LOCAL_VISION_OFFLINE=1 nothing is
+# downloaded, so any checkpoint on disk works, including tiny test ones.
+
+import os
+
+from dotenv import load_dotenv
+
+from .inference import BatchedPipeline
+
+load_dotenv()
+
+LOCAL_CAPTION_MODEL = os.getenv("LOCAL_CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+LOCAL_CLASSIFY_MODEL = os.getenv("LOCAL_CLASSIFY_MODEL", "microsoft/resnet-50")
+# "torch" or "onnx" (needs optimum[onnxruntime])
+LOCAL_VISION_RUNTIME = os.getenv("LOCAL_VISION_RUNTIME", "torch")
+LOCAL_VISION_QUANTIZE = os.getenv("LOCAL_VISION_QUANTIZE", "0") == "1"
+LOCAL_VISION_THREADS = int(os.getenv("LOCAL_VISION_THREADS", "0"))
+LOCAL_VISION_OFFLINE = os.getenv("LOCAL_VISION_OFFLINE", "0") == "1"
+LOCAL_VISION_BATCH = int(os.getenv("LOCAL_VISION_BATCH", "8"))
+LOCAL_VISION_MAX_WAIT_MS = float(os.getenv("LOCAL_VISION_MAX_WAIT_MS", "10"))
+
+
+def _pipeline(task, model, **call_kwargs):
+    return BatchedPipeline(
+        task, model,
+        runtime=LOCAL_VISION_RUNTIME,
+        quantize=LOCAL_VISION_QUANTIZE,
+        threads=LOCAL_VISION_THREADS,
+        offline=LOCAL_VISION_OFFLINE,
+        max_batch_size=LOCAL_VISION_BATCH,
+        max_wait=LOCAL_VISION_MAX_WAIT_MS / 1000,
+        **call_kwargs
+    )
+
+
+# Outputs have the same shape as the Inference API responses:
+# [{"generated_text": ...}] and [{"label": ..., "score": ...}, ...]
+caption_model = _pipeline("image-to-text", LOCAL_CAPTION_MODEL, max_new_tokens=30)
+classify_model = _pipeline("image-classification", LOCAL_CLASSIFY_MODEL, top_k=5)
+
+
+def warmup():
+    """Load both models ahead of the first request."""
+    caption_model.warmup()
+    classify_model.warmup()
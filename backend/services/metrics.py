@@ -0,0 +1,275 @@
+# services/metrics.py
+#
+# Per-stage latency histograms and counters in the Prometheus text format,
+# plus the request ID / theme / language context every timer picks up.
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests slower than this are logged with their per-stage breakdown
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Theme and language labels come from request bodies; values outside these sets
+# (STORY_THEMES in services/rag_story_generator.py, LANGUAGES in app.py) are
+# labelled "other", so clients can't create an unbounded number of series
+KNOWN_THEMES = frozenset(["general", "adventure", "fantasy", "mystery", "animal", "mythology", "bedtime"])
+KNOWN_LANGUAGES = frozenset(
+    ["en", "es", "fr", "hi", "zh", "ar", "de", "ja", "ru", "pt", "bn", "ur", "te", "ta", "mr", "ko"]
+)
+OTHER_LABEL = "other"
+
+
+class RequestContext:
+    """What every metric and log line of one request is tagged with."""
+
+    def __init__(self, request_id, theme="", language=""):
+        self.request_id = request_id
+        self.theme = theme
+        self.language = language
+        self.started = time.perf_counter()
+        self.stages = []
+
+
+_current = contextvars.ContextVar("request_context", default=None)
+
+
+def start_request(request_id=None):
+    """Begin a request context; reuses an incoming request ID when there is one."""
+    context = RequestContext(request_id or uuid.uuid4().hex)
+    _current.set(context)
+    return context
+
+
+def current():
+    return _current.get()
+
+
+def current_request_id():
+    context = _current.get()
+    return context.request_id if context else None
+
+
+def label_value(value, known):
+    """value as a label: normalized if it is one of known, else "other" ("" stays unset)."""
+    value = str(value).strip().lower()
+    if not value:
+        return ""
+    return value if value in known else OTHER_LABEL
+
+
+def set_labels(theme=None, language=None):
+    """Record the theme/language of the current request for later stages."""
+    context = _current.get()
+    if context is None:
+        return
+    if theme is not None:
+        context.theme = label_value(theme, KNOWN_THEMES)
+    if language is not None:
+        context.language = label_value(language, KNOWN_LANGUAGES)
+
+
+def bind(fn):
+    """Wrap fn to run in a copy of the current context (for thread pools)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (non-cumulative), then sum and count
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """{label values: (count, sum)} for every series, e.g. to diff around a benchmark."""
+        with self._lock:
+            return {key: (count, total) for key, (_, total, count) in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "storyteller_stage_seconds", "Time spent in one stage of handling a request.",
+    ("stage", "theme", "language", "outcome")
+)
+REQUEST_SECONDS = Histogram(
+    "storyteller_request_seconds", "End-to-end request latency.",
+    ("endpoint", "method", "status", "theme", "language")
+)
+EVENTS = Counter(
+    "storyteller_events_total", "Notable events such as cache hits, fallbacks and filtered content.",
+    ("event", "theme", "language")
+)
+
+HTTP_REQUESTS = Counter(
+    "storyteller_http_requests_total", "Outbound HTTP requests (services/http_client.py).", ("host",)
+)
+HTTP_CONNECTIONS = Counter(
+    "storyteller_http_connections_total", "New outbound connections, i.e. TCP/TLS handshakes.", ("host",)
+)
+PROMPT_TOKENS = Histogram(
+    "storyteller_prompt_tokens", "Tokens of each story prompt (services/prompt_assembler.py), by part.",
+    ("part",), buckets=(50, 100, 250, 500, 1000, 1500, 2000, 2500, 4000, 8000)
+)
+
+ALL_METRICS = [REQUEST_SECONDS, STAGE_SECONDS, EVENTS, HTTP_REQUESTS, HTTP_CONNECTIONS, PROMPT_TOKENS]
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Time a block as ``stage``; outcome is "ok", "error" if it raises, or
+    "cancelled" if a generator is closed inside it (client went away).
+
+    Theme and language default to the current request's. The block may set
+    ``timer["outcome"]`` itself (e.g. "filtered" or "fallback").
+    """
+    context = _current.get()
+    timer = {"outcome": "ok"}
+    start = time.perf_counter()
+    try:
+        yield timer
+    except GeneratorExit:
+        timer["outcome"] = "cancelled"
+        raise
+    except BaseException:
+        timer["outcome"] = "error"
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, timer["outcome"], context=context, **labels)
+
+
+def observe(stage, seconds, outcome="ok", context=None, **labels):
+    """Record a stage duration measured by the caller (e.g. time to first sentence)."""
+    context = context or _current.get()
+    theme = context.theme if context else ""
+    language = context.language if context else ""
+    if "theme" in labels:
+        theme = label_value(labels["theme"], KNOWN_THEMES)
+    if "language" in labels:
+        language = label_value(labels["language"], KNOWN_LANGUAGES)
+    STAGE_SECONDS.observe(seconds, stage=stage, theme=theme, language=language, outcome=outcome)
+    if context is not None:
+        context.stages.append((stage, seconds, outcome))
+
+
+def count(event, amount=1):
+    context = _current.get()
+    EVENTS.inc(
+        amount, event=event,
+        theme=context.theme if context else "", language=context.language if context else ""
+    )
+
+
+def finish_request(endpoint, method, status):
+    """Record the request's total latency; logs a breakdown if it was slow."""
+    context = _current.get()
+    if context is None:
+        return
+    elapsed = time.perf_counter() - context.started
+    REQUEST_SECONDS.observe(
+        elapsed, endpoint=endpoint or "", method=method, status=str(status),
+        theme=context.theme, language=context.language
+    )
+    if elapsed > SLOW_REQUEST_SECONDS:
+        stages = ", ".join(f"{stage}={seconds:.2f}s({outcome})" for stage, seconds, outcome in context.stages)
+        print(f"[{context.request_id}] slow {method} {endpoint}: {elapsed:.2f}s; {stages}")
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Tag every request with an ID and record its latency."""
+    from flask import request
+
+    @app.before_request
+    def _start_request():
+        start_request(request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    def _finish_request(response):
+        request_id = current_request_id()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        # Streamed bodies are still being produced; their stages are recorded as they run
+        finish_request(request.endpoint, request.method, response.status_code)
+        return response
@@ -0,0 +1,282 @@
+# services/prompt_assembler.py
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from . import metrics
+from .registry import registry
+from .session_store import format_turn
+from .text_utils import split_sentences
+
+load_dotenv()
+
+# Prompt token budget per target word count, i.e. per storyLength (see WORD_COUNT_MAP)
+PROMPT_TOKEN_BUDGETS = {
+    int(words): int(tokens)
+    for words, tokens in (
+        pair.split(":") for pair in os.getenv("PROMPT_TOKEN_BUDGETS", "50:1000,100:1500,200:2500").split(",")
+    )
+}
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "6"))  # most turns kept verbatim
+PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.5"))  # of what the template and input leave
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "200"))
+PROMPT_SUMMARY_CACHE_SIZE = int(os.getenv("PROMPT_SUMMARY_CACHE_SIZE", "1024"))
+PROMPT_DUPLICATE_SIMILARITY = float(os.getenv("PROMPT_DUPLICATE_SIMILARITY", "0.7"))
+# tiktoken's encodings are OpenAI's; for Gemini the counts are a close estimate, which is all a budget needs
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "cl100k_base")
+
+# Below this many tokens a truncated chunk isn't worth including
+MIN_CHUNK_TOKENS = 64
+# Below this many tokens the summary can't hold the story's opening; a recent turn makes room
+MIN_SUMMARY_TOKENS = 32
+
+SUMMARY_LAYOUT = "Summary of the story so far:\n{summary}\nMost recent turns:\n{recent}"
+
+_TURN = re.compile(r"^(Child|Storyteller): ", re.MULTILINE)
+_ROLES = {"Child": "user", "Storyteller": "assistant"}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class Tokenizer:
+    """Token counts from a tiktoken encoding, or about 4 characters per token without one."""
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoding is None:
+            return max(1, len(text) // 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        """The longest prefix of text within max_tokens."""
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+
+
+def load_tokenizer(name=PROMPT_ENCODING):
+    # tiktoken downloads an encoding on first use (set TIKTOKEN_CACHE_DIR to keep it across deploys)
+    try:
+        import tiktoken
+        return Tokenizer(tiktoken.get_encoding(name))
+    except Exception as e:
+        print(f"tiktoken encoding {name} unavailable, estimating 4 characters per token: {e}")
+        return Tokenizer()
+
+
+registry.register("tokenizer", load_tokenizer)
+
+
+def parse_transcript(transcript):
+    """Split a transcript written with format_turn back into role/content turns."""
+    if not transcript:
+        return []
+    parts = _TURN.split(transcript)
+    # parts: [text before the first turn, speaker, content, speaker, content, ...]
+    return [
+        {"role": _ROLES[speaker], "content": content.strip()}
+        for speaker, content in zip(parts[1::2], parts[2::2])
+    ]
+
+
+def summarize_turn(turn):
+    """One line for a turn of the running summary: the child's words, or the storyteller's first sentence."""
+    content = " ".join(turn["content"].split())
+    if turn["role"] == "user":
+        words = content.split()
+        return f"The child asked: {' '.join(words[:25])}{'...' if len(words) > 25 else ''}"
+    sentences = split_sentences(content)
+    return sentences[0] if sentences else content
+
+
+def _shingles(text, size=3):
+    words = [w.lower() for w in _WORD.findall(text)]
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def dedupe_chunks(chunks, similarity=PROMPT_DUPLICATE_SIMILARITY):
+    """Drop chunks that repeat an earlier (higher ranked) one.
+
+    A chunk is a duplicate when most of its word 3-grams already appear in a
+    kept chunk: the same story scraped from two pages, or neighbouring
+    splitter chunks that mostly overlap. Returns (kept, dropped count).
+    """
+    kept, kept_shingles = [], []
+    for chunk in chunks:
+        shingles = _shingles(chunk)
+        if not shingles or any(len(shingles & seen) / len(shingles) >= similarity for seen in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept, len(chunks) - len(kept)
+
+
+class PromptAssembly:
+    """An assembled prompt and the token count of each of its parts."""
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.tokens = tokens
+
+    def __repr__(self):
+        return f"PromptAssembly({self.tokens})"
+
+
+class PromptAssembler:
+    """Fits the story prompt into a token budget.
+
+    The template and the child's input always go in. Of what is left, up to
+    ``history_share`` goes to the story so far: its last turns verbatim (at
+    most ``recent_turns``, newest first until the share is spent), and
+    everything older as a running summary of at most ``summary_tokens`` in
+    what the recent turns leave of the share.
+    Summaries are built one turn at a time on top of the summary of the
+    previous turns, which is cached, so a growing session only summarizes
+    its newest turn. Retrieved chunks fill the rest in rank order, after
+    near-duplicates are dropped.
+    """
+
+    def __init__(self, budgets=PROMPT_TOKEN_BUDGETS, recent_turns=PROMPT_RECENT_TURNS,
+                 history_share=PROMPT_HISTORY_SHARE, summary_tokens=PROMPT_SUMMARY_TOKENS,
+                 summary_cache_size=PROMPT_SUMMARY_CACHE_SIZE, tokenizer=None):
+        self.budgets = dict(sorted(budgets.items()))
+        self.recent_turns = recent_turns
+        self.history_share = history_share
+        self.summary_tokens = summary_tokens
+        self._tokenizer = tokenizer
+        self._summaries = OrderedDict()
+        self._summary_cache_size = summary_cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer or registry.get("tokenizer")
+
+    def budget_for(self, word_count):
+        """The budget of the smallest story length that covers word_count."""
+        for words, tokens in self.budgets.items():
+            if word_count <= words:
+                return tokens
+        return list(self.budgets.values())[-1]
+
+    def summarize(self, turns, max_tokens=None):
+        """Running summary of turns (oldest first), within ``summary_tokens`` (or less, ``max_tokens``)."""
+        if not turns:
+            return ""
+        keys = []
+        digest = hashlib.sha256()
+        for turn in turns:
+            digest.update(format_turn(turn["role"], turn["content"]).encode("utf-8"))
+            keys.append(digest.hexdigest())
+
+        # Start from the longest prefix that was summarized before
+        with self._lock:
+            start, lines = 0, []
+            for i in range(len(keys) - 1, -1, -1):
+                if keys[i] in self._summaries:
+                    self._summaries.move_to_end(keys[i])
+                    start, lines = i + 1, list(self._summaries[keys[i]])
+                    break
+
+        tokenizer = self.tokenizer
+        for i in range(start, len(turns)):
+            lines.append(summarize_turn(turns[i]))
+            # Keep the story's opening line; drop the oldest lines after it until the summary fits
+            while len(lines) > 2 and tokenizer.count("\n".join(lines)) > self.summary_tokens:
+                del lines[1]
+            with self._lock:
+                self._summaries[keys[i]] = tuple(lines)
+                while len(self._summaries) > self._summary_cache_size:
+                    self._summaries.popitem(last=False)
+
+        # Cached summaries are always built to summary_tokens; a smaller limit only trims the result
+        max_tokens = self.summary_tokens if max_tokens is None else min(max_tokens, self.summary_tokens)
+        while len(lines) > 2 and tokenizer.count("\n".join(lines)) > max_tokens:
+            del lines[1]
+        return tokenizer.truncate("\n".join(lines), max_tokens)
+
+    def assemble(self, template, user_input, transcript, chunks, word_count, **fields):
+        """Fill ``template`` ({input}, {story_history}, {context}, {word_count} and ``fields``) within budget."""
+        tokenizer = self.tokenizer
+        budget = self.budget_for(word_count)
+        base = template.format(input=user_input, story_history="", context="", word_count=word_count, **fields)
+        tokens = {"budget": budget, "template": tokenizer.count(base)}
+        remaining = budget - tokens["template"]
+
+        # The story so far: newest turns verbatim, the rest summarized, all within the history share
+        turns = parse_transcript(transcript)
+        history_budget = max(0, int(remaining * self.history_share))
+        recent, costs = [], []
+        for turn in reversed(turns[-self.recent_turns:] if self.recent_turns else []):
+            text = format_turn(turn["role"], turn["content"])
+            cost = tokenizer.count(text)
+            if recent and sum(costs) + cost > history_budget:
+                break
+            recent.insert(0, text)
+            costs.insert(0, cost)
+        history = "".join(recent)
+        if len(recent) < len(turns):
+            summary_budget = (history_budget - sum(costs)
+                              - tokenizer.count(SUMMARY_LAYOUT.format(summary="", recent="")))
+            # Too little room for a summary: older recent turns join it (the newest one never does)
+            while summary_budget < MIN_SUMMARY_TOKENS and len(recent) > 1:
+                recent.pop(0)
+                summary_budget += costs.pop(0)
+            history = "".join(recent)
+            older = turns[:len(turns) - len(recent)]
+            while summary_budget >= MIN_SUMMARY_TOKENS:
+                with_summary = SUMMARY_LAYOUT.format(summary=self.summarize(older, summary_budget), recent=history)
+                # The parts' token counts don't quite add up to the count of the whole
+                excess = tokenizer.count(with_summary) - history_budget
+                if excess <= 0:
+                    history = with_summary
+                    break
+                summary_budget -= excess
+        tokens["history"] = tokenizer.count(history)
+        tokens["recent_turns"] = len(recent)
+        tokens["summarized_turns"] = len(turns) - len(recent)
+        remaining -= tokens["history"]
+
+        # Retrieved context, best first, until the budget runs out
+        kept, tokens["duplicate_chunks"] = dedupe_chunks(chunks)
+        context, tokens["context"], tokens["dropped_chunks"] = [], 0, 0
+        for chunk in kept:
+            cost = tokenizer.count(chunk) + 1
+            if cost > remaining:
+                if remaining >= MIN_CHUNK_TOKENS:
+                    chunk = tokenizer.truncate(chunk, remaining - 1)
+                    cost = remaining
+                else:
+                    tokens["dropped_chunks"] += 1
+                    continue
+            context.append(chunk)
+            tokens["context"] += cost
+            remaining -= cost
+        tokens["chunks"] = len(context)
+
+        text = template.format(
+            input=user_input, story_history=history, context="\n\n".join(context), word_count=word_count, **fields
+        )
+        tokens["total"] = tokenizer.count(text)
+        self._report(tokens)
+        return PromptAssembly(text, tokens)
+
+    @staticmethod
+    def _report(tokens):
+        for part in ("total", "template", "history", "context"):
+            metrics.PROMPT_TOKENS.observe(tokens[part], part=part)
+        if tokens["total"] > tokens["budget"]:
+            # Only the template, the child's input and the newest turn are never cut
+            metrics.count("prompt_over_budget")
+
+
+prompt_assembler = PromptAssembler()
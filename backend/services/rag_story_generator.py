@@ -1,16 +1,22 @@
 # services/rag_story_generator.py
 
+import asyncio
 import os
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from rag_engine.embedding_cache import get_embeddings
+from .chain_pool import ChainPool
+from . import metrics
+from .llm_router import LLM_CALL_TIMEOUT, Provider, llm_router
+from .prompt_assembler import prompt_assembler
+from .session_store import format_turn
+from .story_fetcher import STORY_FETCH_DEADLINE, story_fetcher
 
-import requests
-from bs4 import BeautifulSoup
 import json
 from dotenv import load_dotenv
 import os
@@ -25,118 +31,73 @@ os.environ["GOOGLE_API_KEY"] = google_api_key
 
 # os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
-class RAGStoryGenerator:
-    def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.7)
-
-        self.vectorstore = None
-        self.retriever = None
-        self.current_theme = None
-        self.setup_rag_chain()
-    
-    def update_theme(self, new_theme):
-        """Update the RAG pipeline with a new theme."""
-        self.setup_rag_chain(theme=new_theme)
+# Chain pool settings: how many themes stay loaded, and which are built at startup
+RAG_CHAIN_POOL_SIZE = int(os.getenv("RAG_CHAIN_POOL_SIZE", "8"))
+RAG_PRELOAD_THEMES = [t.strip() for t in os.getenv("RAG_PRELOAD_THEMES", "general").split(",") if t.strip()]
 
+# Themes offered by the frontend, plus the catch-all "general"
+STORY_THEMES = ["general", "adventure", "fantasy", "mystery", "animal", "mythology", "bedtime"]
 
-    def fetch_stories_by_theme(self, theme):
-        """Fetch themed stories based on user selection."""
-        theme_sources = {
-            "mythology": [
-                "https://www.templepurohit.com/vedic-vaani/hindu-mythology-stories/",
-                "https://www.kidsgen.com/fables_and_fairytales/indian_mythology_stories/",
-                "https://mythopedia.com/",
-                "https://www.ancient-origins.net/myths-legends"
-            ],
-            "animal": [
-                "https://www.talesofpanchatantra.com/",
-                "https://www.kidsgen.com/fables_and_fairytales/african_folk_tales/",
-                "https://www.worldoftales.com/"
-            ],
-            "bedtime": [
-                "https://www.bedtimeshortstories.com/",
-                "https://www.shortkidstories.com/",
-                "https://www.storyberries.com/"
-            ],
-            "general": [
-                "https://www.pitara.com/fiction-for-kids/stories-for-kids/",
-                "https://americanliterature.com/childrens-stories",
-                "https://www.indiaparenting.com/stories/"
-            ]
-        }
+# Source pages per theme; themes without their own list use "general"
+THEME_SOURCES = {
+    "mythology": [
+        "https://www.templepurohit.com/vedic-vaani/hindu-mythology-stories/",
+        "https://www.kidsgen.com/fables_and_fairytales/indian_mythology_stories/",
+        "https://mythopedia.com/",
+        "https://www.ancient-origins.net/myths-legends"
+    ],
+    "animal": [
+        "https://www.talesofpanchatantra.com/",
+        "https://www.kidsgen.com/fables_and_fairytales/african_folk_tales/",
+        "https://www.worldoftales.com/"
+    ],
+    "bedtime": [
+        "https://www.bedtimeshortstories.com/",
+        "https://www.shortkidstories.com/",
+        "https://www.storyberries.com/"
+    ],
+    "general": [
+        "https://www.pitara.com/fiction-for-kids/stories-for-kids/",
+        "https://americanliterature.com/childrens-stories",
+        "https://www.indiaparenting.com/stories/"
+    ]
+}
 
-        urls = theme_sources.get(theme.lower(), theme_sources["general"])
-        stories = []
 
-        for url in urls:
-            try:
-                response = requests.get(url, timeout=5)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, "html.parser")
-                    extracted = [p.text.strip() for p in soup.find_all("p")[:5]]
-                    stories.extend(extracted)
-            except Exception as e:
-                print(f"Failed fetching {url}: {e}")
-                continue
+def theme_db_path(theme):
+    """Directory of the persisted Chroma store for theme."""
+    return f"story_db_{theme}"
 
-        return "\n".join(stories) if stories else "No themed stories found."
 
-    def prepare_documents(self, raw_text, theme):
-        """Prepare documents for vector store."""
-        # splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-        # return splitter.split_documents([Document(page_content=raw_text)])
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-        docs = splitter.split_documents([Document(page_content=raw_text)])
+def fetch_stories_by_theme(theme, deadline=STORY_FETCH_DEADLINE):
+    """Fetch themed stories based on user selection."""
+    urls = THEME_SOURCES.get(theme.lower(), THEME_SOURCES["general"])
+    stories = story_fetcher.fetch_paragraphs(urls, limit=5, deadline=deadline)
 
-        # Tag documents with theme metadata
-        for doc in docs:
-            doc.metadata["theme"] = theme
+    return "\n".join(stories) if stories else "No themed stories found."
 
-        return docs
 
-    def setup_rag_chain(self,  theme="general"):
-        """Set up RAG chain based on selected theme."""
-        
-        persist_dir = f"story_db_{theme}"
-        if self.current_theme == theme:
-            return  # Already set up
-        self.current_theme = theme
-        # Try loading an existing vector store
-        if os.path.exists(persist_dir):
-            # self.vectorstore = Chroma(persist_directory=persist_dir, embedding=self.embeddings)
-            self.vectorstore = Chroma(
-                embedding_function=self.embeddings,
-                persist_directory=persist_dir
-            )
-
-            print(f"Loaded vectorstore for theme: {theme}")
-        else:
-            raw_text = self.fetch_stories_by_theme(theme)
-            docs = self.prepare_documents(raw_text, theme)
-
-            self.vectorstore = Chroma.from_documents(
-                documents=docs,
-                embedding=self.embeddings,
-                persist_directory=persist_dir
-            )
-            print(f"Created new vectorstore for theme: {theme}")
-
-        # raw_text = self.fetch_stories_by_theme(theme)
-        # docs = self.prepare_documents(raw_text, theme)
-
-        # self.vectorstore = Chroma.from_documents(
-        #     documents=docs,
-        #     embedding=self.embeddings,
-        #     persist_directory=f"story_db_{theme}"
-        # )
-
-        self.retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5, "filter": {"theme": theme}}
-        )
-                
-        self.prompt = ChatPromptTemplate.from_template("""
+def fetch_theme_pages(theme, deadline=STORY_FETCH_DEADLINE):
+    """{url: paragraphs, or None if the page could not be fetched} for theme's sources."""
+    urls = THEME_SOURCES.get(theme.lower(), THEME_SOURCES["general"])
+    return story_fetcher.fetch_pages(urls, limit=5, deadline=deadline)
+
+
+def prepare_theme_documents(raw_text, theme, source=None):
+    """Split raw text into chunks tagged with theme (and source page) metadata."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    docs = splitter.split_documents([Document(page_content=raw_text)])
+
+    # Tag documents with theme metadata
+    for doc in docs:
+        doc.metadata["theme"] = theme
+        if source:
+            doc.metadata["source"] = source
+
+    return docs
+
+
+STORY_PROMPT = """
             You are a creative children's storyteller who creates personalized stories based on the child's input and relevant story content.
 
             Use the following context from various stories to craft a unique and engaging story:
@@ -155,39 +116,255 @@ class RAGStoryGenerator:
             6. Is approximately {word_count} words long
 
             Story segment:
-            """)
+            """
+
 
+class ThemeChain:
+    """The vectorstore, retriever and retrieval chain for one story theme."""
+
+    def __init__(self, theme, vectorstore, retriever, chain):
+        self.theme = theme
+        self.vectorstore = vectorstore
+        self.retriever = retriever
+        self.chain = chain
+
+
+class RAGStoryGenerator:
+    def __init__(self, pool_size=RAG_CHAIN_POOL_SIZE, preload_themes=RAG_PRELOAD_THEMES):
+        self.embeddings = get_embeddings()
+        # The router enforces deadlines and falls back, so the client itself retries little
+        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.7, timeout=LLM_CALL_TIMEOUT,
+                                          max_retries=1)
+
+        # The prompt and document chain are stateless, so every theme shares them
+        self.prompt = ChatPromptTemplate.from_template(STORY_PROMPT)
         self.document_chain = create_stuff_documents_chain(llm=self.llm, prompt=self.prompt)
-        self.chain = create_retrieval_chain(self.retriever, self.document_chain)
-        
 
-    def generate_story(self, user_input, story_history=None, word_count=50):
+        self.pool = ChainPool(self.build_theme_chain, max_size=pool_size)
+        self.pool.preload(preload_themes)
+
+        # Story calls go through the router: this model first, then the REST fallbacks
+        llm_router.register(Provider(
+            "gemini_chat", self._chat, acall=self._achat, stream=self._chat_stream, astream=self._achat_stream
+        ))
+
+    @staticmethod
+    def normalize_theme(theme):
+        return (theme or "general").strip().lower()
+
+    def get_theme_chain(self, theme):
+        """Return the pooled ThemeChain for theme, building it on first use."""
+        return self.pool.get(self.normalize_theme(theme))
+
+    def update_theme(self, new_theme):
+        """Update the RAG pipeline with a new theme."""
+        self.setup_rag_chain(theme=new_theme)
+
+
+    def fetch_stories_by_theme(self, theme):
+        """Fetch themed stories based on user selection."""
+        return fetch_stories_by_theme(theme)
+
+    def prepare_documents(self, raw_text, theme):
+        """Prepare documents for vector store."""
+        return prepare_theme_documents(raw_text, theme)
+
+    def build_theme_chain(self, theme):
+        """Open the vectorstore for theme and build its retrieval chain.
+
+        Stores are built ahead of time by ``python -m utils.ingest_stories``;
+        a request never scrapes or embeds. Themes without a store of their own
+        share the general one.
+        """
+        persist_dir = theme_db_path(theme)
+        if not os.path.exists(persist_dir):
+            if theme != "general":
+                print(f"No vectorstore for theme: {theme}, using general")
+                metrics.count("theme_fallback")
+                return self.pool.get("general")
+            raise RuntimeError(f"No vectorstore at {persist_dir}. Run: python -m utils.ingest_stories")
+
+        vectorstore = Chroma(
+            embedding_function=self.embeddings,
+            persist_directory=persist_dir
+        )
+        print(f"Loaded vectorstore for theme: {theme}")
+
+        retriever = vectorstore.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": 5, "filter": {"theme": theme}}
+        )
+        chain = create_retrieval_chain(retriever, self.document_chain)
+        return ThemeChain(theme, vectorstore, retriever, chain)
+
+    def setup_rag_chain(self, theme="general"):
+        """Make sure the chain for theme is loaded into the pool."""
+        self.get_theme_chain(theme)
+
+    def _prepare(self, user_input, story_history, word_count, theme, formatted_history, context=None):
+        """Retrieve the theme's context documents and build the document chain's input.
+
+        Retrieval and the LLM call run as separate steps (rather than through
+        ThemeChain.chain) so each gets its own latency metric, and the LLM call
+        can go through the provider router. ``context`` skips retrieval with
+        documents fetched ahead, e.g. by ``retrieve_many``.
+        """
+        if formatted_history is None:
+            formatted_history = self.format_history(story_history)
+        if context is None:
+            theme_chain = self.get_theme_chain(theme)
+            with metrics.timed("retrieval") as timer:
+                context = theme_chain.retriever.invoke(user_input)
+                if not context:
+                    timer["outcome"] = "empty"
+        return {
+            "input": user_input,
+            "story_history": formatted_history,
+            "word_count": word_count,
+            "context": context
+        }
+
+    def retrieve_many(self, user_inputs, theme):
+        """Context documents for each of user_inputs, from one theme's vectorstore.
+
+        The theme's chain is taken from the pool once, the queries are
+        embedded together (one cache lookup, one batch for the misses) and
+        each vector is searched directly, instead of one retriever call per
+        input.
+        """
+        theme_chain = self.get_theme_chain(theme)
+        search_kwargs = theme_chain.retriever.search_kwargs
+        with metrics.timed("retrieval_batch") as timer:
+            vectors = self.embeddings.embed_queries(user_inputs)
+            results = [
+                theme_chain.vectorstore.similarity_search_by_vector(vector, **search_kwargs) for vector in vectors
+            ]
+            if not all(results):
+                timer["outcome"] = "empty"
+        return results
+
+    async def _aprepare(self, user_input, story_history, word_count, theme, formatted_history):
+        """``_prepare`` with the retriever called through ``ainvoke``."""
+        if formatted_history is None:
+            formatted_history = self.format_history(story_history)
+        # Opening a theme's vectorstore is blocking; it happens once per pooled theme
+        theme_chain = await asyncio.to_thread(self.get_theme_chain, theme)
+        with metrics.timed("retrieval") as timer:
+            docs = await theme_chain.retriever.ainvoke(user_input)
+            if not docs:
+                timer["outcome"] = "empty"
+        return {
+            "input": user_input,
+            "story_history": formatted_history,
+            "word_count": word_count,
+            "context": docs
+        }
+
+    @staticmethod
+    def render_prompt(inputs):
+        """The story prompt as text, fitted to the token budget of its word count."""
+        assembly = prompt_assembler.assemble(
+            STORY_PROMPT,
+            inputs["input"],
+            inputs["story_history"],
+            [doc.page_content for doc in inputs["context"]],
+            inputs["word_count"]
+        )
+        return assembly.text
+
+    # The chat model as a router provider. The prompt asks for a word count,
+    # so max_tokens (a cap for the completion-style fallbacks) isn't passed on.
+
+    @staticmethod
+    def _messages(prompt, system):
+        return [("system", system), ("human", prompt)] if system else prompt
+
+    def _chat(self, prompt, system=None, max_tokens=None, timeout=None):
+        return self.llm.invoke(self._messages(prompt, system)).content
+
+    async def _achat(self, prompt, system=None, max_tokens=None, timeout=None):
+        return (await self.llm.ainvoke(self._messages(prompt, system))).content
+
+    def _chat_stream(self, prompt, system=None, max_tokens=None, timeout=None):
+        for chunk in self.llm.stream(self._messages(prompt, system)):
+            if chunk.content:
+                yield chunk.content
+
+    async def _achat_stream(self, prompt, system=None, max_tokens=None, timeout=None):
+        async for chunk in self.llm.astream(self._messages(prompt, system)):
+            if chunk.content:
+                yield chunk.content
+
+    def format_history(self, story_history):
+        """Format previous story messages for the prompt."""
+        if not story_history:
+            return ""
+        return "".join(format_turn(m.get('role'), m.get('content', '')) for m in story_history)
+
+    def generate_story(self, user_input, story_history=None, word_count=50, theme="general", formatted_history=None,
+                       context=None):
         """Generate a story segment using RAG.
         
         Args:
             user_input (str): The user's input for the story
             story_history (list, optional): Previous story messages
             word_count (int, optional): Desired word count for the story. Defaults to 50.
+            theme (str, optional): Story theme selecting the vectorstore. Defaults to "general".
+            formatted_history (str, optional): Transcript kept by a story session; used
+                instead of formatting story_history again.
+            context (list, optional): Documents retrieved ahead (see retrieve_many).
+
+        Raises if retrieval or every LLM provider fails, or the answer is empty,
+        so the caller serves (and never caches) its own fallback.
         """
         try:
-            # Format story history
-            formatted_history = ""
-            if story_history:
-                for message in story_history:
-                    if message.get('role') == 'assistant':
-                        formatted_history += f"Storyteller: {message.get('content', '')}\n"
-                    elif message.get('role') == 'user':
-                        formatted_history += f"Child: {message.get('content', '')}\n"
+            inputs = self._prepare(user_input, story_history, word_count, theme, formatted_history, context)
 
             # Generate story
-            response = self.chain.invoke({
-                "input": user_input,
-                "story_history": formatted_history,
-                "word_count": word_count
-            })
-            
-            return response.get("answer", "Once upon a time... What would you like to happen next?")
-            
-        except Exception as e:
-            print(f"Error generating story with RAG: {e}")
-            return "Once upon a time... What would you like to happen next?" 
\ No newline at end of file
+            with metrics.timed("llm"):
+                answer = llm_router.generate(self.render_prompt(inputs))
+        except Exception:
+            metrics.count("rag_error")
+            raise
+        if not answer:
+            metrics.count("rag_error")
+            raise ValueError("the LLM returned an empty story")
+        return answer
+
+    def stream_story(self, user_input, story_history=None, word_count=50, theme="general", formatted_history=None):
+        """Yield a story segment in pieces as the LLM produces it.
+
+        Errors are raised to the caller, which decides how to recover mid-stream.
+        """
+        inputs = self._prepare(user_input, story_history, word_count, theme, formatted_history)
+
+        with metrics.timed("llm"):
+            for chunk in llm_router.stream(self.render_prompt(inputs)):
+                if chunk:
+                    yield chunk
+
+    async def agenerate_story(self, user_input, story_history=None, word_count=50, theme="general",
+                              formatted_history=None):
+        """``generate_story`` for the async app: retrieval and the LLM call don't block the event loop."""
+        try:
+            inputs = await self._aprepare(user_input, story_history, word_count, theme, formatted_history)
+
+            with metrics.timed("llm"):
+                answer = await llm_router.agenerate(self.render_prompt(inputs))
+        except Exception:
+            metrics.count("rag_error")
+            raise
+        if not answer:
+            metrics.count("rag_error")
+            raise ValueError("the LLM returned an empty story")
+        return answer
+
+    async def astream_story(self, user_input, story_history=None, word_count=50, theme="general",
+                            formatted_history=None):
+        """``stream_story`` as an async generator."""
+        inputs = await self._aprepare(user_input, story_history, word_count, theme, formatted_history)
+
+        with metrics.timed("llm"):
+            async for chunk in llm_router.astream(self.render_prompt(inputs)):
+                if chunk:
+                    yield chunk
@@ -0,0 +1,115 @@
+# services/registry.py
+
+import asyncio
+import os
+import threading
+import time
+
+
+class Resource:
+    """One lazily loaded resource and how its loading went."""
+
+    def __init__(self, name, loader, warm=True):
+        self.name = name
+        self.loader = loader
+        self.warm = warm
+        self.value = None
+        self.loaded = False
+        self.error = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class ResourceRegistry:
+    """Heavy resources (models, vectorstores, automata) loaded on first use.
+
+    Modules register a loader at import time, which costs nothing; the
+    resource is built the first time someone calls ``get`` or during
+    ``warmup``. A failed load is recorded and retried on the next ``get``.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._warmup_lock = threading.Lock()
+        self._warmup_pid = None
+
+    def register(self, name, loader, warm=True):
+        """Register loader under name. ``warm`` resources are built by warmup()
+        and must be loaded before the service reports ready."""
+        self._resources[name] = Resource(name, loader, warm)
+
+    def get(self, name):
+        resource = self._resources[name]
+        if resource.loaded:
+            return resource.value
+        with resource.lock:
+            if not resource.loaded:
+                start = time.perf_counter()
+                try:
+                    resource.value = resource.loader()
+                except Exception as e:
+                    resource.error = str(e)
+                    raise
+                finally:
+                    resource.load_seconds = time.perf_counter() - start
+                resource.error = None
+                resource.loaded = True
+                print(f"Loaded {name} in {resource.load_seconds:.2f}s")
+        return resource.value
+
+    async def aget(self, name):
+        """``get`` for async code: a resource that still has to load does so in a thread."""
+        resource = self._resources[name]
+        if resource.loaded:
+            return resource.value
+        return await asyncio.to_thread(self.get, name)
+
+    def warmup(self, names=None):
+        """Load the given (default: all warm) resources; failures are logged, not raised."""
+        names = names or [r.name for r in self._resources.values() if r.warm]
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Warmup of {name} failed: {e}")
+        return self.status()
+
+    def warmup_in_background(self, names=None):
+        thread = threading.Thread(target=self.warmup, args=(names,), name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def start_warmup(self):
+        """``warmup_in_background`` once per process; call it from the serving process.
+
+        Servers that fork workers after importing the app (gunicorn --preload)
+        must not warm up at import: the thread would stay in the parent, and
+        a fork while it holds a resource lock leaves that lock held forever in
+        the worker. Returns whether this call started the warmup.
+        """
+        if self._warmup_pid == os.getpid():
+            return False
+        with self._warmup_lock:
+            if self._warmup_pid == os.getpid():
+                return False
+            self._warmup_pid = os.getpid()
+        self.warmup_in_background()
+        return True
+
+    def ready(self):
+        return all(r.loaded for r in self._resources.values() if r.warm)
+
+    def status(self):
+        return {
+            r.name: {
+                "loaded": r.loaded,
+                "warm": r.warm,
+                "seconds": round(r.load_seconds, 3) if r.load_seconds is not None else None,
+                "error": r.error,
+            }
+            for r in self._resources.values()
+        }
+
+
+# Shared by every module that owns a heavy resource
+registry = ResourceRegistry()
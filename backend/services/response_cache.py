@@ -0,0 +1,233 @@
+# services/response_cache.py
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import metrics
+from .session_store import format_turn
+
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600)))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "3"))
+# Cosine similarity a fresh session's prompt needs to reuse another prompt's stories; 0 disables it
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_prompt(prompt):
+    """Lowercase words only, so case, spacing and punctuation don't split keys."""
+    return " ".join(word.lower() for word in _WORD.findall(prompt or ""))
+
+
+def history_digest(history=None, transcript=None):
+    """Digest of the story so far ("" for a fresh story).
+
+    A stateless history is formatted the same way as a session transcript,
+    so the same story reaches the same key either way.
+    """
+    if not transcript and history:
+        transcript = "".join(format_turn(m.get('role'), m.get('content', '')) for m in history)
+    if not transcript:
+        return ""
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+
+# Where a freshly generated story goes: its exact key, and for fresh stories
+# the semantic bucket and prompt embedding that make it findable by others
+Slot = namedtuple("Slot", "key bucket vector")
+
+
+class _Entry:
+    __slots__ = ("variants", "expires_at", "bucket", "vector")
+
+    def __init__(self, expires_at, bucket, vector):
+        self.variants = []
+        self.expires_at = expires_at
+        self.bucket = bucket
+        self.vector = vector
+
+
+class ResponseCache:
+    """Generated story segments, keyed by what the generator was asked for.
+
+    The exact key is (theme, normalized prompt, word count, language, history
+    digest). Fresh stories (no history) also match a stored fresh story of the
+    same theme, length and language whose prompt embedding is at least
+    ``similarity`` close. A key collects up to ``variants`` different stories
+    before it is served from; after that a random one is returned, so a
+    popular prompt doesn't always get the same story. Entries expire
+    ``ttl`` seconds after their first story and the least recently used are
+    evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, embed=None, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE,
+                 variants=RESPONSE_CACHE_VARIANTS, similarity=RESPONSE_CACHE_SIMILARITY):
+        self.embed = embed
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.variants = max(1, variants)
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._buckets = {}  # bucket -> (keys, matrix of their unit vectors), rebuilt after a change
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(theme, prompt, word_count, language, digest):
+        raw = "\x1f".join([str(theme), normalize_prompt(prompt), str(word_count), str(language), digest])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _vector(self, prompt):
+        """Unit embedding of the normalized prompt, or None if embeddings are unavailable."""
+        if self.embed is None or self.similarity <= 0:
+            return None
+        try:
+            vector = np.asarray(self.embed(normalize_prompt(prompt)), dtype=np.float32)
+        except ImportError as e:
+            print(f"Prompt embeddings unavailable, response cache is exact-only: {e}")
+            self.embed = None
+            return None
+        except Exception as e:
+            print(f"[{metrics.current_request_id()}] Error embedding prompt for the response cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, theme, prompt, word_count, language, history=None, transcript=None):
+        """Return (story or None, Slot); pass the slot to ``store`` after generating on a miss.
+
+        The semantic step embeds the prompt, which may be a network call, so
+        it only runs after an exact miss.
+        """
+        digest = history_digest(history, transcript)
+        key = self.key(theme, prompt, word_count, language, digest)
+        story, full = self._serve(key)
+        if story is not None:
+            self._count("exact_hits", "exact_hit")
+            return story, Slot(key, None, None)
+        if full is not None:
+            # Known key still collecting variants
+            self._count("misses", "miss")
+            return None, Slot(key, None, None)
+
+        bucket = vector = None
+        if not digest:
+            bucket = (theme, word_count, language)
+            vector = self._vector(prompt)
+        if vector is not None:
+            match = self._nearest(bucket, vector)
+            if match is not None:
+                story, full = self._serve(match)
+                if story is not None:
+                    self._count("semantic_hits", "semantic_hit")
+                    return story, Slot(match, None, None)
+                if full is not None:
+                    # Fill the near-duplicate's variants rather than start a new key
+                    self._count("misses", "miss")
+                    return None, Slot(match, None, None)
+
+        self._count("misses", "miss")
+        return None, Slot(key, bucket, vector)
+
+    def _count(self, counter, event):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        metrics.count(f"response_cache_{event}")
+
+    def _serve(self, key):
+        """(a random variant, True) for a full entry, (None, False) for one still
+        collecting variants, (None, None) for an unknown or expired key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                return None, None
+            self._entries.move_to_end(key)
+            if len(entry.variants) < self.variants:
+                return None, False
+            return self._random.choice(entry.variants), True
+
+    def _nearest(self, bucket, vector):
+        with self._lock:
+            index = self._buckets.get(bucket)
+            if index is None:
+                return None
+            keys, matrix = index
+            if matrix is None:
+                matrix = np.stack([self._entries[k].vector for k in keys])
+                self._buckets[bucket] = (keys, matrix)
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            return keys[best] if scores[best] >= self.similarity else None
+
+    def store(self, slot, story):
+        """Add a generated (safe, final) story under the slot from ``lookup``."""
+        if not story:
+            return
+        with self._lock:
+            entry = self._entries.get(slot.key)
+            if entry is None or entry.expires_at <= time.time():
+                if entry is not None:
+                    self._remove(slot.key)
+                entry = _Entry(time.time() + self.ttl, slot.bucket, slot.vector)
+                self._entries[slot.key] = entry
+                if entry.vector is not None:
+                    keys, _ = self._buckets.get(entry.bucket, ([], None))
+                    self._buckets[entry.bucket] = (keys + [slot.key], None)
+            self._entries.move_to_end(slot.key)
+            if len(entry.variants) < self.variants:
+                entry.variants.append(story)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry.vector is not None:
+            keys, _ = self._buckets[entry.bucket]
+            keys = [k for k in keys if k != key]
+            if keys:
+                self._buckets[entry.bucket] = (keys, None)
+            else:
+                del self._buckets[entry.bucket]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "variants": self.variants,
+                "similarity": self.similarity,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+def _embed_prompt(text):
+    # The same process-wide (sqlite-cached) embeddings the story retriever uses
+    from rag_engine.embedding_cache import get_embeddings
+    return get_embeddings().embed_query(text)
+
+
+response_cache = ResponseCache(embed=_embed_prompt) if RESPONSE_CACHE_ENABLED else None
@@ -0,0 +1,204 @@
+# services/session_store.py
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+
+
+def format_turn(role, content):
+    """Format one story message the way the storyteller prompt expects it."""
+    if role == 'assistant':
+        return f"Storyteller: {content}\n"
+    elif role == 'user':
+        return f"Child: {content}\n"
+    return ""
+
+
+class StorySession:
+    """Server-side state of one story: its settings and pre-formatted transcript."""
+
+    def __init__(self, session_id, theme, story_length, language, transcript="", turn_count=0):
+        self.id = session_id
+        self.theme = theme
+        self.story_length = story_length
+        self.language = language
+        self.transcript = transcript
+        self.turn_count = turn_count
+
+
+class SessionStore:
+    """Interface for story session backends.
+
+    Turns are only ever appended, and the formatted transcript is extended
+    with just the new turn, so a turn costs the same however long the story is.
+    """
+
+    def create(self, theme, story_length, language):
+        raise NotImplementedError
+
+    def get(self, session_id):
+        """Return the StorySession, or None if it is unknown or was evicted."""
+        raise NotImplementedError
+
+    def append(self, session_id, role, content):
+        """Append one turn and return the updated StorySession, or None if it is unknown or was evicted."""
+        raise NotImplementedError
+
+    def turns(self, session_id, limit=None):
+        """Return the last ``limit`` turns (all by default) as role/content dicts."""
+        raise NotImplementedError
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store that keeps the most recently used sessions."""
+
+    def __init__(self, max_sessions=SESSION_MAX):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def create(self, theme, story_length, language):
+        session = StorySession(self.new_id(), theme, story_length, language)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._turns[session.id] = []
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._turns.pop(evicted, None)
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def append(self, session_id, role, content):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            self._turns[session_id].append({"role": role, "content": content})
+            session.transcript += format_turn(role, content)
+            session.turn_count += 1
+            return session
+
+    def turns(self, session_id, limit=None):
+        with self._lock:
+            turns = self._turns.get(session_id, [])
+            return list(turns[-limit:] if limit else turns)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store backed by a sqlite file, so sessions survive restarts and are shared by workers."""
+
+    def __init__(self, path=SESSION_DB_PATH, max_sessions=SESSION_MAX):
+        self.path = path
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    theme TEXT,
+                    story_length INTEGER,
+                    language TEXT,
+                    transcript TEXT NOT NULL DEFAULT '',
+                    turn_count INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+                CREATE TABLE IF NOT EXISTS turns (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                );
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, theme, story_length, language):
+        session = StorySession(self.new_id(), theme, story_length, language)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, theme, story_length, language, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session.id, theme, story_length, language, time.time())
+            )
+            self._evict(conn)
+        return session
+
+    def _evict(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        excess = count - self.max_sessions
+        if excess > 0:
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM sessions ORDER BY updated_at LIMIT ?", (excess,)
+            )]
+            conn.executemany("DELETE FROM turns WHERE session_id = ?", [(s,) for s in stale])
+            conn.executemany("DELETE FROM sessions WHERE id = ?", [(s,) for s in stale])
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT id, theme, story_length, language, transcript, turn_count FROM sessions WHERE id = ?",
+            (session_id,)
+        ).fetchone()
+        return StorySession(*row) if row else None
+
+    def append(self, session_id, role, content):
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE sessions SET transcript = transcript || ?, turn_count = turn_count + 1, updated_at = ? "
+                "WHERE id = ?",
+                (format_turn(role, content), time.time(), session_id)
+            )
+            if updated.rowcount == 0:
+                return None
+            conn.execute(
+                "INSERT INTO turns (session_id, seq, role, content) "
+                "SELECT id, turn_count, ?, ? FROM sessions WHERE id = ?",
+                (role, content, session_id)
+            )
+        return self.get(session_id)
+
+    def turns(self, session_id, limit=None):
+        rows = self._connect().execute(
+            "SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, limit or -1)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+
+def create_session_store(kind=SESSION_STORE):
+    """Build the configured session store ("memory" or "sqlite")."""
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
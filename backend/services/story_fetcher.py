@@ -0,0 +1,147 @@
+# services/story_fetcher.py
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+
+from .http_client import http_client
+
+load_dotenv()
+
+STORY_FETCH_CACHE_DIR = os.getenv("STORY_FETCH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fetch_cache"))
+STORY_FETCH_CACHE_TTL = int(os.getenv("STORY_FETCH_CACHE_TTL", str(6 * 3600)))
+STORY_FETCH_DEADLINE = float(os.getenv("STORY_FETCH_DEADLINE", "8"))
+STORY_FETCH_WORKERS = int(os.getenv("STORY_FETCH_WORKERS", "8"))
+
+# Paragraphs kept per page; call sites take the first few of these
+MAX_CACHED_PARAGRAPHS = 20
+
+
+class PageCache:
+    """On-disk cache of extracted page paragraphs plus their HTTP validators.
+
+    The directory is created on the first write; if it can't be, pages are
+    simply not cached (e.g. on a read-only deployment).
+    """
+
+    def __init__(self, cache_dir=STORY_FETCH_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.enabled = True
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, url):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, entry):
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Could not create page cache at {self.cache_dir}, not caching pages: {e}")
+            self.enabled = False
+            return
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not cache {url}: {e}")
+
+
+class StoryFetcher:
+    """Fetch story pages concurrently over the shared client's keep-alive connections.
+
+    Pages are revalidated with ETag / Last-Modified once their cached extract
+    is older than ``ttl``. A call never takes longer than its deadline: pages
+    that have not arrived by then are served from a stale cache entry if there
+    is one, or skipped. Late responses still land in the cache for next time.
+    """
+
+    def __init__(self, cache_dir=STORY_FETCH_CACHE_DIR, ttl=STORY_FETCH_CACHE_TTL,
+                 max_workers=STORY_FETCH_WORKERS, timeout=5):
+        self.cache = PageCache(cache_dir)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = http_client.session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="story-fetch")
+
+    def fetch_pages(self, urls, limit=5, deadline=STORY_FETCH_DEADLINE):
+        """Return {url: first ``limit`` paragraphs} in ``urls`` order.
+
+        A page is None if it neither arrived in time nor has a cached copy,
+        so callers can tell a missing page from one without paragraphs.
+        """
+        futures = [self._executor.submit(self._fetch_page, url) for url in urls]
+        wait(futures, timeout=deadline)
+
+        pages = {}
+        for url, future in zip(urls, futures):
+            page = None
+            if future.done() and future.exception() is None:
+                page = future.result()
+            else:
+                if future.done():
+                    print(f"Failed fetching {url}: {future.exception()}")
+                entry = self.cache.load(url)
+                page = entry["paragraphs"] if entry else None
+            pages[url] = page[:limit] if page is not None else None
+        return pages
+
+    def fetch_paragraphs(self, urls, limit=5, deadline=STORY_FETCH_DEADLINE):
+        """Return the first ``limit`` paragraphs of every page, in ``urls`` order."""
+        pages = self.fetch_pages(urls, limit, deadline)
+        return [paragraph for page in pages.values() if page for paragraph in page]
+
+    def _fetch_page(self, url):
+        entry = self.cache.load(url)
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["paragraphs"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        # The per-page timeout is not cut to the call's deadline, so a slow page
+        # that misses this call still refreshes the cache for the next one
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and entry:
+            entry["fetched_at"] = time.time()
+            self.cache.save(url, entry)
+            return entry["paragraphs"]
+        if response.status_code != 200:
+            return entry["paragraphs"] if entry else None
+
+        soup = BeautifulSoup(response.text, "html.parser")
+        entry = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "paragraphs": [p.text.strip() for p in soup.find_all("p")[:MAX_CACHED_PARAGRAPHS]],
+        }
+        self.cache.save(url, entry)
+        return entry["paragraphs"]
+
+
+# Shared by every caller so connections and the cache are reused
+story_fetcher = StoryFetcher()
@@ -1,15 +1,23 @@
 # services/story_generation.py
 
+import asyncio
 import os
-import requests
+import queue
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-import pickle
-from .rag_story_generator import RAGStoryGenerator
+from .content_filter import DEFAULT_LANGUAGE, load_content_filter
+from .text_utils import aiter_sentences, iter_sentences, split_sentences
+from .session_store import format_turn
+from .llm_router import LLMUnavailable, llm_router
+from .prompt_assembler import prompt_assembler
+from .registry import registry
+from .response_cache import response_cache
+from .translation import translator
+from . import metrics
 from dotenv import load_dotenv
-import traceback
-from langdetect import detect, LangDetectException
-from deep_translator import GoogleTranslator
+from langdetect import DetectorFactory, detect, detect_langs, LangDetectException
 
 load_dotenv() 
 
@@ -29,21 +37,43 @@ When continuing a story:
 4. End with an engaging question that invites the user to continue the story
 """
 
-# Initialize RAG story generator
-rag_generator = RAGStoryGenerator()
+# Fixed kid-safety replies; their translations come from the cache after the first request
+UNSAFE_PROMPT_MESSAGE = "Let's use friendly words in our story! What would you like to happen next?"
+UNSAFE_STORY_MESSAGE = "Oops, something went wrong with the story. Let's try a new adventure!"
+
+# Target words per story segment for each storyLength
+WORD_COUNT_MAP = {1: 50, 2: 100, 3: 200}
+
+# langdetect is randomized; seeded, the same text always gets the same safety check
+DetectorFactory.seed = 0
+
+# How sure langdetect must be before a language's own word list replaces the shared one
+FILTER_LANGUAGE_CONFIDENCE = 0.9
+
+# Stories of one batch generated at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Most stories one batch may start (a class, not a school)
+BATCH_MAX_STORIES = int(os.getenv("BATCH_MAX_STORIES", "40"))
+# Seconds a whole batch may take; stories not done by then are reported as timed out
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", "60"))
+
+def _load_rag_generator():
+    # Imported here because langchain and Chroma take seconds to import
+    from .rag_story_generator import RAGStoryGenerator
+    return RAGStoryGenerator()
+
+# The RAG story generator and the compiled bad-word automaton load on first use (or at warmup)
+registry.register("rag_generator", _load_rag_generator)
+registry.register("content_filter", load_content_filter)
 
 def format_story_history(history):
     """Format the story history into a coherent narrative."""
     if not history:
         return ""
     
-    formatted_history = "Previous story context:\n"
-    for message in history:
-        if message.get('role') == 'assistant':
-            formatted_history += f"Storyteller: {message.get('content', '')}\n"
-        elif message.get('role') == 'user':
-            formatted_history += f"Child: {message.get('content', '')}\n"
-    return formatted_history
+    return "Previous story context:\n" + "".join(
+        format_turn(message.get('role'), message.get('content', '')) for message in history
+    )
 
 def get_age_range_from_length(story_length):
     """Map story length to appropriate age range."""
@@ -54,25 +84,12 @@ def get_age_range_from_length(story_length):
     else:  # Long
         return "10-12"
 
-def generate_with_gemini(prompt, story_length, theme, history=None):
-    """Generate story content using Google's Gemini API."""
-    if not GEMINI_API_KEY:
-        print("Gemini API key not found. Skipping Gemini generation.")
-        return None
-        
-    try:
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
-        
-        # Map story length to token count
-        max_tokens = {1: 50, 2: 100, 3: 150}[story_length]
-        
-        # Prepare the full prompt with history and user input
-        story_context = format_story_history(history) if history else ""
-        full_prompt = f"""
-        {story_context}
+CONTINUATION_PROMPT = """
+        Previous story context:
+        {story_history}
         
         Theme: {theme}
-        Child's input: {prompt}
+        Child's input: {input}
         
         Continue the story in a way that:
         1. Naturally incorporates the child's input
@@ -80,202 +97,428 @@ def generate_with_gemini(prompt, story_length, theme, history=None):
         3. Keeps the story engaging and age-appropriate
         4. Ends with a question that invites the child to continue the story
         """
-        
-        messages = [
-            {"role": "system", "parts": [{"text": SYSTEM_PROMPT}]},
-            {"role": "user", "parts": [{"text": full_prompt}]}
-        ]
-        
-        payload = {
-            "contents": messages,
-            "generationConfig": {
-                "temperature": 0.8,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": max_tokens,
-                "safetySettings": [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_LOW_AND_ABOVE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
-                ]
-            }
-        }
-        
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY
-        }
-        
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['candidates'][0]['content']['parts'][0]['text']
-        else:
-            print(f"Gemini API error: {response.status_code}, {response.text}")
-            return None
-    
-    except Exception as e:
-        print(f"Error generating with Gemini: {e}")
-        traceback.print_exc()
+
+def build_continuation_prompt(prompt, story_length, theme, history=None):
+    """The prompt for a story continuation without retrieved context, within its token budget."""
+    transcript = "".join(format_turn(m.get('role'), m.get('content', '')) for m in history or [])
+    return prompt_assembler.assemble(
+        CONTINUATION_PROMPT, prompt, transcript, [], WORD_COUNT_MAP[story_length], theme=theme
+    ).text
+
+def generate_with_gemini(prompt, story_length, theme, history=None):
+    """Generate story content using Google's Gemini API (through the LLM router)."""
+    if not GEMINI_API_KEY:
+        print("Gemini API key not found. Skipping Gemini generation.")
+        return None
+
+    # Map story length to token count
+    max_tokens = {1: 50, 2: 100, 3: 150}[story_length]
+    try:
+        return llm_router.generate(
+            build_continuation_prompt(prompt, story_length, theme, history), system=SYSTEM_PROMPT,
+            max_tokens=max_tokens, providers=["gemini"]
+        )
+    except LLMUnavailable as e:
+        print(f"[{metrics.current_request_id()}] Error generating with Gemini: {e}")
         return None
 
 def generate_with_huggingface(prompt, story_length, theme, history=None):
-    """Generate story content using Hugging Face models as fallback."""
+    """Generate story content using Hugging Face models as fallback (through the LLM router)."""
     if not HUGGINGFACE_API_KEY:
         return None
-        
+
+    # Map story length to token count
+    max_tokens = {1: 50, 2: 100, 3: 150}[story_length]
     try:
-        model_id = "gpt2"  # Using GPT-2 as a reliable fallback
-        
-        # Map story length to token count
-        max_tokens = {1: 50, 2: 100, 3: 150}[story_length]
-        
-        # Format the prompt with history and user input
-        story_context = format_story_history(history) if history else ""
-        safe_prompt = f"""
-        {story_context}
-        
-        Theme: {theme}
-        Child's input: {prompt}
-        
-        Continue the story in a way that:
-        1. Naturally incorporates the child's input
-        2. Maintains consistency with previous events
-        3. Keeps the story engaging and age-appropriate
-        4. Ends with a question that invites the child to continue the story
-        """
-        
-        url = f"https://api-inference.huggingface.co/models/{model_id}"
-        headers = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
-        
-        payload = {
-            "inputs": safe_prompt,
-            "parameters": {
-                "max_new_tokens": max_tokens,
-                "temperature": 0.8,
-                "top_p": 0.95,
-                "repetition_penalty": 1.2,
-                "do_sample": True
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            if isinstance(result, list) and len(result) > 0:
-                text = result[0].get("generated_text", "")
-                # Remove the prompt from the response
-                text = text.replace(safe_prompt, "").strip()
-                
-                # Add a question at the end if it doesn't have one
-                if not any(text.strip().endswith(q) for q in ["?", "!"]):
-                    text += " What do you think happens next?"
-                
-                return text
-            else:
-                return None
-        else:
-            print(f"Hugging Face API error: {response.status_code}, {response.text}")
-            return None
-    
-    except Exception as e:
-        print(f"Error generating with Hugging Face: {e}")
+        return llm_router.generate(
+            build_continuation_prompt(prompt, story_length, theme, history), max_tokens=max_tokens, providers=["huggingface"]
+        )
+    except LLMUnavailable as e:
+        print(f"[{metrics.current_request_id()}] Error generating with Hugging Face: {e}")
         return None
 
 def translate_text(text, target_lang='en'):
-    """Translate text to the target language."""
-    try:
-        if target_lang == 'en':
-            return text  # No translation needed for English
-        
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        translated = translator.translate(text)
-        return translated
-    except Exception as e:
-        print(f"Translation error: {e}")
-        return text  # Return original text if translation fails
+    """Translate text to the target language (sentence by sentence, cached)."""
+    if not target_lang or target_lang == 'en':
+        return text
+    with metrics.timed("translation"):
+        return translator.translate(text, target_lang)
+
+def fallback_story(prompt, history=None, transcript=None):
+    """The simple story served when RAG generation fails."""
+    if history or transcript:
+        return f"Continuing our story... {prompt} What do you think happens next?"
+    return f"Once upon a time, in a magical kingdom far, far away, there lived a friendly dragon who loved to tell stories. {prompt} What kind of adventure would you like to hear about?"
+
+def cached_story(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """(story or None, slot) from the response cache; (None, None) when it is off.
+
+    On a miss, a story that passes the safety filter is stored with
+    ``remember_story(slot, story)``. Fallback and safety replies never are.
+    """
+    if response_cache is None:
+        return None, None
+    with metrics.timed("response_cache") as timer:
+        story, slot = response_cache.lookup(
+            theme, prompt, WORD_COUNT_MAP[story_length], language, history=history, transcript=transcript
+        )
+        if story is None:
+            timer["outcome"] = "miss"
+    return story, slot
+
+def remember_story(slot, story):
+    if slot is not None:
+        response_cache.store(slot, story)
 
-def generate_story_segment(prompt, story_length, theme, history=None, language='en'):
-    """Main function to generate story content using RAG."""
+def generate_story_segment(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """Main function to generate story content using RAG.
+
+    ``transcript`` is a session's pre-formatted story so far; when given it is
+    used as-is instead of formatting ``history``.
+    """
     if not filter_content_for_kids(prompt):
-        return "Let's use friendly words in our story! What would you like to happen next?"
+        metrics.count("unsafe_prompt")
+        return translate_text(UNSAFE_PROMPT_MESSAGE, language)
+
+    story, slot = cached_story(prompt, story_length, theme, history, language, transcript)
+    if story is not None:
+        return story
+
+    return _generate_uncached(prompt, story_length, theme, history, language, transcript, slot)
 
+def _generate_uncached(prompt, story_length, theme, history, language, transcript, slot, context=None):
+    """Generate, filter and translate a story the cache missed; stores it under slot."""
     try:
-        # Generate story using RAG
-        rag_generator.setup_rag_chain(theme)
-        word_count_map = {1: 50, 2: 100, 3: 200}
-        story = rag_generator.generate_story(prompt, history, word_count=word_count_map[story_length])
+        # Generate story using RAG (the theme's chain comes from the generator's pool)
+        with metrics.timed("generation"):
+            story = registry.get("rag_generator").generate_story(
+                prompt, history, word_count=WORD_COUNT_MAP[story_length], theme=theme, formatted_history=transcript,
+                context=context
+            )
 
         if not filter_content_for_kids(story):
-            return "Oops, something went wrong with the story. Let's try a new adventure!"
+            metrics.count("unsafe_story")
+            return translate_text(UNSAFE_STORY_MESSAGE, language)
 
         # Translate the story if needed
         if language != 'en':
             story = translate_text(story, language)
 
+        remember_story(slot, story)
         return story
     except Exception as e:
-        print(f"Error generating story with RAG: {e}")
+        print(f"[{metrics.current_request_id()}] Error generating story with RAG: {e}")
+        metrics.count("fallback_story")
         # Fallback to a simple story
-        if history:
-            fallback = f"Continuing our story... {prompt} What do you think happens next?"
-        else:
-            fallback = f"Once upon a time, in a magical kingdom far, far away, there lived a friendly dragon who loved to tell stories. {prompt} What kind of adventure would you like to hear about?"
-        
-        # Translate fallback if needed
-        if language != 'en':
-            fallback = translate_text(fallback, language)
-        
-        return fallback
+        return translate_text(fallback_story(prompt, history, transcript), language)
 
-# # Load the list of inappropriate words
-# with open("data/ibw_bad_words.pkl", "rb") as f:
-#     inappropriate_words = set(pickle.load(f))
+def _batch_result(index, story, cached, started, batch_started):
+    finished = time.perf_counter()
+    metrics.observe("batch_item", finished - started, "cached" if cached else "ok")
+    return {
+        "index": index,
+        "story": story,
+        "cached": cached,
+        "seconds": round(finished - started, 3),
+        "elapsed": round(finished - batch_started, 3),
+    }
 
-# def filter_content_for_kids(text):
-#     """Filter to ensure content is appropriate for children."""
-#     text_lower = text.lower()
-    
-#     for word in inappropriate_words:
-#         if word in text_lower:
-#             return False
+def _batch_error(index, error, batch_started):
+    elapsed = time.perf_counter() - batch_started
+    metrics.observe("batch_item", elapsed, "timeout")
+    return {
+        "index": index,
+        "story": None,
+        "error": error,
+        "cached": False,
+        "seconds": round(elapsed, 3),
+        "elapsed": round(elapsed, 3),
+    }
+
+def validate_batch(specs, max_stories=BATCH_MAX_STORIES):
+    """Raise ValueError unless specs is a batch ``generate_story_batch`` can start."""
+    if not isinstance(specs, (list, tuple)) or not specs:
+        raise ValueError("stories must be a non-empty list")
+    if len(specs) > max_stories:
+        raise ValueError(f"At most {max_stories} stories per batch")
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, (list, tuple)) or len(spec) != 4:
+            raise ValueError(f"Story {index} must be (prompt, storyLength, theme, language)")
+        prompt, story_length, theme, language = spec
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError(f"Story {index}: initialPrompt must be a non-empty string")
+        if isinstance(story_length, bool) or story_length not in WORD_COUNT_MAP:
+            raise ValueError(f"Story {index}: storyLength must be one of {sorted(WORD_COUNT_MAP)}")
+        if not isinstance(theme, str):
+            raise ValueError(f"Story {index}: theme must be a string")
+        if not isinstance(language, str) or not language:
+            raise ValueError(f"Story {index}: language must be a non-empty string")
+
+def generate_story_batch(specs, concurrency=BATCH_CONCURRENCY, deadline=BATCH_DEADLINE):
+    """Start many stories at once, yielding each result as soon as it is ready.
+
+    ``specs`` are (prompt, story_length, theme, language) tuples; they are
+    checked with ``validate_batch`` before anything starts, so a bad batch
+    raises ValueError here rather than once iteration begins. Yields
+    dicts with the spec's ``index``, the ``story``, whether it was
+    ``cached``, the ``seconds`` it took and the ``elapsed`` time since the
+    batch started. Cache hits and unsafe prompts come first; the misses are
+    grouped by theme, so each theme's chain is taken once and its retrieval
+    runs as one batch (``retrieve_many``), then generated on at most
+    ``concurrency`` threads. Stories not finished ``deadline`` seconds after
+    the batch started are yielded with ``story`` None and an ``error``.
+    """
+    validate_batch(specs)
+    return _run_batch(specs, concurrency, deadline)
+
+def _run_batch(specs, concurrency, deadline):
+    batch_started = time.perf_counter()
+    ready, groups = [], {}
+    for index, (prompt, story_length, theme, language) in enumerate(specs):
+        started = time.perf_counter()
+        if not filter_content_for_kids(prompt):
+            metrics.count("unsafe_prompt")
+            story = translate_text(UNSAFE_PROMPT_MESSAGE, language)
+            ready.append(_batch_result(index, story, False, started, batch_started))
+            continue
+        story, slot = cached_story(prompt, story_length, theme, language=language)
+        if story is not None:
+            ready.append(_batch_result(index, story, True, started, batch_started))
+            continue
+        groups.setdefault((theme or "general").strip().lower(), []).append((index, slot))
+
+    results = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
 
-#     return True
+    def run_item(index, slot, context):
+        started = time.perf_counter()
+        prompt, story_length, theme, language = specs[index]
+        try:
+            story = _generate_uncached(prompt, story_length, theme, None, language, None, slot, context)
+        except Exception as e:
+            print(f"[{metrics.current_request_id()}] Error generating batch story {index}: {e}")
+            story = fallback_story(prompt)
+        results.put(_batch_result(index, story, False, started, batch_started))
 
-def load_ibw_words(filepath="data/ibw.txt"):
-    """Parses the IBW dataset into a dictionary of inappropriate words by language."""
-    ibw_by_lang = {}
+    def run_group(theme, items):
+        contexts = [None] * len(items)
+        try:
+            contexts = registry.get("rag_generator").retrieve_many([specs[i][0] for i, _ in items], theme)
+        except Exception as e:
+            # Each story then retrieves its own context
+            print(f"[{metrics.current_request_id()}] Error retrieving batch context for {theme}: {e}")
+            metrics.count("batch_retrieval_error")
+        try:
+            for (index, slot), context in zip(items, contexts):
+                executor.submit(metrics.bind(run_item), index, slot, context)
+        except RuntimeError:
+            pass  # the batch was abandoned and the executor shut down
 
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split("\t")  # Dataset is tab-separated
-            if len(parts) < 2:
-                continue
-            word, lang = parts[0].lower(), parts[1].lower()
-            ibw_by_lang.setdefault(lang, set()).add(word)
+    for theme, items in groups.items():
+        executor.submit(metrics.bind(run_group), theme, items)
 
-    return ibw_by_lang
+    pending = {index for items in groups.values() for index, _ in items}
+    try:
+        yield from ready
+        while pending:
+            remaining = deadline - (time.perf_counter() - batch_started)
+            if remaining <= 0:
+                break
+            try:
+                result = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.discard(result["index"])
+            yield result
+        if pending:
+            print(f"[{metrics.current_request_id()}] {len(pending)} batch stories missed the {deadline}s deadline")
+            metrics.count("batch_timeout", len(pending))
+        for index in sorted(pending):
+            yield _batch_error(index, f"Story not ready within {deadline:g} seconds", batch_started)
+    finally:
+        # A client that goes away (or the deadline) cancels the stories not yet started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def detect_language(text):
+    """Detect the language of text, defaulting to English."""
+    try:
+        return detect(text)
+    except LangDetectException:
+        return "en"  # Default to English if detection fails
 
-# Load at module level
-inappropriate_words_by_language = load_ibw_words("data/ibw_bad_words.txt")
+
+def filter_language(content_filter, text):
+    """The language whose word list applies to text.
+
+    Detection only picks a matcher, and langdetect costs milliseconds of CPU
+    per call, so it is skipped when every language shares the same list. An
+    unsure guess gets the shared list: a language's own list may be shorter.
+    """
+    if not content_filter.has_language_lists:
+        return DEFAULT_LANGUAGE
+    try:
+        best = detect_langs(text)[0]
+    except (LangDetectException, IndexError):
+        return DEFAULT_LANGUAGE
+    return best.lang if best.prob >= FILTER_LANGUAGE_CONFIDENCE else DEFAULT_LANGUAGE
 
 
 def filter_content_for_kids(text):
     """Detect language and filter out inappropriate content."""
+    with metrics.timed("safety_filter") as timer:
+        content_filter = registry.get("content_filter")
+        clean = content_filter.is_clean(text, filter_language(content_filter, text))
+        if not clean:
+            timer["outcome"] = "filtered"
+    return clean
+
+
+def stream_story_segment(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """Stream a story segment sentence by sentence while the LLM writes it.
+
+    Yields ("sentence", text) events. Each sentence passes the kid-safety
+    filter (which keeps its state across sentences) and is translated before
+    it is released. A ("replace", text) event means everything sent so far
+    must be replaced by text; no events follow it.
+    """
+    if not filter_content_for_kids(prompt):
+        metrics.count("unsafe_prompt")
+        yield "replace", translate_text(UNSAFE_PROMPT_MESSAGE, language)
+        return
+
+    story, slot = cached_story(prompt, story_length, theme, history, language, transcript)
+    if story is not None:
+        for sentence in split_sentences(story):
+            yield "sentence", sentence
+        return
+
     try:
-        detected_lang = detect(text)
-    except LangDetectException:
-        detected_lang = "en"  # Default to English if detection fails
+        started = time.perf_counter()
+        chunks = registry.get("rag_generator").stream_story(
+            prompt, history, word_count=WORD_COUNT_MAP[story_length], theme=theme, formatted_history=transcript
+        )
 
-    text_lower = text.lower()
-    bad_words = inappropriate_words_by_language.get(detected_lang, inappropriate_words_by_language.get("en", set()))
+        scanner = None
+        released = []
+        for sentence in iter_sentences(chunks):
+            with metrics.timed("safety_filter") as timer:
+                if scanner is None:
+                    content_filter = registry.get("content_filter")
+                    scanner = content_filter.scanner(filter_language(content_filter, sentence))
+                unsafe = scanner.feed(sentence + " ")
+                if unsafe:
+                    timer["outcome"] = "filtered"
+            if unsafe:
+                metrics.count("unsafe_story")
+                yield "replace", translate_text(UNSAFE_STORY_MESSAGE, language)
+                return
+            if not released:
+                # What the listener waits for before the story starts
+                metrics.observe("first_sentence", time.perf_counter() - started)
+            released.append(translate_text(sentence, language))
+            yield "sentence", released[-1]
 
-    for word in bad_words:
-        if word in text_lower:
-            return False
+        if not released:
+            yield "replace", translate_text("Once upon a time... What would you like to happen next?", language)
+        else:
+            remember_story(slot, " ".join(released))
+    except Exception as e:
+        print(f"[{metrics.current_request_id()}] Error streaming story with RAG: {e}")
+        metrics.count("fallback_story")
+        yield "replace", translate_text(fallback_story(prompt, history, transcript), language)
+
+
+# Async versions for asgi_app.py. The LLM and retriever are awaited; the
+# safety filter is CPU-only and fast, so it runs inline; translation goes
+# through deep_translator, which is sync-only, so it runs in a worker thread.
+
+async def atranslate_text(text, target_lang='en'):
+    if not target_lang or target_lang == 'en':
+        return text
+    return await asyncio.to_thread(translate_text, text, target_lang)
+
+
+async def acached_story(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """``cached_story``; an exact miss may embed the prompt, which is a network call."""
+    if response_cache is None:
+        return None, None
+    return await asyncio.to_thread(cached_story, prompt, story_length, theme, history, language, transcript)
+
+
+async def agenerate_story_segment(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """``generate_story_segment`` without blocking the event loop."""
+    if not filter_content_for_kids(prompt):
+        metrics.count("unsafe_prompt")
+        return await atranslate_text(UNSAFE_PROMPT_MESSAGE, language)
+
+    story, slot = await acached_story(prompt, story_length, theme, history, language, transcript)
+    if story is not None:
+        return story
+
+    try:
+        generator = await registry.aget("rag_generator")
+        with metrics.timed("generation"):
+            story = await generator.agenerate_story(
+                prompt, history, word_count=WORD_COUNT_MAP[story_length], theme=theme, formatted_history=transcript
+            )
 
-    return True
+        if not filter_content_for_kids(story):
+            metrics.count("unsafe_story")
+            return await atranslate_text(UNSAFE_STORY_MESSAGE, language)
+
+        story = await atranslate_text(story, language)
+        remember_story(slot, story)
+        return story
+    except Exception as e:
+        print(f"[{metrics.current_request_id()}] Error generating story with RAG: {e}")
+        metrics.count("fallback_story")
+        return await atranslate_text(fallback_story(prompt, history, transcript), language)
+
+
+async def astream_story_segment(prompt, story_length, theme, history=None, language='en', transcript=None):
+    """``stream_story_segment`` as an async generator, with the same events."""
+    if not filter_content_for_kids(prompt):
+        metrics.count("unsafe_prompt")
+        yield "replace", await atranslate_text(UNSAFE_PROMPT_MESSAGE, language)
+        return
+
+    story, slot = await acached_story(prompt, story_length, theme, history, language, transcript)
+    if story is not None:
+        for sentence in split_sentences(story):
+            yield "sentence", sentence
+        return
+
+    try:
+        started = time.perf_counter()
+        generator = await registry.aget("rag_generator")
+        chunks = generator.astream_story(
+            prompt, history, word_count=WORD_COUNT_MAP[story_length], theme=theme, formatted_history=transcript
+        )
+
+        scanner = None
+        released = []
+        async for sentence in aiter_sentences(chunks):
+            with metrics.timed("safety_filter") as timer:
+                if scanner is None:
+                    content_filter = registry.get("content_filter")
+                    scanner = content_filter.scanner(filter_language(content_filter, sentence))
+                unsafe = scanner.feed(sentence + " ")
+                if unsafe:
+                    timer["outcome"] = "filtered"
+            if unsafe:
+                metrics.count("unsafe_story")
+                yield "replace", await atranslate_text(UNSAFE_STORY_MESSAGE, language)
+                return
+            if not released:
+                metrics.observe("first_sentence", time.perf_counter() - started)
+            released.append(await atranslate_text(sentence, language))
+            yield "sentence", released[-1]
+
+        if not released:
+            yield "replace", await atranslate_text("Once upon a time... What would you like to happen next?", language)
+        else:
+            remember_story(slot, " ".join(released))
+    except Exception as e:
+        print(f"[{metrics.current_request_id()}] Error streaming story with RAG: {e}")
+        metrics.count("fallback_story")
+        yield "replace", await atranslate_text(fallback_story(prompt, history, transcript), language)
@@ -0,0 +1,56 @@
+# services/text_utils.py
+
+import re
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+
+class SentenceBuffer:
+    """Accumulate streamed text and release it one complete sentence at a time."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add a chunk and return the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        pos = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[pos:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            pos = match.end()
+        self._buffer = self._buffer[pos:]
+        return sentences
+
+    def flush(self):
+        """Return whatever is left once the stream has ended."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def iter_sentences(chunks):
+    """Turn an iterable of streamed text chunks into complete sentences."""
+    buffer = SentenceBuffer()
+    for chunk in chunks:
+        yield from buffer.feed(chunk)
+    yield from buffer.flush()
+
+
+async def aiter_sentences(chunks):
+    """``iter_sentences`` for an async iterable of chunks."""
+    buffer = SentenceBuffer()
+    async for chunk in chunks:
+        for sentence in buffer.feed(chunk):
+            yield sentence
+    for sentence in buffer.flush():
+        yield sentence
+
+
+def split_sentences(text):
+    """Split text into sentences, keeping their punctuation."""
+    buffer = SentenceBuffer()
+    return buffer.feed(text) + buffer.flush()
@@ -0,0 +1,241 @@
+# services/translation.py
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from .text_utils import split_sentences
+
+load_dotenv()
+
+# "google" (deep_translator) or "local" (offline stand-in for tests)
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_CACHE_PATH = os.getenv(
+    "TRANSLATION_CACHE_PATH", os.path.join(tempfile.gettempdir(), "translation_cache.sqlite3")
+)
+TRANSLATION_CACHE_MAX = int(os.getenv("TRANSLATION_CACHE_MAX", "100000"))
+
+# GoogleTranslator refuses payloads over 5000 characters
+MAX_REQUEST_CHARS = 4500
+
+
+class TranslationCache:
+    """Persistent sentence cache in sqlite, keyed by sha256(target, text)."""
+
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=TRANSLATION_CACHE_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    translated TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used);
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(text, target):
+        return hashlib.sha256(f"{target}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(conn.execute(
+                    f"SELECT key, translated FROM translations WHERE key IN ({marks})", batch
+                ))
+                conn.execute(f"UPDATE translations SET last_used = ? WHERE key IN ({marks})", [time.time(), *batch])
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translated, last_used) VALUES (?, ?, ?)",
+                [(key, translated, now) for key, translated in items]
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM translations WHERE key IN "
+                    "(SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+
+class MemoryTranslationCache:
+    """In-process TranslationCache for when its sqlite file can't be opened."""
+
+    def __init__(self, max_entries=TRANSLATION_CACHE_MAX):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, translated in items:
+                self._entries[key] = translated
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def open_translation_cache(path=TRANSLATION_CACHE_PATH):
+    """The sqlite cache at path, or an in-memory one if it can't be opened (e.g. a read-only deployment)."""
+    try:
+        return TranslationCache(path)
+    except sqlite3.OperationalError as e:
+        print(f"Could not open translation cache at {path}, caching in memory: {e}")
+        return MemoryTranslationCache()
+
+
+class GoogleBackend:
+    """deep_translator's GoogleTranslator, one request per batch of sentences.
+
+    Sentences are sent newline-joined, which the service preserves; if the
+    line count doesn't survive, the batch is retried sentence by sentence.
+    """
+
+    def translate_batch(self, texts, target):
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source='auto', target=target)
+        translated = []
+        for chunk in _chunks(texts, MAX_REQUEST_CHARS):
+            lines = (translator.translate("\n".join(chunk)) or "").split("\n")
+            if len(lines) != len(chunk):
+                lines = translator.translate_batch(chunk)
+            translated.extend(line.strip() for line in lines)
+        return translated
+
+
+class LocalBackend:
+    """Offline stand-in: tags each sentence with the target language."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate_batch(self, texts, target):
+        self.calls += 1
+        return [f"[{target}] {text}" for text in texts]
+
+
+def _chunks(texts, max_chars):
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and size + len(text) + 1 > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text) + 1
+    if chunk:
+        yield chunk
+
+
+class Translator:
+    """Sentence-level translation through a persistent cache.
+
+    Text is split into lines and sentences; sentences already translated to
+    the target language come from the cache, and all misses of a call go to
+    the backend in a single ``translate_batch``. If the backend fails the
+    original sentences are returned and nothing is cached.
+    """
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else open_translation_cache()
+        self.hits = 0
+        self.misses = 0
+        # One translator serves every request thread
+        self._lock = threading.Lock()
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def translate_many(self, texts, target):
+        if not target or target == 'en':
+            return list(texts)
+
+        # Each text becomes lines of sentences; remember the layout to rebuild it
+        layouts = []
+        sentences = {}
+        for text in texts:
+            lines = []
+            for line in text.split("\n"):
+                keys = []
+                for sentence in split_sentences(line):
+                    key = TranslationCache.key(sentence, target)
+                    sentences[key] = sentence
+                    keys.append(key)
+                lines.append(keys)
+            layouts.append(lines)
+
+        translated = self.cache.get_many(sentences)
+        missing = [key for key in sentences if key not in translated]
+        self._count(len(sentences) - len(missing), len(missing))
+
+        if missing:
+            try:
+                results = self.backend.translate_batch([sentences[key] for key in missing], target)
+                new = [(key, result) for key, result in zip(missing, results) if result]
+                self.cache.put_many(new)
+                translated.update(new)
+            except Exception as e:
+                print(f"Translation error: {e}")
+
+        return [
+            "\n".join(" ".join(translated.get(key, sentences[key]) for key in keys) for keys in lines)
+            for lines in layouts
+        ]
+
+    def translate(self, text, target):
+        return self.translate_many([text], target)[0]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def create_translator(kind=TRANSLATION_BACKEND):
+    if kind == "google":
+        return Translator(GoogleBackend())
+    if kind == "local":
+        return Translator(LocalBackend())
+    raise ValueError(f"Unknown TRANSLATION_BACKEND: {kind}")
+
+
+# Shared by every caller so the cache connection is reused
+translator = create_translator()
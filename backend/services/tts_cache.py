@@ -0,0 +1,225 @@
+# services/tts_cache.py
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from .text_utils import split_sentences
+
+load_dotenv()
+
+# "gtts" or "local" (offline stand-in that produces silent MP3 frames)
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+
+_AUDIO_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class GTTSEngine:
+    """Google Text-to-Speech; unsupported languages fall back to English."""
+
+    name = "gtts"
+
+    def synthesize(self, text, language):
+        from gtts import gTTS
+
+        try:
+            tts = gTTS(text=text, lang=language)
+        except Exception as e:
+            if "language not supported" not in str(e).lower():
+                raise
+            print(f"Language {language} not supported, falling back to English")
+            tts = gTTS(text=text, lang='en')
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class LocalEngine:
+    """Offline stand-in: silent MPEG-1 Layer III frames, one per character."""
+
+    name = "local"
+    # 128 kbit/s, 44.1 kHz, mono; 417-byte frames of silence
+    FRAME = b"\xff\xfb\x90\xc4" + bytes(413)
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, language):
+        self.calls += 1
+        return self.FRAME * max(1, len(text))
+
+
+def strip_id3(audio):
+    """Drop a leading ID3v2 tag so MP3 pieces can be concatenated."""
+    if audio[:3] != b"ID3" or len(audio) < 10:
+        return audio
+    size = 0
+    for byte in audio[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return audio[10 + size:]
+
+
+class AudioCache:
+    """MP3 files on disk named by content hash, evicted least recently used
+    once they take more than ``max_bytes``.
+
+    If the directory can't be created (a read-only deployment), nothing is
+    cached and ``put`` hands the audio back in memory instead of as a path;
+    ``send_file`` and ``read`` take either.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        # Absolute, since Flask's send_file resolves relative paths against the app root
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._total = sum(
+                entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".mp3")
+            )
+            self.enabled = True
+        except OSError as e:
+            print(f"Could not use TTS cache at {self.cache_dir}, audio won't be cached: {e}")
+            self._total = 0
+            self.enabled = False
+
+    def path(self, audio_id):
+        if not _AUDIO_ID.match(audio_id):
+            raise ValueError(f"Invalid audio id: {audio_id}")
+        return os.path.join(self.cache_dir, f"{audio_id}.mp3")
+
+    def get(self, audio_id):
+        """Return the file path if audio_id is cached, marking it recently used."""
+        path = self.path(audio_id)
+        if not self.enabled:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, audio_id, audio):
+        """Store audio; returns its path, or the audio as a file object if it could not be stored."""
+        path = self.path(audio_id)
+        if not self.enabled:
+            return io.BytesIO(audio)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not cache audio {audio_id}: {e}")
+            return io.BytesIO(audio)
+        with self._lock:
+            self._total += len(audio)
+            if self._total > self.max_bytes:
+                self._evict()
+        return path
+
+    @staticmethod
+    def read(source):
+        """The bytes of a ``get``/``put`` result."""
+        if isinstance(source, io.BytesIO):
+            return source.getvalue()
+        with open(source, "rb") as f:
+            return f.read()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".mp3")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        self._total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._total <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total -= size
+            except OSError:
+                pass
+
+
+class TTSService:
+    """Text-to-speech with a content-addressed audio cache.
+
+    ``synthesize`` returns a cached MP3 file for the whole text. ``stream``
+    synthesizes sentences in parallel and yields their audio in order as
+    soon as each one (and every one before it) is ready; sentence audio is
+    cached too, so repeated openers are free.
+    """
+
+    def __init__(self, engine, cache=None, workers=TTS_WORKERS):
+        self.engine = engine
+        self.cache = cache if cache is not None else AudioCache()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def audio_id(self, text, language):
+        return hashlib.sha256(f"{self.engine.name}\0{language}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lock_for(self, audio_id):
+        with self._locks_lock:
+            return self._locks.setdefault(audio_id, threading.Lock())
+
+    def _audio(self, text, language):
+        """Return (audio_id, path or file object), synthesizing once per id even under concurrency."""
+        audio_id = self.audio_id(text, language)
+        path = self.cache.get(audio_id)
+        if path:
+            return audio_id, path
+        with self._lock_for(audio_id):
+            path = self.cache.get(audio_id)
+            if path is None:
+                path = self.cache.put(audio_id, strip_id3(self.engine.synthesize(text, language)))
+        with self._locks_lock:
+            self._locks.pop(audio_id, None)
+        return audio_id, path
+
+    def synthesize(self, text, language='en'):
+        """Return (audio_id, path or file object) of the MP3 for the whole text."""
+        return self._audio(text, language)
+
+    def stream(self, text, language='en'):
+        """Yield MP3 bytes sentence by sentence, in order; caches the full text at the end."""
+        audio_id = self.audio_id(text, language)
+        cached = self.cache.get(audio_id)
+        if cached:
+            yield self.cache.read(cached)
+            return
+
+        sentences = split_sentences(text) or [text]
+        futures = [self._executor.submit(self._audio, sentence, language) for sentence in sentences]
+        pieces = []
+        for future in futures:
+            _, path = future.result()
+            piece = self.cache.read(path)
+            pieces.append(piece)
+            yield piece
+        if len(pieces) > 1:
+            self.cache.put(audio_id, b"".join(pieces))
+
+
+def create_tts_service(kind=TTS_ENGINE):
+    if kind == "gtts":
+        return TTSService(GTTSEngine())
+    if kind == "local":
+        return TTSService(LocalEngine())
+    raise ValueError(f"Unknown TTS_ENGINE: {kind}")
+
+
+tts_service = create_tts_service()
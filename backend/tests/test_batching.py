@@ -0,0 +1,95 @@
+# tests/test_batching.py
+
+import threading
+import time
+
+import pytest
+
+from services.batching import MicroBatcher
+from services.inference import BatchedPipeline
+
+
+def submit_together(batcher, items):
+    futures = [batcher.submit(item) for item in items]
+    return [future.result(timeout=5) for future in futures]
+
+
+def test_concurrent_items_share_batches_of_at_most_max_size():
+    sizes = []
+
+    def double(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait=0.05)
+    assert submit_together(batcher, list(range(10))) == [item * 2 for item in range(10)]
+    assert max(sizes) <= 4 and len(sizes) < 10
+    assert batcher.stats()["items"] == 10 and batcher.stats()["batches"] == len(sizes)
+
+
+def test_single_call_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait=0.01)
+    started = time.perf_counter()
+    assert batcher("only", timeout=5) == "only"
+    assert time.perf_counter() - started < 1
+
+
+def test_batch_error_reaches_every_caller_and_the_worker_survives():
+    def flaky(items):
+        if "bad" in items:
+            raise ValueError("model failed")
+        return items
+
+    batcher = MicroBatcher(flaky, max_batch_size=8, max_wait=0.05)
+    futures = [batcher.submit(item) for item in ("a", "bad")]
+    for future in futures:
+        with pytest.raises(ValueError, match="model failed"):
+            future.result(timeout=5)
+    assert batcher("after", timeout=5) == "after"
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=8, max_wait=0.01)
+    with pytest.raises(RuntimeError, match="returned 0 results for 1 items"):
+        batcher("x", timeout=5)
+
+
+def test_cancelled_item_is_skipped():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait=0)
+    first = batcher.submit("first")  # occupies the worker
+    time.sleep(0.05)
+    cancelled = batcher.submit("cancelled")
+    assert cancelled.cancel()
+    release.set()
+    assert first.result(timeout=5) == "first"
+    assert batcher("next", timeout=5) == "next"
+
+
+def test_max_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda items: items, max_batch_size=0)
+
+
+class FakePipe:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        self.calls.append((list(inputs), batch_size, kwargs))
+        return [{"label": f"{item}!"} for item in inputs]
+
+
+def test_batched_pipeline_runs_one_forward_pass_per_batch():
+    pipeline = BatchedPipeline("image-classification", "fake/model", max_batch_size=8, max_wait=0.05, top_k=1)
+    pipeline._pipe = FakePipe()
+    assert submit_together(pipeline, ["cat", "dog", "fish"]) == [{"label": "cat!"}, {"label": "dog!"},
+                                                                  {"label": "fish!"}]
+    inputs, batch_size, kwargs = pipeline._pipe.calls[0]
+    assert batch_size == len(inputs) and kwargs == {"top_k": 1}
+    assert sum(len(call[0]) for call in pipeline._pipe.calls) == 3
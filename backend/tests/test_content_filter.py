@@ -0,0 +1,96 @@
+# tests/test_content_filter.py
+
+import pytest
+
+from services import story_generation
+from services.content_filter import DEFAULT_LANGUAGE, ContentFilter, compile_artifact, load_content_filter
+from services.registry import Resource, registry
+
+BENIGN = [
+    "Tell me a story about Lola the puppy",
+    "The dragon learned to use the potty",
+    "A chutney sandwich for the picnic",
+    "Il était une fois un chat sous la table",
+    "Había una vez una niña con pelo largo",
+    "Im Mai spielten die Kinder",
+    "O gato brincou com a bola no jardim",
+]
+
+OFFENSIVE = [
+    "you are such a chutiya",
+    "tu chutiya hai",
+    "bhenchod kya kar raha hai",
+    "The pirate said madarchod",
+    "gud maranir beta",
+]
+
+
+@pytest.fixture(scope="module")
+def content_filter(tmp_path_factory):
+    return load_content_filter(artifact_path=str(tmp_path_factory.mktemp("acm") / "ibw.acm"))
+
+
+@pytest.fixture
+def kid_filter(monkeypatch, content_filter):
+    monkeypatch.setitem(registry._resources, "content_filter", Resource("content_filter", lambda: content_filter))
+
+
+def write_list(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("text", BENIGN)
+def test_ordinary_childrens_text_passes(kid_filter, text):
+    assert story_generation.filter_content_for_kids(text)
+
+
+@pytest.mark.parametrize("text", OFFENSIVE)
+def test_ibw_words_are_caught(kid_filter, text):
+    assert not story_generation.filter_content_for_kids(text)
+
+
+def test_untagged_words_skip_excluded_languages(tmp_path):
+    source = write_list(tmp_path / "bad.txt", ["sous, souss", "pelo", "merde\tfr"])
+    allowed = write_list(tmp_path / "allowed.txt", [])
+    content_filter = ContentFilter(compile_artifact(source, allowed, excluded=("fr", "es")))
+
+    assert content_filter.find("un chat sous la table") == "sous"
+    assert content_filter.find("un chat souss la table", "en") == "souss"
+    assert content_filter.is_clean("un chat sous la table", "fr")
+    assert content_filter.find("oh merde", "fr") == "merde"
+    assert content_filter.is_clean("oh merde", DEFAULT_LANGUAGE)
+    assert content_filter.is_clean("pelo largo", "es")  # no words of its own at all
+
+
+def test_allowlist_and_word_boundaries(tmp_path):
+    source = write_list(tmp_path / "bad.txt", ["chut", "lola", "gud maranir beta"])
+    allowed = write_list(tmp_path / "allowed.txt", ["lola"])
+    content_filter = ContentFilter(compile_artifact(source, allowed, excluded=()))
+
+    assert content_filter.is_clean("Lola ate chutney")
+    assert content_filter.find("CHUT!") == "chut"
+    assert content_filter.find("gud   maranir\nbeta") == "gud maranir beta"
+    assert content_filter.is_clean("gud maranir betas")
+
+
+def test_stream_scanner_finds_words_split_across_pieces(content_filter):
+    scanner = content_filter.scanner()
+    assert scanner.feed("Once upon a time the pirate said chu") is None
+    assert scanner.feed("tiya") is None  # may still be the start of a longer word
+    assert scanner.feed(" and left.") == "chutiya"
+
+    scanner = content_filter.scanner()
+    assert scanner.feed("A chut") is None
+    assert scanner.feed("ney sandwich.") is None
+    assert scanner.close() is None
+
+
+def test_stale_artifact_is_rebuilt(tmp_path):
+    source = write_list(tmp_path / "bad.txt", ["grumble"])
+    allowed = write_list(tmp_path / "allowed.txt", [])
+    artifact = str(tmp_path / "bad.acm")
+    assert not load_content_filter(source, artifact, allowed).is_clean("grumble")
+
+    write_list(tmp_path / "allowed.txt", ["grumble"])
+    assert load_content_filter(source, artifact, allowed).is_clean("grumble")
@@ -0,0 +1,116 @@
+# tests/test_embedding_cache.py
+
+import itertools
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from rag_engine import embedding_cache  # noqa: E402
+from rag_engine.embedding_cache import (  # noqa: E402
+    CachedEmbeddings,
+    EmbeddingCache,
+    LocalHashEmbeddings,
+    MemoryEmbeddingCache,
+    open_embedding_cache,
+)
+
+
+class CountingEmbedder:
+    """Local hash embeddings that record what reached the model."""
+
+    def __init__(self):
+        self.local = LocalHashEmbeddings(dim=8)
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return self.local.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self.local.embed_query(text)
+
+
+@pytest.fixture
+def cached(tmp_path):
+    embedder = CountingEmbedder()
+    return CachedEmbeddings(embedder, "test-model", EmbeddingCache(str(tmp_path / "vectors.sqlite3")), batch_size=2)
+
+
+def test_documents_hit_after_first_embedding(cached):
+    first = cached.embed_documents(["a dragon", "a cat", "a dragon", "a fish"])
+    assert cached.embedder.documents == ["a dragon", "a cat", "a fish"]  # duplicates embedded once
+    assert (cached.hits, cached.misses) == (1, 3)
+
+    again = cached.embed_documents(["a fish", "a dragon"])
+    assert cached.embedder.documents == ["a dragon", "a cat", "a fish"]
+    assert (cached.hits, cached.misses) == (3, 3)
+    assert again == [first[3], first[0]]
+
+
+def test_queries_and_documents_have_separate_keys(cached):
+    cached.embed_documents(["a dragon"])
+    cached.embed_query("a dragon")
+    assert cached.embedder.queries == ["a dragon"]
+
+    cached.embed_query("a dragon")
+    cached.embed_queries(["a dragon", "a cat", "a cat"])
+    assert cached.embedder.queries == ["a dragon", "a cat"]
+    assert cached.stats()["entries"] == 3
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: next(clock))
+    cache = EmbeddingCache(str(tmp_path / "vectors.sqlite3"), max_entries=2)
+
+    cache.put_many([("a", [1.0]), ("b", [2.0])])
+    assert cache.get_many(["a"]) == {"a": [1.0]}  # a is now more recent than b
+    cache.put_many([("c", [3.0])])
+
+    assert len(cache) == 2
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_get_many_across_batches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "vectors.sqlite3"))
+    cache.put_many([(f"k{i}", [float(i)]) for i in range(0, 1200, 2)])
+    found = cache.get_many([f"k{i}" for i in range(1200)])
+    assert len(found) == 600 and found["k1198"] == [1198.0]
+
+
+def test_counts_are_thread_safe(cached):
+    cached.embed_documents(["warm"])
+
+    def hit():
+        for _ in range(200):
+            cached.embed_documents(["warm"])
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cached.stats()["hits"] == 1600
+
+
+def test_unopenable_cache_falls_back_to_memory(tmp_path):
+    cache = open_embedding_cache(str(tmp_path / "missing-dir" / "vectors.sqlite3"))
+    assert isinstance(cache, MemoryEmbeddingCache)
+
+    cached = CachedEmbeddings(CountingEmbedder(), "test-model", cache)
+    first = cached.embed_documents(["a dragon", "a cat"])
+    assert cached.embed_documents(["a cat"]) == [first[1]]
+    assert cached.embedder.documents == ["a dragon", "a cat"]
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryEmbeddingCache(max_entries=2)
+    cache.put_many([("a", [1.0]), ("b", [2.0])])
+    assert cache.get_many(["a"]) == {"a": [1.0]}
+    cache.put_many([("c", [3.0])])
+    assert len(cache) == 2
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
@@ -0,0 +1,66 @@
+# tests/test_gazetteer.py
+
+import unicodedata
+
+import pytest
+
+from services.gazetteer import Gazetteer, detect_entity
+
+
+@pytest.fixture
+def gazetteer():
+    gazetteer = Gazetteer()
+    gazetteer.add("sun wukong", "Monkey King", ["monkey king", "wukong"])
+    gazetteer.add("zeus", "King of Olympus")
+    gazetteer.add("quetzalcoatl", "Feathered serpent")
+    gazetteer.add("little red riding hood", "Girl who met a wolf", ["red riding hood"])
+    gazetteer.add("chang'e", "Goddess of the moon")
+    return gazetteer
+
+
+def names(gazetteer, text):
+    return [(match.text, match.entry.name) for match in gazetteer.find(text)]
+
+
+def test_multi_word_names_match_as_a_unit(gazetteer):
+    assert names(gazetteer, "The Monkey King met Sun Wukong") == [
+        ("Monkey King", "sun wukong"), ("Sun Wukong", "sun wukong")
+    ]
+    assert names(gazetteer, "a king of monkeys") == []
+
+
+def test_longest_name_wins(gazetteer):
+    assert names(gazetteer, "Little Red Riding Hood and Red Riding Hood") == [
+        ("Little Red Riding Hood", "little red riding hood"), ("Red Riding Hood", "little red riding hood")
+    ]
+    assert names(gazetteer, "Sun Wukong's staff") == [("Sun Wukong", "sun wukong")]
+
+
+@pytest.mark.parametrize("text", ["Zeus's thunderbolt", "Zeus’s thunderbolt", "Zeus' thunderbolt"])
+def test_possessives_match(gazetteer, text):
+    assert names(gazetteer, text) == [("Zeus", "zeus")]
+
+
+def test_names_with_apostrophes_and_accents(gazetteer):
+    assert names(gazetteer, "Chang’e flew to the moon") == [("Chang’e", "chang'e")]
+    assert names(gazetteer, "Quetzalcóatl") == [("Quetzalcóatl", "quetzalcoatl")]
+    decomposed = unicodedata.normalize("NFD", "QUETZALCÓATL's feathers")
+    assert [match.entry.name for match in gazetteer.find(decomposed)] == ["quetzalcoatl"]
+    assert names(gazetteer, "Zeusine and Quetzalcoatls") == []
+
+
+@pytest.mark.parametrize("text", [
+    "Let's visit Mercury and Pluto in a rocket",
+    "A raven and a ram sat by the river",
+    "Hari and Ra played in the garden",
+])
+def test_everyday_words_are_not_figures(text):
+    assert detect_entity(text) == "No special figures detected."
+
+
+def test_shipped_names_match():
+    assert detect_entity("Hanuman flew to Lanka with Lord Rama's ring") == (
+        "Mighty Vanara, devotee of Lord Rama, Lord Rama, prince of Ayodhya from the Ramayana"
+    )
+    assert detect_entity("Raven the Trickster stole the sun") == "Trickster and creator figure of Pacific Northwest peoples"
+    assert len(Gazetteer.from_file()) > 100
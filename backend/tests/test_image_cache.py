@@ -0,0 +1,81 @@
+# tests/test_image_cache.py
+
+import io
+
+from PIL import Image, ImageDraw
+
+from services.image_cache import PerceptualCache, dhash, hamming
+
+
+def page(draw_fn, size=(640, 480)):
+    image = Image.new("RGB", size, "white")
+    draw_fn(ImageDraw.Draw(image))
+    return image
+
+
+def sun(draw, x=320, y=240):
+    draw.ellipse((x - 60, y - 60, x + 60, y + 60), outline="black", width=3)
+    for dx, dy in ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)):
+        draw.line((x + 75 * dx, y + 75 * dy, x + 110 * dx, y + 110 * dy), fill="black", width=3)
+
+
+def smiley(draw, x=320, y=240):
+    draw.ellipse((x - 60, y - 60, x + 60, y + 60), outline="black", width=3)
+    draw.ellipse((x - 30, y - 25, x - 20, y - 15), fill="black")
+    draw.ellipse((x + 20, y - 25, x + 30, y - 15), fill="black")
+    draw.arc((x - 35, y - 20, x + 35, y + 35), 20, 160, fill="black", width=3)
+
+
+def cat(draw, x=320, y=240):
+    draw.ellipse((x - 60, y - 50, x + 60, y + 60), outline="black", width=3)
+    draw.line((x - 50, y - 20, x - 40, y - 90, x - 10, y - 48), fill="black", width=3)
+    draw.line((x + 50, y - 20, x + 40, y - 90, x + 10, y - 48), fill="black", width=3)
+    draw.line((x - 90, y + 10, x - 30, y + 15), fill="black", width=2)
+    draw.line((x + 90, y + 10, x + 30, y + 15), fill="black", width=2)
+
+
+def fish(draw, x=320, y=240):
+    draw.ellipse((x - 90, y - 40, x + 50, y + 40), outline="black", width=3)
+    draw.polygon((x + 50, y, x + 100, y - 40, x + 100, y + 40), outline="black")
+    draw.ellipse((x - 65, y - 12, x - 55, y - 2), fill="black")
+
+
+def test_distinct_sparse_drawings_do_not_share_a_cache_entry():
+    drawings = {name: page(fn) for name, fn in
+                (("sun", sun), ("smiley", smiley), ("cat", cat), ("fish", fish))}
+    hashes = {name: dhash(image) for name, image in drawings.items()}
+    assert len(set(hashes.values())) == len(hashes)
+    for a in hashes:
+        for b in hashes:
+            if a < b:
+                assert hamming(hashes[a], hashes[b]) > 16, (a, b)
+
+    cache = PerceptualCache()
+    cache.put(hashes["smiley"], "smiley analysis")
+    assert cache.get(hashes["sun"]) is None
+    assert cache.get(hashes["cat"]) is None
+    assert cache.get(hashes["smiley"]) == "smiley analysis"
+
+
+def test_same_drawing_hashes_the_same():
+    drawing = page(smiley)
+    buffer = io.BytesIO()
+    drawing.save(buffer, format="PNG")
+    assert dhash(Image.open(buffer)) == dhash(drawing)
+    # Drawn elsewhere on the page
+    assert dhash(page(lambda draw: smiley(draw, x=200, y=180))) == dhash(drawing)
+
+
+def test_blank_page_hashes_without_content():
+    assert dhash(Image.new("RGB", (640, 480), "white")) == 0
+
+
+def test_cache_expires_and_evicts():
+    cache = PerceptualCache(max_distance=0, ttl=-1, max_entries=2)
+    cache.put(1, "a")
+    assert cache.get(1) is None
+
+    cache = PerceptualCache(max_distance=0, max_entries=2)
+    for key in (1, 2, 3):
+        cache.put(key, str(key))
+    assert len(cache) == 2 and cache.get(1) is None and cache.get(3) == "3"
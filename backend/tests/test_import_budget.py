@@ -0,0 +1,69 @@
+# tests/test_import_budget.py
+#
+# Cold-start check: importing the Flask app must stay under a time budget,
+# which only holds while models, vectorstores and heavy libraries load lazily
+# through services/registry.py. IMPORT_BUDGET_SECONDS overrides the budget.
+
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.0"))
+
+# Modules that must never be imported just by importing the app
+HEAVY_MODULES = ["torch", "transformers", "spacy", "langchain", "langchain_community", "chromadb"]
+
+PROBE = """
+import sys, threading, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+threads = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+print(f"RESULT {{elapsed}}|{{','.join(heavy)}}|{{','.join(threads)}}")
+"""
+
+# "import time: self | cumulative | <indent>module"; the app's own imports are indented by 3
+_IMPORT_TIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_app(importtime=False):
+    """Import the app in a fresh interpreter; return (seconds, heavy modules, other threads, stderr)."""
+    # Warmup stays on: importing must not start it (gunicorn --preload forks after import)
+    env = dict(os.environ, WARMUP_ON_START="1")
+    args = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    result = subprocess.run(
+        args + ["-c", PROBE.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, env=env, cwd=BACKEND_DIR, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    line = next(l for l in result.stdout.splitlines() if l.startswith("RESULT "))
+    seconds, heavy, threads = line[len("RESULT "):].split("|")
+    return float(seconds), [m for m in heavy.split(",") if m], [t for t in threads.split(",") if t], result.stderr
+
+
+def slowest_imports(stderr, top=10):
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match and len(match.group(2)) == 3:
+            rows.append((int(match.group(1)), match.group(3)))
+    return "\n".join(f"{us / 1e3:8.1f} ms  {module}" for us, module in sorted(rows, reverse=True)[:top])
+
+
+def test_importing_the_app_is_cheap():
+    seconds, heavy, threads, _ = import_app()
+    assert heavy == [], f"heavy modules imported eagerly: {', '.join(heavy)}"
+    assert threads == [], f"threads started at import: {', '.join(threads)}"
+
+    # The best of three runs counts, so one slow run on a busy machine doesn't fail it
+    best = min([seconds] + [import_app()[0] for _ in range(2)])
+    if best > IMPORT_BUDGET_SECONDS:
+        stderr = import_app(importtime=True)[3]
+        raise AssertionError(
+            f"import app took {best:.2f}s (budget {IMPORT_BUDGET_SECONDS:.2f}s); slowest imports:\n"
+            + slowest_imports(stderr)
+        )
@@ -0,0 +1,185 @@
+# tests/test_llm_router.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services import llm_router as router_module
+from services.llm_router import CircuitBreaker, LatencyTracker, LLMRouter, LLMUnavailable, Provider
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeLLM:
+    """A provider call that answers after ``delays[i]`` seconds on its i-th call (the last repeats)."""
+
+    def __init__(self, answer="A story.", delays=(0.0,), error=None):
+        self.answer = answer
+        self.delays = list(delays)
+        self.error = error
+        self.started = []
+        self.release = threading.Event()  # ends slow calls when the test is done
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, system=None, max_tokens=None, timeout=None):
+        with self._lock:
+            self.started.append(time.monotonic())
+            delay = self.delays[min(len(self.started), len(self.delays)) - 1]
+        self.release.wait(delay)
+        if self.error:
+            raise self.error
+        return self.answer
+
+    async def acall(self, prompt, system=None, max_tokens=None, timeout=None):
+        with self._lock:
+            self.started.append(time.monotonic())
+            delay = self.delays[min(len(self.started), len(self.delays)) - 1]
+        await asyncio.sleep(delay)
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def make_router(*providers, deadline=5, hedge=True, hedge_budget=1.0):
+    router = LLMRouter(order=[p.name for p in providers], deadline=deadline, hedge=hedge,
+                       hedge_budget=hedge_budget, threads=8)
+    for provider in providers:
+        router.register(provider)
+    return router
+
+
+def make_provider(name, llm, timeout=5, hedge_after=0.1, use_async=False):
+    provider = Provider(name, llm, acall=llm.acall if use_async else None, timeout=timeout)
+    provider.latency = LatencyTracker(default=hedge_after)
+    provider.first_chunk = LatencyTracker(default=hedge_after)
+    return provider
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(router_module.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens(clock):
+    breaker = CircuitBreaker(failures=3, reset_seconds=30)
+    assert not breaker.failure() and not breaker.failure()
+    breaker.success()  # a success resets the count
+    assert not breaker.failure() and not breaker.failure()
+    assert breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()  # one trial call
+    assert not breaker.allow()
+
+    assert breaker.failure()  # the trial failed: open again for another reset period
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failing_provider_falls_back_and_its_breaker_skips_it():
+    broken = FakeLLM(error=ConnectionError("down"))
+    backup = FakeLLM(answer="Backup story.")
+    first, second = make_provider("first", broken), make_provider("second", backup)
+    first.breaker = CircuitBreaker(failures=2, reset_seconds=60)
+    router = make_router(first, second, hedge=False)
+
+    for _ in range(3):
+        assert router.generate("prompt") == "Backup story."
+    assert len(broken.started) == 2  # skipped once its breaker opened
+    assert first.breaker.state == "open"
+
+
+def test_hedge_fires_after_the_delay_and_wins():
+    llm = FakeLLM(answer="Hedged story.", delays=(2.0, 0.0))
+    provider = make_provider("slow", llm, hedge_after=0.1)
+    router = make_router(provider)
+    try:
+        started = time.monotonic()
+        assert router.generate("prompt") == "Hedged story."
+        assert time.monotonic() - started < 1.0
+        assert len(llm.started) == 2
+        # Measured from before the call, with slack for timer and thread-start granularity
+        assert llm.started[1] - started >= 0.09
+        assert provider.hedges == 1
+    finally:
+        llm.release.set()
+
+
+def test_no_hedge_for_a_fast_answer_or_beyond_the_budget():
+    fast = FakeLLM(delays=(0.0,))
+    router = make_router(make_provider("fast", fast, hedge_after=0.5))
+    router.generate("prompt")
+    assert len(fast.started) == 1
+
+    slow = FakeLLM(delays=(0.3,))
+    provider = make_provider("slow", slow, hedge_after=0.05)
+    router = make_router(provider, hedge_budget=0.0)
+    router.generate("prompt")
+    assert len(slow.started) == 1 and provider.hedges == 0
+
+
+def test_deadline_is_honoured_across_providers():
+    stalled = FakeLLM(delays=(10.0,))
+    never = FakeLLM()
+    router = make_router(make_provider("stalled", stalled), make_provider("never", never), hedge=False)
+    try:
+        started = time.monotonic()
+        with pytest.raises(LLMUnavailable):
+            router.generate("prompt", deadline=0.3)
+        assert time.monotonic() - started < 1.0
+        assert never.started == []  # nothing was left of the deadline for it
+    finally:
+        stalled.release.set()
+
+
+def test_async_deadline_and_fallback():
+    stalled = FakeLLM(delays=(10.0,))
+    backup = FakeLLM(answer="Backup story.")
+    first = make_provider("stalled", stalled, timeout=0.2, use_async=True)
+    router = make_router(first, make_provider("backup", backup, use_async=True), hedge=False)
+
+    started = time.monotonic()
+    assert asyncio.run(router.agenerate("prompt")) == "Backup story."
+    assert time.monotonic() - started < 1.0
+
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(router.agenerate("prompt", providers=["stalled"], deadline=0.2))
+    assert time.monotonic() - started < 1.0
+
+
+def test_stream_first_chunk_latency_does_not_set_the_hedge_delay():
+    def stream(prompt, system=None, max_tokens=None, timeout=None):
+        yield "Once "
+        time.sleep(0.05)
+        yield "upon a time."
+
+    llm = FakeLLM()
+    provider = Provider("streaming", llm, stream=stream)
+    provider.latency = LatencyTracker(min_samples=1, default=4)
+    provider.first_chunk = LatencyTracker(min_samples=1, default=4)
+    router = make_router(provider)
+
+    for _ in range(3):
+        assert "".join(router.stream("prompt")) == "Once upon a time."
+    assert provider.first_chunk.p95() < 0.05
+    assert provider.latency.p95() == 4  # no whole answers yet: still the default
+    assert router._hedge_at(provider, 0.0) == 4
+
+    router.generate("prompt")
+    assert provider.latency.p95() != 4
@@ -0,0 +1,18 @@
+# tests/test_loadtest.py
+
+import pytest
+
+from benchmarks.loadtest.run import percentile
+
+
+@pytest.mark.parametrize("pct, expected", [(50, 50), (95, 95), (99, 99), (100, 100), (0, 1), (99.9, 100)])
+def test_nearest_rank_percentile(pct, expected):
+    assert percentile(list(range(1, 101)), pct) == expected
+
+
+def test_percentile_of_few_values():
+    assert percentile([], 95) == 0.0
+    assert percentile([7], 50) == 7
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 95) == 4
+    assert percentile([0.1 * i for i in range(1, 21)], 95) == pytest.approx(1.9)
@@ -0,0 +1,37 @@
+# tests/test_metrics.py
+
+from services import metrics
+
+
+def test_client_supplied_labels_are_bounded():
+    metrics.start_request()
+    metrics.set_labels(theme=" Adventure ", language="FR")
+    context = metrics.current()
+    assert (context.theme, context.language) == ("adventure", "fr")
+
+    before = len(metrics.STAGE_SECONDS.snapshot())
+    for i in range(50):
+        metrics.set_labels(theme=f"theme-{i}", language=f"xx-{i}")
+        metrics.observe("test_stage", 0.01)
+    assert (context.theme, context.language) == ("other", "other")
+    assert len(metrics.STAGE_SECONDS.snapshot()) == before + 1
+
+
+def test_explicit_labels_are_bounded_too():
+    metrics.start_request()
+    metrics.observe("test_explicit", 0.01, theme="anything goes", language="klingon")
+    keys = [key for key in metrics.STAGE_SECONDS.snapshot() if key[0] == "test_explicit"]
+    assert keys == [("test_explicit", "other", "other", "ok")]
+
+
+def test_missing_labels_stay_empty():
+    assert metrics.label_value("", metrics.KNOWN_THEMES) == ""
+    assert metrics.label_value("mythology", metrics.KNOWN_THEMES) == "mythology"
+
+
+def test_render_is_prometheus_text():
+    metrics.start_request()
+    metrics.count("test_event")
+    text = metrics.render()
+    assert "# TYPE storyteller_events_total counter" in text
+    assert 'storyteller_events_total{event="test_event"' in text
@@ -0,0 +1,120 @@
+# tests/test_prompt_assembler.py
+
+import pytest
+
+from services import prompt_assembler as prompt_assembler_module
+from services.prompt_assembler import PromptAssembler, Tokenizer, dedupe_chunks, parse_transcript
+from services.session_store import format_turn
+
+TEMPLATE = "Story so far:\n{story_history}\nContext:\n{context}\nChild: {input}\nWrite {word_count} words."
+
+
+def session(turns):
+    """A transcript of alternating child and storyteller turns, each about 40 tokens."""
+    lines = []
+    for i in range(turns):
+        if i % 2 == 0:
+            lines.append(format_turn("user", f"Turn {i}: the child asks what the little fox finds behind the old mill next."))
+        else:
+            lines.append(format_turn(
+                "assistant",
+                f"Turn {i}: the fox found a shiny key under the leaves. "
+                "It wondered which door the key might open, and whether a friend was waiting there."
+            ))
+    return "".join(lines)
+
+
+@pytest.fixture
+def assembler():
+    return PromptAssembler(budgets={50: 1000, 100: 1500}, tokenizer=Tokenizer())
+
+
+def history_share(assembler, assembly):
+    return int((assembly.tokens["budget"] - assembly.tokens["template"]) * assembler.history_share)
+
+
+def test_long_session_history_stays_within_its_share(assembler):
+    assembly = assembler.assemble(TEMPLATE, "And then?", session(30), [], 50)
+    tokens = assembly.tokens
+    assert tokens["summarized_turns"] > 0
+    assert "Summary of the story so far:" in assembly.text
+    assert tokens["history"] <= history_share(assembler, assembly)
+    assert tokens["recent_turns"] + tokens["summarized_turns"] == 30
+    assert "Turn 29:" in assembly.text  # the newest turn verbatim
+    assert "Turn 0:" in assembly.text  # the opening survives in the summary
+    assert tokens["total"] <= tokens["budget"]
+
+
+@pytest.mark.parametrize("summary_tokens", [50, 200, 1000])
+def test_summary_is_charged_to_the_history_share(summary_tokens):
+    assembler = PromptAssembler(budgets={50: 600}, summary_tokens=summary_tokens, tokenizer=Tokenizer())
+    for turns in range(1, 40):
+        assembly = assembler.assemble(TEMPLATE, "And then?", session(turns), [], 50)
+        assert assembly.tokens["history"] <= history_share(assembler, assembly), turns
+
+
+def test_short_session_is_kept_verbatim(assembler):
+    transcript = session(3)
+    assembly = assembler.assemble(TEMPLATE, "And then?", transcript, [], 50)
+    assert assembly.tokens["summarized_turns"] == 0
+    assert transcript in assembly.text
+    assert "Summary" not in assembly.text
+
+
+def test_newest_turn_is_kept_even_over_budget(assembler):
+    transcript = session(4) + format_turn("assistant", "A very long turn. " * 400)
+    assembly = assembler.assemble(TEMPLATE, "And then?", transcript, [], 50)
+    assert assembly.tokens["recent_turns"] == 1
+    assert "A very long turn." in assembly.text
+
+
+def test_budget_follows_story_length(assembler):
+    assert assembler.budget_for(50) == 1000
+    assert assembler.budget_for(80) == 1500
+    assert assembler.budget_for(500) == 1500
+
+
+def test_growing_session_only_summarizes_its_newest_turn(assembler, monkeypatch):
+    calls = []
+    summarize_turn = prompt_assembler_module.summarize_turn
+    monkeypatch.setattr(prompt_assembler_module, "summarize_turn", lambda turn: calls.append(turn) or summarize_turn(turn))
+
+    turns = parse_transcript(session(12))
+    first = assembler.summarize(turns[:10])
+    assert len(calls) == 10
+    assert assembler.summarize(turns[:10]) == first
+    assert len(calls) == 10
+    assembler.summarize(turns[:11])
+    assert len(calls) == 11
+
+
+def test_summary_keeps_the_opening_within_its_limit(assembler):
+    turns = parse_transcript(session(30))
+    summary = assembler.summarize(turns, max_tokens=60)
+    assert summary.startswith("The child asked: Turn 0:")
+    assert Tokenizer().count(summary) <= 60
+    assert "Turn 29:" in summary
+    assert Tokenizer().count(assembler.summarize(turns)) <= assembler.summary_tokens
+
+
+def test_parse_transcript_round_trips_format_turn():
+    turns = [{"role": "user", "content": "A dragon?"}, {"role": "assistant", "content": "Yes.\nA kind one."}]
+    assert parse_transcript("".join(format_turn(t["role"], t["content"]) for t in turns)) == turns
+
+
+def test_near_duplicate_chunks_are_dropped():
+    story = "The fox and the crow met by the river, and the crow sang a song for the fox."
+    chunks = [story, story.replace("river", "stream"), "A turtle raced a hare across the meadow and won.", story]
+    kept, dropped = dedupe_chunks(chunks)
+    assert kept == [chunks[0], chunks[2]]
+    assert dropped == 2
+
+
+def test_context_fills_what_history_leaves(assembler):
+    chunks = [f"Chunk {i}: " + " ".join(f"word{i}x{j}" for j in range(150)) for i in range(10)]
+    assembly = assembler.assemble(TEMPLATE, "And then?", session(30), chunks, 50)
+    tokens = assembly.tokens
+    assert 0 < tokens["chunks"] < 10
+    assert tokens["dropped_chunks"] > 0
+    assert "Chunk 0:" in assembly.text
+    assert tokens["total"] <= tokens["budget"]
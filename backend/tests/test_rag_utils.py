@@ -0,0 +1,59 @@
+# tests/test_rag_utils.py
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from rag_engine.rag_utils import chunk_id, fetched_sources, sync_documents  # noqa: E402
+
+
+class FakeVectorstore:
+    """The slice of the Chroma API sync_documents uses, with equality, $in and $and filters."""
+
+    def __init__(self, docs=()):
+        self.docs = {chunk_id(doc): doc for doc in docs}
+
+    @classmethod
+    def _matches(cls, metadata, where):
+        if not where:
+            return True
+        if "$and" in where:
+            return all(cls._matches(metadata, clause) for clause in where["$and"])
+        (field, condition), = where.items()
+        if isinstance(condition, dict):
+            return metadata.get(field) in condition["$in"]
+        return metadata.get(field) == condition
+
+    def get(self, where=None, include=None):
+        return {"ids": [i for i, doc in self.docs.items() if self._matches(doc.metadata, where)]}
+
+    def add_documents(self, docs, ids):
+        self.docs.update(zip(ids, docs))
+
+    def delete(self, ids):
+        for i in ids:
+            del self.docs[i]
+
+
+def doc(text, source, theme="animal"):
+    return Document(page_content=text, metadata={"theme": theme, "source": source})
+
+
+def test_unfetched_sources_keep_their_chunks():
+    store = FakeVectorstore([doc("old a", "a"), doc("old b", "b"), doc("other theme", "b", theme="bedtime")])
+    pages = {"a": ["new a"], "b": None}
+    fetched, missing = fetched_sources(pages)
+    assert (fetched, missing) == (["a"], ["b"])
+
+    report = sync_documents(store, [doc("new a", "a")], where={"theme": "animal"}, sources=fetched)
+    assert report == {"chunks": 1, "added": 1, "unchanged": 0, "deleted": 1}
+    assert sorted(d.page_content for d in store.docs.values()) == ["new a", "old b", "other theme"]
+
+
+def test_without_sources_every_stale_chunk_under_where_goes():
+    store = FakeVectorstore([doc("old a", "a"), doc("old b", "b"), doc("other theme", "b", theme="bedtime")])
+    report = sync_documents(store, [doc("new a", "a")], where={"theme": "animal"})
+    assert report["deleted"] == 2
+    assert sorted(d.page_content for d in store.docs.values()) == ["new a", "other theme"]
@@ -0,0 +1,19 @@
+# tests/test_registry.py
+
+import threading
+
+from services.registry import ResourceRegistry
+
+
+def test_start_warmup_runs_once_per_process():
+    registry = ResourceRegistry()
+    loads = []
+    done = threading.Event()
+    registry.register("model", lambda: loads.append(1) or done.set() or "model")
+    registry.register("extra", lambda: "extra", warm=False)
+
+    assert registry.start_warmup()
+    assert not registry.start_warmup()
+    assert done.wait(5)
+    assert loads == [1]
+    assert registry.status()["extra"]["loaded"] is False
@@ -0,0 +1,38 @@
+# tests/test_session_store.py
+
+import pytest
+
+from services.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(max_sessions):
+        if request.param == "memory":
+            return MemorySessionStore(max_sessions=max_sessions)
+        return SQLiteSessionStore(path=str(tmp_path / "sessions.sqlite3"), max_sessions=max_sessions)
+    return make
+
+
+def test_append_extends_transcript(make_store):
+    store = make_store(10)
+    session = store.create("adventure", 2, "en")
+    store.append(session.id, "user", "A dragon")
+    session = store.append(session.id, "assistant", "Once upon a time.")
+    assert session.turn_count == 2
+    assert session.transcript == "Child: A dragon\nStoryteller: Once upon a time.\n"
+    assert store.turns(session.id, limit=1) == [{"role": "assistant", "content": "Once upon a time."}]
+
+
+def test_append_after_eviction_returns_none(make_store):
+    store = make_store(1)
+    first = store.create("adventure", 2, "en")
+    assert store.get(first.id) is not None
+    # A second story evicts the first while it is being told
+    store.create("space", 2, "en")
+    assert store.append(first.id, "assistant", "The end.") is None
+    assert store.get(first.id) is None
+
+
+def test_append_unknown_session_returns_none(make_store):
+    assert make_store(10).append("no-such-session", "user", "hello") is None
@@ -0,0 +1,72 @@
+# tests/test_story_fetcher.py
+
+import os
+
+from services.story_fetcher import PageCache, StoryFetcher
+
+
+def test_page_cache_creates_directory_on_first_write(tmp_path):
+    cache_dir = tmp_path / "fetch_cache"
+    cache = PageCache(str(cache_dir))
+    assert not cache_dir.exists()
+    assert cache.load("https://example.com/a") is None
+
+    cache.save("https://example.com/a", {"paragraphs": ["Once upon a time."]})
+    assert cache.load("https://example.com/a") == {"paragraphs": ["Once upon a time."]}
+    assert os.listdir(cache_dir)
+
+
+def test_page_cache_without_writable_directory_caches_nothing(tmp_path):
+    # A directory that can't be created, as on a read-only deployment
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = PageCache(str(blocker / "fetch_cache"))
+
+    cache.save("https://example.com/a", {"paragraphs": ["Once upon a time."]})
+    assert not cache.enabled
+    assert cache.load("https://example.com/a") is None
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def get(self, url, headers=None, timeout=None):
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_fetch_pages_marks_unreachable_pages_missing(tmp_path):
+    fetcher = StoryFetcher(cache_dir=str(tmp_path), ttl=0)
+    fetcher.session = FakeSession({
+        "https://ok.example": FakeResponse(200, "<p>One</p><p>Two</p>"),
+        "https://down.example": FakeResponse(503),
+        "https://error.example": ConnectionError("refused"),
+        "https://empty.example": FakeResponse(200, "<div>no paragraphs</div>"),
+    })
+    pages = fetcher.fetch_pages(list(fetcher.session.responses), limit=1, deadline=5)
+    assert pages == {
+        "https://ok.example": ["One"],
+        "https://down.example": None,
+        "https://error.example": None,
+        "https://empty.example": [],
+    }
+    assert fetcher.fetch_paragraphs(["https://ok.example", "https://down.example"], deadline=5) == ["One", "Two"]
+
+
+def test_fetch_pages_serves_a_stale_copy_when_the_page_fails(tmp_path):
+    fetcher = StoryFetcher(cache_dir=str(tmp_path), ttl=0)
+    fetcher.session = FakeSession({"https://flaky.example": FakeResponse(200, "<p>Kept</p>")})
+    fetcher.fetch_pages(["https://flaky.example"], deadline=5)
+
+    fetcher.session = FakeSession({"https://flaky.example": ConnectionError("refused")})
+    assert fetcher.fetch_pages(["https://flaky.example"], deadline=5) == {"https://flaky.example": ["Kept"]}
@@ -0,0 +1,156 @@
+# tests/test_story_generation.py
+
+import asyncio
+import threading
+import time
+import os
+
+import pytest
+
+from services import story_generation
+from services.llm_router import LLMUnavailable
+from services.registry import Resource, registry
+from services.response_cache import ResponseCache
+
+STORY = "Once upon a time, a kind dragon shared her apples with the whole village."
+
+
+class FakeGenerator:
+    """Stands in for RAGStoryGenerator; fails while ``failing`` is set."""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.calls = 0
+
+    def generate_story(self, user_input, story_history=None, word_count=50, theme="general",
+                       formatted_history=None, context=None):
+        self.calls += 1
+        if self.failing:
+            raise LLMUnavailable("every provider timed out")
+        return STORY
+
+    async def agenerate_story(self, user_input, story_history=None, word_count=50, theme="general",
+                              formatted_history=None):
+        return self.generate_story(user_input, story_history, word_count, theme, formatted_history)
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    generator = FakeGenerator()
+    resource = Resource("rag_generator", lambda: generator)
+    monkeypatch.setitem(registry._resources, "rag_generator", resource)
+    return generator
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(variants=1)
+    monkeypatch.setattr(story_generation, "response_cache", cache)
+    return cache
+
+
+def test_failed_generation_is_not_cached(generator, cache):
+    generator.failing = True
+    story = story_generation.generate_story_segment("A dragon story", 1, "adventure")
+    assert story == story_generation.fallback_story("A dragon story")
+    assert len(cache) == 0
+
+    # The next request asks the model again and caches the real story
+    generator.failing = False
+    assert story_generation.generate_story_segment("A dragon story", 1, "adventure") == STORY
+    assert story_generation.generate_story_segment("A dragon story", 1, "adventure") == STORY
+    assert generator.calls == 2 and len(cache) == 1
+
+
+def test_failed_async_generation_is_not_cached(generator, cache):
+    generator.failing = True
+    story = asyncio.run(story_generation.agenerate_story_segment("A dragon story", 1, "adventure"))
+    assert story == story_generation.fallback_story("A dragon story")
+    assert len(cache) == 0
+
+
+def make_rag_generator(monkeypatch, answer=None, error=None):
+    monkeypatch.setenv("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY", "test-key"))  # checked at import
+    rag_story_generator = pytest.importorskip("services.rag_story_generator")
+    generator = object.__new__(rag_story_generator.RAGStoryGenerator)
+    monkeypatch.setattr(generator, "_prepare", lambda *args: {"input": args[0]})
+    monkeypatch.setattr(generator, "render_prompt", lambda inputs: inputs["input"])
+
+    def generate(prompt):
+        if error:
+            raise error
+        return answer
+
+    monkeypatch.setattr(rag_story_generator.llm_router, "generate", generate)
+    return generator
+
+
+def test_rag_generator_raises_instead_of_returning_a_placeholder(monkeypatch):
+    generator = make_rag_generator(monkeypatch, error=LLMUnavailable("every provider timed out"))
+    with pytest.raises(LLMUnavailable):
+        generator.generate_story("A dragon story")
+
+    generator = make_rag_generator(monkeypatch, answer="")
+    with pytest.raises(ValueError):
+        generator.generate_story("A dragon story")
+
+    assert make_rag_generator(monkeypatch, answer=STORY).generate_story("A dragon story") == STORY
+
+
+class BatchGenerator(FakeGenerator):
+    """Fails for prompts containing "fail" and stalls on those containing "stall"."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def retrieve_many(self, prompts, theme):
+        return [None] * len(prompts)
+
+    def generate_story(self, user_input, *args, **kwargs):
+        if "stall" in user_input:
+            self.release.wait(10)
+        if "fail" in user_input:
+            raise LLMUnavailable("every provider timed out")
+        return f"{STORY} ({user_input})"
+
+
+def test_batch_reports_successes_failures_and_timeouts(monkeypatch, cache):
+    generator = BatchGenerator()
+    monkeypatch.setitem(registry._resources, "rag_generator", Resource("rag_generator", lambda: generator))
+    specs = [
+        ("A dragon story", 1, "adventure", "en"),
+        ("A story that will fail", 1, "adventure", "en"),
+        ("A story that will stall", 1, "fantasy", "en"),
+        ("A pirate story", 2, "fantasy", "en"),
+    ]
+    try:
+        started = time.monotonic()
+        results = {r["index"]: r for r in story_generation.generate_story_batch(specs, deadline=0.5)}
+        assert time.monotonic() - started < 2
+    finally:
+        generator.release.set()
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[0]["story"] == f"{STORY} (A dragon story)" and "error" not in results[0]
+    assert results[1]["story"] == story_generation.fallback_story("A story that will fail")
+    assert results[2]["story"] is None and "0.5 seconds" in results[2]["error"]
+    assert results[3]["story"] == f"{STORY} (A pirate story)"
+    assert len(cache) == 2  # only the real stories
+
+
+@pytest.mark.parametrize("specs", [
+    [],
+    [("A dragon story", 1, "adventure", "en")] * (story_generation.BATCH_MAX_STORIES + 1),
+    [("", 1, "adventure", "en")],
+    [(None, 1, "adventure", "en")],
+    [("A dragon story", 5, "adventure", "en")],
+    [("A dragon story", True, "adventure", "en")],
+    [("A dragon story", 1, ["adventure"], "en")],
+    [("A dragon story", 1, "adventure", None)],
+    [("A dragon story", 1, "adventure")],
+])
+def test_invalid_batches_are_rejected_before_anything_starts(generator, specs):
+    with pytest.raises(ValueError):
+        story_generation.generate_story_batch(specs)
+    assert generator.calls == 0
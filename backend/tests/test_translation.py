@@ -0,0 +1,95 @@
+# tests/test_translation.py
+
+import threading
+
+import pytest
+
+from services.translation import (
+    LocalBackend,
+    MemoryTranslationCache,
+    TranslationCache,
+    Translator,
+    open_translation_cache,
+)
+
+
+class FailingBackend:
+    def translate_batch(self, texts, target):
+        raise ConnectionError("translation service unreachable")
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def make_cache(request, tmp_path):
+    def make(max_entries=1000):
+        if request.param == "sqlite":
+            return TranslationCache(str(tmp_path / "translations.sqlite3"), max_entries=max_entries)
+        return MemoryTranslationCache(max_entries=max_entries)
+    return make
+
+
+def test_only_new_sentences_reach_the_backend(make_cache):
+    backend = LocalBackend()
+    translator = Translator(backend, make_cache())
+
+    assert translator.translate("A cat sat. A dog ran.\nThe end.", "fr") == \
+        "[fr] A cat sat. [fr] A dog ran.\n[fr] The end."
+    assert (backend.calls, translator.stats()) == (1, {"hits": 0, "misses": 3})
+
+    assert translator.translate_many(["A dog ran.", "A bird sang."], "fr") == ["[fr] A dog ran.", "[fr] A bird sang."]
+    assert (backend.calls, translator.stats()) == (2, {"hits": 1, "misses": 4})
+
+    translator.translate("A dog ran.", "hi")  # another language is another key
+    assert backend.calls == 3
+
+
+def test_english_is_not_translated(make_cache):
+    backend = LocalBackend()
+    assert Translator(backend, make_cache()).translate("A cat sat.", "en") == "A cat sat."
+    assert backend.calls == 0
+
+
+def test_backend_failure_returns_the_original_and_caches_nothing(make_cache):
+    cache = make_cache()
+    assert Translator(FailingBackend(), cache).translate("A cat sat.", "fr") == "A cat sat."
+
+    backend = LocalBackend()
+    assert Translator(backend, cache).translate("A cat sat.", "fr") == "[fr] A cat sat."
+    assert backend.calls == 1
+
+
+def test_least_recently_used_sentences_are_evicted(make_cache, monkeypatch):
+    cache = make_cache(max_entries=2)
+    keys = [TranslationCache.key(text, "fr") for text in ("one", "two", "three")]
+    clock = iter(range(1, 100))
+    monkeypatch.setattr("services.translation.time.time", lambda: next(clock))
+
+    cache.put_many([(keys[0], "un"), (keys[1], "deux")])
+    assert cache.get_many([keys[0]]) == {keys[0]: "un"}  # "one" is now the most recent
+    cache.put_many([(keys[2], "trois")])
+    assert cache.get_many(keys) == {keys[0]: "un", keys[2]: "trois"}
+
+
+def test_unopenable_cache_falls_back_to_memory(tmp_path):
+    cache = open_translation_cache(str(tmp_path / "missing-dir" / "translations.sqlite3"))
+    assert isinstance(cache, MemoryTranslationCache)
+
+    translator = Translator(LocalBackend(), cache)
+    translator.translate("A cat sat.", "fr")
+    translator.translate("A cat sat.", "fr")
+    assert translator.stats() == {"hits": 1, "misses": 1}
+
+
+def test_counts_are_thread_safe(make_cache):
+    translator = Translator(LocalBackend(), make_cache())
+    translator.translate("A cat sat.", "fr")
+
+    def hit():
+        for _ in range(200):
+            translator.translate("A cat sat.", "fr")
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert translator.stats() == {"hits": 1600, "misses": 1}
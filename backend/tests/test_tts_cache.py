@@ -0,0 +1,98 @@
+# tests/test_tts_cache.py
+
+import io
+import os
+import threading
+
+import pytest
+
+from services.tts_cache import AudioCache, LocalEngine, TTSService, strip_id3
+
+
+class FailingEngine:
+    name = "failing"
+
+    def synthesize(self, text, language):
+        raise ConnectionError("tts service unreachable")
+
+
+@pytest.fixture
+def service(tmp_path):
+    return TTSService(LocalEngine(), AudioCache(str(tmp_path / "tts_cache")), workers=2)
+
+
+def test_synthesize_caches_by_text_and_language(service):
+    audio_id, path = service.synthesize("Once upon a time.", "en")
+    assert os.path.basename(path) == f"{audio_id}.mp3"
+    assert service.synthesize("Once upon a time.", "en") == (audio_id, path)
+    assert service.engine.calls == 1
+
+    other_id, _ = service.synthesize("Once upon a time.", "fr")
+    assert other_id != audio_id and service.engine.calls == 2
+
+
+def test_stream_yields_sentences_in_order_and_caches_the_whole_text(service):
+    text = "A cat sat. A dog ran. The end."
+    pieces = list(service.stream(text, "en"))
+    assert [len(piece) for piece in pieces] == [len(LocalEngine.FRAME) * len(s) for s in
+                                                ("A cat sat.", "A dog ran.", "The end.")]
+    calls = service.engine.calls
+
+    assert list(service.stream(text, "en")) == [b"".join(pieces)]
+    audio_id, path = service.synthesize(text, "en")
+    assert service.engine.calls == calls
+    assert service.cache.read(path) == b"".join(pieces)
+
+
+def test_concurrent_requests_synthesize_once(service):
+    threads = [threading.Thread(target=service.synthesize, args=("Same story.", "en")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert service.engine.calls == 1
+
+
+def test_least_recently_used_audio_is_evicted(tmp_path):
+    cache = AudioCache(str(tmp_path / "tts_cache"), max_bytes=250)
+    old, recent, new = ("0" * 64, "1" * 64, "2" * 64)
+    cache.put(old, bytes(100))
+    cache.put(recent, bytes(100))
+    os.utime(cache.path(old), (1, 1))
+    os.utime(cache.path(recent), (2, 2))
+
+    cache.put(new, bytes(100))
+    assert cache.get(old) is None
+    assert cache.get(recent) and cache.get(new)
+
+
+def test_engine_failure_caches_nothing(tmp_path):
+    service = TTSService(FailingEngine(), AudioCache(str(tmp_path / "tts_cache")))
+    with pytest.raises(ConnectionError):
+        service.synthesize("Once upon a time.", "en")
+    assert service.cache.get(service.audio_id("Once upon a time.", "en")) is None
+    assert not os.listdir(tmp_path / "tts_cache")
+
+
+def test_invalid_audio_id_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.cache.get("../../etc/passwd")
+
+
+def test_unwritable_directory_serves_audio_from_memory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    service = TTSService(LocalEngine(), AudioCache(str(blocker / "tts_cache")))
+    assert not service.cache.enabled
+
+    audio_id, audio = service.synthesize("Once upon a time.", "en")
+    assert isinstance(audio, io.BytesIO) and audio.getvalue()
+    assert b"".join(service.stream("A cat sat. The end.", "en"))
+    assert service.cache.get(audio_id) is None
+
+
+def test_strip_id3_drops_the_tag():
+    frame = LocalEngine.FRAME
+    tag = b"ID3\x04\x00\x00\x00\x00\x00\x05" + bytes(5)
+    assert strip_id3(tag + frame) == frame
+    assert strip_id3(frame) == frame
@@ -0,0 +1,89 @@
+# utils/ingest_stories.py
+#
+# Builds or refreshes the story_db_<theme> vectorstores ahead of time, so the
+# request handlers only ever open existing stores. Run from the backend directory:
+#
+#     python -m utils.ingest_stories                    # every theme
+#     python -m utils.ingest_stories mythology bedtime  # selected themes
+#     python -m utils.ingest_stories --dry-run          # report only
+#     python -m utils.ingest_stories --character        # also refresh rag_db
+#
+# Chunks are stored under content-hash IDs, so a re-run embeds and upserts only
+# chunks that changed and deletes the ones that disappeared. Each chunk records
+# its source page; a page that fails to fetch keeps its chunks.
+
+import argparse
+import json
+import sys
+
+from langchain_community.vectorstores import Chroma
+
+from rag_engine.embedding_cache import get_embeddings
+from rag_engine.rag_chain import RAG_DB_PATH, build_index, open_vectorstore
+from rag_engine.rag_utils import fetched_sources, sync_documents
+from services.rag_story_generator import (
+    STORY_THEMES,
+    fetch_theme_pages,
+    prepare_theme_documents,
+    theme_db_path,
+)
+
+
+def ingest_theme(theme, embeddings, dry_run=False, deadline=60):
+    """Fetch, chunk and sync one theme's store; return its change report."""
+    pages = fetch_theme_pages(theme, deadline=deadline)
+    fetched, missing = fetched_sources(pages)
+    if not fetched:
+        # Never wipe a store because the sources were unreachable
+        return {"theme": theme, "error": "no stories fetched, store left unchanged"}
+
+    docs = [
+        doc for url in fetched for doc in prepare_theme_documents("\n".join(pages[url]), theme, source=url)
+    ]
+    vectorstore = Chroma(embedding_function=embeddings, persist_directory=theme_db_path(theme))
+    # Sources that timed out keep their chunks; with every source in, whatever else is stored is stale
+    report = sync_documents(
+        vectorstore, docs, where={"theme": theme}, dry_run=dry_run, sources=fetched if missing else None
+    )
+    report["theme"] = theme
+    if missing:
+        report["missing_sources"] = missing
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the per-theme story vectorstores.")
+    parser.add_argument("themes", nargs="*", default=STORY_THEMES, help="themes to ingest (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    parser.add_argument("--deadline", type=float, default=60, help="seconds allowed for fetching each theme")
+    parser.add_argument("--character", action="store_true",
+                        help=f"also refresh the character-story index in {RAG_DB_PATH}")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    embeddings = get_embeddings()
+    reports = [ingest_theme(theme, embeddings, args.dry_run, args.deadline) for theme in args.themes]
+    if args.character and not args.dry_run:
+        report = build_index(open_vectorstore()) or {"error": "no stories fetched, store left unchanged"}
+        report["theme"] = "character"
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print(f"{'theme':<12} {'chunks':>7} {'added':>7} {'unchanged':>10} {'deleted':>8}")
+        for report in reports:
+            if "error" in report:
+                print(f"{report['theme']:<12} {report['error']}")
+                continue
+            print(f"{report['theme']:<12} {report['chunks']:>7} {report['added']:>7} "
+                  f"{report['unchanged']:>10} {report['deleted']:>8}")
+            for url in report.get("missing_sources", []):
+                print(f"{'':<12} not fetched, chunks kept: {url}")
+        print(f"Embedding cache: {embeddings.stats()}")
+
+    return 1 if any("error" in report for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
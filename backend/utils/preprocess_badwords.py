@@ -1,13 +1,24 @@
 # utils/preprocess_badwords.py
+#
+# Compiles data/ibw_bad_words.txt into the memory-mappable automaton used by
+# services/content_filter.py. Run from the backend directory:
+#
+#     python -m utils.preprocess_badwords
 
-import pickle
+import os
 
-def txt_to_pickle(txt_path, pickle_path):
-    with open(txt_path, "r") as f:
-        bad_words = [line.strip() for line in f if line.strip()]
-    
-    with open(pickle_path, "wb") as f:
-        pickle.dump(bad_words, f)
+from services.content_filter import (
+    ALLOWED_WORDS_PATH,
+    AUTOMATON_PATH,
+    BAD_WORDS_PATH,
+    build_artifact,
+    load_content_filter,
+)
 
-# Usage
-txt_to_pickle("data/ibw_bad_words.txt", "data/ibw_bad_words.pkl")
+
+if __name__ == "__main__":
+    build_artifact(BAD_WORDS_PATH, AUTOMATON_PATH, ALLOWED_WORDS_PATH)
+    content_filter = load_content_filter()
+    print(f"Wrote {AUTOMATON_PATH} ({os.path.getsize(AUTOMATON_PATH)} bytes)")
+    for lang, matcher in content_filter.matchers.items():
+        print(f"  {lang}: {matcher.state_count} states, {matcher.n_classes} byte classes")